@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
+
+# --- AI Proxy ---
+# The browser used to call Gemini/OpenRouter directly with our keys embedded in
+# the page. Every AI call now goes through AIProxy.complete():
+#   1. identical prompts (after whitespace/case normalisation) are answered from
+#      an LRU+TTL cache,
+#   2. concurrent identical prompts share a single upstream request,
+#   3. at most MAX_UPSTREAM_CONCURRENCY requests per worker are in flight at once.
+
+GEMINI_URL = 'https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent'
+OPENROUTER_URL = 'https://openrouter.ai/api/v1/chat/completions'
+GEMINI_MODEL = 'gemini-1.5-flash-latest'
+OPENROUTER_MODEL = 'mistralai/mistral-7b-instruct:free'
+
+CACHE_SIZE = 2048
+CACHE_TTL_SECONDS = 6 * 3600
+MAX_UPSTREAM_CONCURRENCY = 8
+UPSTREAM_QUEUE_TIMEOUT = 10
+UPSTREAM_TIMEOUT = (5, 60)
+
+class UpstreamBusy(Exception):
+    pass
+
+class UpstreamError(Exception):
+    pass
+
+def normalize_prompt(text):
+    return re.sub(r'\s+', ' ', str(text)).strip().casefold()
+
+def cache_key(provider, model, system, messages, options=None):
+    normalized = {
+        'provider': provider,
+        'model': model,
+        'system': normalize_prompt(system or ''),
+        'messages': [(m['role'], normalize_prompt(m['content'])) for m in messages],
+        'options': options or {},
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+# --- Upstream Transports ---
+class HTTPTransport:
+    """Talks to the real providers over one pooled requests.Session per worker process."""
+
+    def __init__(self, gemini_key=None, openrouter_key=None, pool_size=MAX_UPSTREAM_CONCURRENCY):
+        self.gemini_key = gemini_key
+        self.openrouter_key = openrouter_key
+        self.pool_size = pool_size
+        self._session = None
+        self._pid = None
+
+    @property
+    def session(self):
+        if self._session is None or self._pid != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._session, self._pid = session, os.getpid()
+        return self._session
+
+    def __call__(self, provider, model, system, messages, options):
+        if provider == 'gemini':
+            return self._gemini(model, system, messages, options)
+        return self._openrouter(model, system, messages, options)
+
+    def _gemini(self, model, system, messages, options):
+        if not self.gemini_key:
+            raise UpstreamError('GEMINI_API_KEY is not configured.')
+        payload = {
+            'contents': [{'role': 'model' if m['role'] == 'assistant' else 'user', 'parts': [{'text': m['content']}]}
+                         for m in messages],
+            'systemInstruction': {'parts': [{'text': system}]},
+        }
+        if options.get('json_schema'):
+            payload['generationConfig'] = {'responseMimeType': 'application/json', 'responseSchema': options['json_schema']}
+        response = self.session.post(GEMINI_URL.format(model=model), params={'key': self.gemini_key},
+                                     json=payload, timeout=UPSTREAM_TIMEOUT)
+        result = response.json()
+        if not response.ok:
+            raise UpstreamError(result.get('error', {}).get('message', f'Gemini error {response.status_code}'))
+        # A blocked prompt or answer comes back as 200 with no text.
+        try:
+            return result['candidates'][0]['content']['parts'][0]['text']
+        except (KeyError, IndexError, TypeError):
+            candidate = (result.get('candidates') or [{}])[0]
+            reason = result.get('promptFeedback', {}).get('blockReason') or candidate.get('finishReason') or 'no candidates'
+            raise UpstreamError(f'Gemini returned no answer ({reason}).')
+
+    def _openrouter(self, model, system, messages, options):
+        if not self.openrouter_key:
+            raise UpstreamError('OPENROUTER_API_KEY is not configured.')
+        payload = {'model': model, 'messages': [{'role': 'system', 'content': system}] + list(messages)}
+        if options.get('json'):
+            payload['response_format'] = {'type': 'json_object'}
+        response = self.session.post(OPENROUTER_URL, headers={'Authorization': f'Bearer {self.openrouter_key}'},
+                                     json=payload, timeout=UPSTREAM_TIMEOUT)
+        result = response.json()
+        if not response.ok:
+            raise UpstreamError(result.get('error', {}).get('message', f'OpenRouter error {response.status_code}'))
+        try:
+            content = result['choices'][0]['message']['content']
+        except (KeyError, IndexError, TypeError):
+            content = None
+        if content is None:
+            choice = (result.get('choices') or [{}])[0]
+            reason = result.get('error', {}).get('message') or choice.get('finish_reason') or 'no choices'
+            raise UpstreamError(f'OpenRouter returned no answer ({reason}).')
+        return content
+
+
+class StubTransport:
+    """Offline stand-in for load tests and local development: canned answers after a fixed delay."""
+
+    def __init__(self, delay=0.5):
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, provider, model, system, messages, options):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        prompt = messages[-1]['content'] if messages else ''
+        if options.get('json_schema') or options.get('json'):
+            return json.dumps({'stub': True, 'prompt': prompt[:80], 'pharmacies': [],
+                               'predicted_illness': 'Unknown (stub)', 'urgency': 'Low',
+                               'specialist': 'General Physician', 'explanation': 'Offline stub response.'})
+        return f'(stub) You said: {prompt[:200]}'
+
+
+# --- Proxy ---
+class AIProxy:
+    def __init__(self, transport, cache_size=CACHE_SIZE, ttl=CACHE_TTL_SECONDS,
+                 max_concurrency=MAX_UPSTREAM_CONCURRENCY, queue_timeout=UPSTREAM_QUEUE_TIMEOUT):
+        self.transport = transport
+        self.cache = TTLCache(maxsize=cache_size, ttl=ttl)
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.stats = {'hits': 0, 'coalesced': 0, 'upstream': 0, 'errors': 0}
+
+    def complete(self, provider, system, messages, model=None, options=None, cache=True):
+        model = model or (GEMINI_MODEL if provider == 'gemini' else OPENROUTER_MODEL)
+        options = options or {}
+        key = cache_key(provider, model, system, messages, options)
+
+        with self._lock:
+            if cache and key in self.cache:
+                self.stats['hits'] += 1
+                return self.cache[key]
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.stats['coalesced'] += 1
+                leader = False
+            else:
+                future = self._in_flight[key] = Future()
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            if not self._slots.acquire(timeout=self.queue_timeout):
+                raise UpstreamBusy('The AI service is busy. Please try again in a moment.')
+            try:
+                with self._lock:
+                    self.stats['upstream'] += 1
+                text = self.transport(provider, model, system, messages, options)
+            finally:
+                self._slots.release()
+        except BaseException as e:
+            with self._lock:
+                self.stats['errors'] += 1
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            if cache:
+                self.cache[key] = text
+            del self._in_flight[key]
+        future.set_result(text)
+        return text
+
+
+def proxy_from_env():
+    if os.environ.get('AI_PROXY_UPSTREAM') == 'stub':
+        transport = StubTransport(float(os.environ.get('AI_PROXY_STUB_DELAY', '0.5')))
+    else:
+        transport = HTTPTransport(os.environ.get('GEMINI_API_KEY'), os.environ.get('OPENROUTER_API_KEY'))
+    return AIProxy(transport)
@@ -0,0 +1,198 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from database import connect
+from partitions import open_partitions
+
+# --- Admin Analytics ---
+# District-wide numbers for the admin dashboard. Each source query returns only
+# numeric columns: status is mapped to a small code and timestamps to epoch
+# seconds in SQL. Rows are read CHUNK_ROWS at a time and narrowed to compact
+# dtypes before the next chunk arrives. Every metric is then a handful of
+# NumPy/pandas operations over whole columns; nothing loops over rows in Python.
+# Results are cached (see get_metrics), so a busy dashboard costs at most one
+# recompute a minute. ASHA coverage is read from the catalog and from every
+# district partition (partitions.py) and added up per ASHA.
+
+CHUNK_ROWS = 100_000
+CACHE_TTL_SECONDS = 60
+THROUGHPUT_DAYS = 30
+PERCENTILES = (50, 90, 99)
+TOP_DOCTORS = 20
+
+STATUS_CODES = {'Pending': 0, 'Under Review': 1, 'Reviewed': 2}
+OTHER_STATUS = 3
+
+CONSULTATIONS_SQL = f'''
+    SELECT COALESCE(doctor_id, 0) AS doctor_id,
+           CASE status {" ".join(f"WHEN '{name}' THEN {code}" for name, code in STATUS_CODES.items())} ELSE {OTHER_STATUS} END AS status,
+           (julianday(created_at) - 2440587.5) * 86400 AS created,
+           (julianday(reviewed_at) - 2440587.5) * 86400 AS reviewed
+    FROM consultations
+'''
+CONSULTATION_DTYPES = {'doctor_id': 'int32', 'status': 'int8', 'created': 'float64', 'reviewed': 'float64'}
+
+ASHA_COVERAGE_SQL = '''
+    SELECT u.id AS asha_id,
+           COALESCE(s.households, 0) AS households,
+           COALESCE(s.verified_households, 0) AS verified_households,
+           COALESCE(s.household_members, 0) AS household_members,
+           COALESCE(s.mch_records, 0) AS mch_records
+    FROM users u
+    LEFT JOIN asha_summary s ON s.asha_id = u.id
+    WHERE u.role_id = ?
+'''
+ASHA_DTYPES = {'asha_id': 'int32', 'households': 'int32', 'verified_households': 'int32',
+               'household_members': 'int32', 'mch_records': 'int32'}
+
+def load_frame(db, sql, dtypes, params=(), chunk_rows=CHUNK_ROWS):
+    """Read `sql` in chunks, casting each chunk to `dtypes` before fetching the next.
+
+    NULLs become NaN, so nullable columns need a float dtype.
+    """
+    cursor = db.cursor()
+    cursor.row_factory = None  # plain tuples convert to an array much faster than sqlite3.Row
+    cursor.execute(sql, params)
+    chunks = []
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            break
+        block = np.array(rows, dtype=np.float64)
+        chunks.append(pd.DataFrame({column: block[:, i].astype(dtype) for i, (column, dtype) in enumerate(dtypes.items())}))
+    if not chunks:
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in dtypes.items()})
+    return pd.concat(chunks, ignore_index=True)
+
+def _percentiles(values):
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return {f'p{p}': None for p in PERCENTILES}
+    return {f'p{p}': round(float(v), 2) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+def _daily_counts(timestamps, start, days):
+    day = np.floor((timestamps[~np.isnan(timestamps)] - start) / 86400)
+    day = day[(day >= 0) & (day < days)].astype(np.int64)
+    return np.bincount(day, minlength=days)
+
+def consultation_metrics(frame, now):
+    status = frame['status'].to_numpy()
+    created = frame['created'].to_numpy()
+    reviewed = frame['reviewed'].to_numpy()
+    counts = np.bincount(status, minlength=OTHER_STATUS + 1)
+
+    start = (now // 86400 - (THROUGHPUT_DAYS - 1)) * 86400
+    dates = pd.date_range(pd.Timestamp(start, unit='s'), periods=THROUGHPUT_DAYS, freq='D').strftime('%Y-%m-%d')
+    submitted = _daily_counts(created, start, THROUGHPUT_DAYS)
+    completed = _daily_counts(reviewed, start, THROUGHPUT_DAYS)
+
+    pending = status == STATUS_CODES['Pending']
+    review_hours = (reviewed - created) / 3600
+    review_hours = review_hours[(status == STATUS_CODES['Reviewed']) & (review_hours >= 0)]
+    return {
+        'total': int(len(status)),
+        'by_status': {name: int(counts[code]) for name, code in STATUS_CODES.items()},
+        'throughput': {
+            'days': list(dates),
+            'submitted': submitted.tolist(),
+            'reviewed': completed.tolist(),
+            'submitted_last_7_days': int(submitted[-7:].sum()),
+            'reviewed_last_7_days': int(completed[-7:].sum()),
+        },
+        'backlog': {
+            'pending': int(pending.sum()),
+            'age_hours': _percentiles((now - created[pending]) / 3600),
+        },
+        # Only cases reviewed since reviewed_at started being recorded count here.
+        'time_to_review_hours': {'count': int(len(review_hours)), **_percentiles(review_hours)},
+    }
+
+def doctor_load(frame, doctor_names):
+    assigned = frame[frame['doctor_id'] > 0]
+    if assigned.empty:
+        return {'doctors': 0, 'active_mean': 0.0, 'active_max': 0, 'top': []}
+    load = (assigned.groupby(['doctor_id', 'status']).size()
+            .unstack(fill_value=0)
+            .reindex(columns=[STATUS_CODES['Under Review'], STATUS_CODES['Reviewed']], fill_value=0))
+    load.columns = ['active', 'reviewed']
+    load = load.sort_values(['active', 'reviewed'], ascending=False)
+    top = load.head(TOP_DOCTORS).reset_index()
+    top['name'] = top['doctor_id'].map(doctor_names).fillna('Unknown')
+    return {
+        'doctors': int(len(load)),
+        'active_mean': round(float(load['active'].mean()), 2),
+        'active_max': int(load['active'].max()),
+        'top': [{'doctor_id': int(d), 'name': n, 'active': int(a), 'reviewed': int(r)}
+                for d, n, a, r in zip(top['doctor_id'], top['name'], top['active'], top['reviewed'])],
+    }
+
+def asha_coverage(frame):
+    households = frame['households'].to_numpy()
+    total_households = int(households.sum())
+    return {
+        'ashas': int(len(frame)),
+        'ashas_without_households': int((households == 0).sum()),
+        'households': total_households,
+        'household_members': int(frame['household_members'].sum()),
+        'verified_share': round(float(frame['verified_households'].sum()) / total_households, 4) if total_households else None,
+        'households_per_asha': _percentiles(households.astype(np.float64)),
+        'mch_records': int(frame['mch_records'].sum()),
+    }
+
+def compute_metrics(db, roles, now=None, partitions=()):
+    """`roles` is the app's {name: role_id} map; `partitions` are connections to the district partitions."""
+    now = int(now if now is not None else time.time())
+    consultations = load_frame(db, CONSULTATIONS_SQL, CONSULTATION_DTYPES)
+    ashas = load_frame(db, ASHA_COVERAGE_SQL, ASHA_DTYPES, params=(roles['asha'],))
+    if partitions:
+        # Every file lists every ASHA, with zeros where it holds none of their data.
+        frames = [ashas] + [load_frame(p, ASHA_COVERAGE_SQL, ASHA_DTYPES, params=(roles['asha'],)) for p in partitions]
+        ashas = pd.concat(frames).groupby('asha_id', as_index=False).sum()
+    users = dict(db.execute('SELECT role_id, COUNT(*) FROM users GROUP BY role_id').fetchall())
+    doctor_names = dict(db.execute('SELECT id, name FROM users WHERE role_id = ?', (roles['doctor'],)).fetchall())
+    return {
+        'generated_at': now,
+        'users': {role: int(users.get(role_id, 0)) for role, role_id in roles.items()},
+        'consultations': consultation_metrics(consultations, now),
+        'doctor_load': doctor_load(consultations, doctor_names),
+        'asha_coverage': asha_coverage(ashas),
+    }
+
+# path -> (computed_at, metrics). After CACHE_TTL_SECONDS an entry is still
+# served while one background thread recomputes it, so no dashboard request
+# waits on a full recompute once the first one has finished.
+_cache = {}
+_refreshing = set()
+_cache_lock = threading.Lock()
+
+def _refresh(path, roles):
+    try:
+        db = connect(path, readonly=True)
+        partitions = open_partitions(db, path, readonly=True)
+        try:
+            metrics = compute_metrics(db, roles, partitions=partitions)
+        finally:
+            for conn in (db, *partitions):
+                conn.close()
+        with _cache_lock:
+            _cache[path] = (time.monotonic(), metrics)
+    finally:
+        with _cache_lock:
+            _refreshing.discard(path)
+
+def get_metrics(db, roles, path, refresh=False, partitions=()):
+    """compute_metrics() for the database at `path`, cached for CACHE_TTL_SECONDS."""
+    with _cache_lock:
+        entry = _cache.get(path)
+        if entry is not None and not refresh:
+            if time.monotonic() - entry[0] > CACHE_TTL_SECONDS and path not in _refreshing:
+                _refreshing.add(path)
+                threading.Thread(target=_refresh, args=(path, roles), name='analytics-refresh', daemon=True).start()
+            return entry[1]
+    metrics = compute_metrics(db, roles, partitions=partitions)
+    with _cache_lock:
+        _cache[path] = (time.monotonic(), metrics)
+    return metrics
@@ -1,11 +1,46 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, stream_with_context, abort, send_file
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
+from werkzeug.http import is_resource_modified
+from werkzeug.security import safe_join
 from functools import wraps
+from datetime import datetime, timezone
 import sqlite3
 import os
+import threading
+import csv
+import io
+import json
+import mimetypes
 import time
+import uuid
 import requests
+from database import get_db, init_app as init_db_pool
+from migrations import migrate
+from chat_events import ChatHub, default_fanout_dir
+from media_store import save_upload, needs_derivatives, variant_or_original, original_name_range, is_content_addressed, UploadTooLarge, MAX_UPLOAD_BYTES, IMAGE_EXTENSIONS
+from data_export import EXPORTS, export_mode, stream_parquet, export_filename
+from analytics import get_metrics as get_admin_metrics
+from asha_summary import get_summary as get_asha_summary
+from medicine_catalogue import search_medicines as search_medicine_catalogue, load_bundled_catalogue
+from ai_proxy import proxy_from_env, UpstreamBusy, UpstreamError
+from household_search import search_households as search_household_index, index_household, AUTOCOMPLETE_LIMIT
+from field_sync import apply_changes, changes_since, MAX_CHANGES
+from household_import import import_csv, asha_directory, KINDS as IMPORT_KINDS
+from page_cache import PageCache, init_bytecode_cache
+from patient_timeline import get_timeline, PAGE_SIZE as TIMELINE_PAGE_SIZE
+from chat_inbox import get_inbox, mark_read, unread_total, PAGE_SIZE as INBOX_PAGE_SIZE
+from case_scheduler import CaseScheduler, URGENCY_LEVELS, DEFAULT_CAPACITY as DEFAULT_CASE_CAPACITY
+from job_queue import enqueue, Worker as JobWorker
+from audio_processing import AUDIO_EXTENSIONS
+from partitions import asha_db, partition_dbs, TABLES as PARTITIONED_TABLES, init_app as init_partitions
+from immunization import due_lists as immunization_due_lists, local_today, DUE_SOON_DAYS
+from queries import (
+    PENDING_CASES_SQL, PENDING_AFTER_CURSOR, ACCEPT_CASE_SQL, DOCTOR_CASES_SQL, REVIEWED_CASES_SQL,
+    PATIENT_CONSULTATIONS_SQL, DOCTORS_SQL, CHAT_THREAD_SQL, LATEST_MESSAGE_SQL, MESSAGES_AFTER_SQL,
+    LATEST_MESSAGES_SQL, ASHA_HOUSEHOLDS_SQL, MEDIA_CONSULTATION_SQL, MEDIA_CONSULTATION_DERIVATIVE_SQL,
+    MEDIA_CHAT_SQL, MEDIA_CHAT_NAME, MEDIA_CHAT_RANGE,
+)
+import metrics
 
 # --- App Configuration ---
 app = Flask(__name__)
@@ -13,20 +48,60 @@ app.secret_key = 'super_secret_key_for_aroghub'
 DATABASE = 'swasthsathi.db'
 UPLOAD_FOLDER = 'static/uploads'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Leave headroom over the per-file cap for the other form fields.
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 1024 * 1024
+# Behind nginx, set MEDIA_ACCEL_REDIRECT to an `internal` location aliased to the
+# upload folder (e.g. /protected-uploads/) and nginx streams the bytes instead of
+# a gunicorn worker. USE_X_SENDFILE=1 does the same for Apache/lighttpd.
+app.config['MEDIA_ACCEL_REDIRECT'] = os.environ.get('MEDIA_ACCEL_REDIRECT')
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
+MEDIA_MAX_AGE = 365 * 24 * 3600
+app.config['DATABASE'] = os.environ.get('DATABASE', DATABASE)
+init_db_pool(app)
+# ASHA field data may live in per-district files; see partitions.py.
+init_partitions(app)
+# Request, SQL and upload metrics at /metrics; registered first so every request is timed.
+metrics.init_app(app)
+ai_proxy = proxy_from_env()
+chat_hub = ChatHub(os.environ.get('CHAT_FANOUT_DIR', default_fanout_dir()))
+init_bytecode_cache(app)
+# Pages that only vary by role; see page_cache.py before adding one.
+page_cache = PageCache(app)
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 # --- Database, Roles, and Login Decorator ---
-def get_db():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+# get_db() hands out the request's pooled connection; it is returned on app-context teardown.
+
+# SQLite CURRENT_TIMESTAMP values are UTC strings like '2025-09-19 20:11:33'.
+def parse_db_timestamp(value):
+    return datetime.strptime(value, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
 
 # Roles definition
 ROLES = {'patient': 1, 'doctor': 2, 'asha': 3, 'admin': 99}
 # Create a reverse mapping to get role name from role ID
 ROLE_NAMES = {v: k for k, v in ROLES.items()}
 
+# Image uploads are shown through their resized derivative once it exists.
+@app.template_filter('from_json')
+def from_json(value):
+    return json.loads(value) if value else []
+
+@app.template_global()
+def upload_url(filename, variant='display'):
+    return url_for('media', name=variant_or_original(app.config['UPLOAD_FOLDER'], filename, variant))
+
+def message_to_dict(row):
+    message = dict(row)
+    if message.get('audio_peaks'):
+        message['audio_peaks'] = json.loads(message['audio_peaks'])
+    path = message.get('file_path')
+    if path and os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS:
+        name = path[len('uploads/'):]
+        for variant in ('display', 'thumb'):
+            message[f'{variant}_path'] = 'uploads/' + variant_or_original(app.config['UPLOAD_FOLDER'], name, variant)
+    return message
+
 def login_required(role_ids):
     def decorator(f):
         @wraps(f)
@@ -42,107 +117,10 @@ def login_required(role_ids):
     return decorator
 
 # --- Database Initialization ---
+# The schema lives in migrations.py; init_db() brings any database up to the latest version.
 def init_db():
-    conn = get_db()
-    cursor = conn.cursor()
-    
     print("Initializing database...")
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            username TEXT UNIQUE,
-            password_hash TEXT NOT NULL,
-            role_id INTEGER NOT NULL,
-            specialty TEXT,
-            hospital TEXT,
-            age INTEGER,
-            gender TEXT,
-            phone_number TEXT,
-            abha_id TEXT,
-            profile_photo_filename TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    print("- 'users' table checked/created.")
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS consultations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            patient_id INTEGER,
-            doctor_id INTEGER,
-            patient_name TEXT,
-            patient_age INTEGER,
-            patient_gender TEXT,
-            symptoms TEXT,
-            photo_filename TEXT,
-            doctor_response TEXT,
-            audio_note_filename TEXT,
-            status TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (patient_id) REFERENCES users(id),
-            FOREIGN KEY (doctor_id) REFERENCES users(id)
-        )
-    ''')
-    print("- 'consultations' table checked/created.")
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS chat_threads (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            patient_id INTEGER,
-            doctor_id INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (patient_id) REFERENCES users(id),
-            FOREIGN KEY (doctor_id) REFERENCES users(id)
-        )
-    ''')
-    print("- 'chat_threads' table checked/created.")
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS chat_messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            thread_id INTEGER,
-            sender_id INTEGER,
-            message_text TEXT,
-            file_path TEXT,
-            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (thread_id) REFERENCES chat_threads(id),
-            FOREIGN KEY (sender_id) REFERENCES users(id)
-        )
-    ''')
-    print("- 'chat_messages' table checked/created.")
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS households (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            asha_id INTEGER,
-            household_name TEXT NOT NULL,
-            address TEXT,
-            members_count INTEGER,
-            is_verified BOOLEAN DEFAULT 0,
-            FOREIGN KEY (asha_id) REFERENCES users(id)
-        )
-    ''')
-    print("- 'households' table checked/created.")
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS mch_records (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            asha_id INTEGER,
-            patient_id INTEGER,
-            record_type TEXT, -- e.g., 'pregnancy', 'immunization', 'growth'
-            record_details TEXT,
-            record_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (asha_id) REFERENCES users(id),
-            FOREIGN KEY (patient_id) REFERENCES users(id)
-        )
-    ''')
-    print("- 'mch_records' table checked/created.")
-    
-    conn.commit()
-    conn.close()
+    migrate(get_db())
     print("Database initialization complete.")
 
 def seed_db():
@@ -152,7 +130,6 @@ def seed_db():
     user_count = cursor.execute('SELECT COUNT(*) FROM users').fetchone()[0]
     if user_count > 0:
         print("Database already contains users. Skipping seeding.")
-        conn.close()
         return
 
     print("\nSeeding database with demo data...")
@@ -189,6 +166,7 @@ def seed_db():
                     'INSERT INTO households (asha_id, household_name, address, members_count) VALUES (?, ?, ?, ?)',
                     hh
                 )
+                index_household(conn, cursor.lastrowid)
             print(" - Added demo households.")
             conn.commit()
 
@@ -204,18 +182,93 @@ def seed_db():
                 )
             print(" - Added demo MCH records.")
             conn.commit()
+
+    loaded = load_bundled_catalogue(conn)
+    if loaded:
+        print(f" - Loaded {loaded} medicines into the catalogue.")
     
-    conn.close()
     print("\nDatabase seeding complete.")
 
+# --- Case Auto-Assignment ---
+# Each worker starts its scheduler thread on its first request rather than at
+# import, so init_db.py and the module CLIs never run one. The scheduler's lease
+# keeps all but one worker idle. Set CASE_SCHEDULER=0 to leave assignment to doctors.
+case_scheduler = None
+_case_scheduler_lock = threading.Lock()
+
+@app.before_request
+def start_case_scheduler():
+    global case_scheduler
+    if case_scheduler is None and os.environ.get('CASE_SCHEDULER', '1') == '1':
+        with _case_scheduler_lock:
+            if case_scheduler is None:
+                case_scheduler = CaseScheduler(app.config['DATABASE'], ROLES['doctor']).start()
+
+# --- Uploaded Media ---
+# Uploads are only served through /media, which checks the requester takes part
+# in the consultation or chat thread the file belongs to.
+@app.before_request
+def redirect_static_uploads():
+    if request.endpoint == 'static' and (request.view_args or {}).get('filename', '').startswith('uploads/'):
+        return redirect(url_for('media', name=request.view_args['filename'][len('uploads/'):]), code=301)
+
+def queue_media_jobs(db, table, row_id, name):
+    """Queue the post-processing an upload needs, in the transaction that stores it."""
+    if needs_derivatives(name):
+        enqueue(db, 'image_derivatives', {'name': name})
+    elif os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS:
+        enqueue(db, 'voice_note', {'table': table, 'row_id': row_id})
+
+def can_access_upload(db, user_id, name):
+    low, high = original_name_range(name)
+    if low == high:
+        consultation = db.execute(MEDIA_CONSULTATION_SQL, (name, name, user_id, user_id)).fetchone()
+        chat_match, chat_names = MEDIA_CHAT_NAME, ('uploads/' + name,)
+    else:
+        # A derivative: match the original it was built from, whatever its extension.
+        # Both tables take the same half-open range [low, high).
+        consultation = db.execute(MEDIA_CONSULTATION_DERIVATIVE_SQL, (low, high, user_id, user_id)).fetchone()
+        chat_match, chat_names = MEDIA_CHAT_RANGE, ('uploads/' + low, 'uploads/' + high)
+    if consultation:
+        return True
+    return db.execute(MEDIA_CHAT_SQL.format(match=chat_match), (*chat_names, user_id, user_id)).fetchone() is not None
+
+@app.route('/media/<path:name>')
+@login_required(role_ids=[ROLES['patient'], ROLES['doctor'], ROLES['asha']])
+def media(name):
+    path = safe_join(app.config['UPLOAD_FOLDER'], name)
+    if path is None or not can_access_upload(get_db(), session['user_id'], name) or not os.path.isfile(path):
+        abort(404)
+
+    # Content-addressed files never change, so their hash is the ETag and they can be cached for a year.
+    immutable = is_content_addressed(name)
+    etag = os.path.basename(name).split('.', 1)[0] if immutable else True
+    max_age = MEDIA_MAX_AGE if immutable else 3600
+    accel_prefix = app.config.get('MEDIA_ACCEL_REDIRECT')
+    if accel_prefix:
+        response = app.response_class(mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + name
+    else:
+        # send_file answers Range and If-None-Match/If-Modified-Since itself.
+        response = send_file(path, conditional=True, etag=etag, max_age=max_age)
+        response.accept_ranges = 'bytes'
+    if immutable:
+        response.set_etag(etag)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    if immutable:
+        response.cache_control.immutable = True
+    return response
+
 # --- General & Auth Routes ---
 @app.route('/')
 def home():
-    return render_template('index.html')
+    return page_cache.render('index.html')
 
 @app.route('/contact')
 def contact_us():
-    return render_template('contact_us.html')
+    return page_cache.render('contact_us.html')
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -257,6 +310,7 @@ def register():
         password = request.form.get('password')
         role_id = request.form.get('role_id')
         username = request.form.get('username')
+        district = (request.form.get('district') or '').strip() or None
 
         if not name or not email or not password or not role_id:
             flash('All required fields must be filled.', 'danger')
@@ -265,8 +319,8 @@ def register():
         password_hash = generate_password_hash(password)
         db = get_db()
         try:
-            db.execute('INSERT INTO users (name, email, username, password_hash, role_id) VALUES (?, ?, ?, ?, ?)',
-                       (name, email, username, password_hash, role_id))
+            db.execute('INSERT INTO users (name, email, username, password_hash, role_id, district) VALUES (?, ?, ?, ?, ?, ?)',
+                       (name, email, username, password_hash, role_id, district))
             db.commit()
             flash('Registration successful! Please log in.', 'success')
             return redirect(url_for('login'))
@@ -286,33 +340,30 @@ def logout():
 # --- About Pages ---
 @app.route('/about/patient')
 @login_required(role_ids=[ROLES['patient']])
-def about_patient(): return render_template('about_patient.html')
+def about_patient(): return page_cache.render('about_patient.html')
 
 @app.route('/about/doctor')
 @login_required(role_ids=[ROLES['doctor']])
-def about_doctor(): return render_template('about_doctor.html')
+def about_doctor(): return page_cache.render('about_doctor.html')
 
 @app.route('/about/asha')
 @login_required(role_ids=[ROLES['asha']])
-def about_asha(): return render_template('about_asha.html')
+def about_asha(): return page_cache.render('about_asha.html')
 
 
 # --- Patient Feature Routes ---
+HISTORY_CONSULTATIONS = 50
+
 @app.route('/dashboard/patient')
 @login_required(role_ids=[ROLES['patient']])
 def patient_dashboard():
-    db = get_db()
-    consultations = db.execute(
-        'SELECT c.*, d.name as doctor_name FROM consultations c LEFT JOIN users d ON c.doctor_id = d.id WHERE c.patient_id = ? ORDER BY c.created_at DESC',
-        (session['user_id'],)
-    ).fetchall()
-    return render_template('patient_dashboard.html', consultations=consultations)
+    return render_template('patient_dashboard.html')
 
 @app.route('/find-doctor')
 @login_required(role_ids=[ROLES['patient']])
 def find_doctor():
     db = get_db()
-    doctors = db.execute('SELECT id, name, specialty, hospital FROM users WHERE role_id = ?', (ROLES['doctor'],)).fetchall()
+    doctors = db.execute(DOCTORS_SQL, (ROLES['doctor'],)).fetchall()
     # The patient_id is retrieved from the session in the start_chat route
     return render_template('find_doctor.html', doctors=doctors)
 
@@ -326,46 +377,77 @@ def submit_symptoms():
     photo = request.files.get('photo')
     photo_filename = None
     if photo and photo.filename != '':
-        filename = secure_filename(photo.filename)
-        timestamp = int(time.time())
-        photo_filename = f"{timestamp}_{filename}"
-        photo.save(os.path.join(app.config['UPLOAD_FOLDER'], photo_filename))
+        try:
+            photo_filename = save_upload(photo, app.config['UPLOAD_FOLDER'])
+        except UploadTooLarge as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('patient_dashboard'))
     db = get_db()
-    db.execute(
+    case_id = db.execute(
         'INSERT INTO consultations (patient_id, patient_name, patient_age, patient_gender, symptoms, photo_filename, status) VALUES (?, ?, ?, ?, ?, ?, ?)',
         (session['user_id'], name, age, gender, symptoms, photo_filename, 'Pending')
-    )
+    ).lastrowid
+    if photo_filename:
+        queue_media_jobs(db, 'consultations', case_id, photo_filename)
     db.commit()
     flash('Your case has been submitted. A doctor will review it shortly.', 'success')
     return redirect(url_for('patient_dashboard'))
 
+@app.route('/submit_ai_consultation', methods=['POST'])
+@login_required(role_ids=[ROLES['patient']])
+def submit_ai_consultation():
+    payload = request.get_json(silent=True) or {}
+    info = payload.get('patient_info') or {}
+    analysis = payload.get('ai_analysis') or {}
+    if not str(info.get('symptoms') or '').strip():
+        return jsonify({'status': 'error', 'message': 'Please describe your symptoms.'}), 400
+    # The checker's suggested specialist becomes the case category, which the scheduler matches against doctors.
+    db = get_db()
+    db.execute(
+        'INSERT INTO consultations (patient_id, patient_name, patient_age, patient_gender, symptoms, category, urgency, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        (session['user_id'], info.get('name'), info.get('age'), info.get('gender'), info['symptoms'],
+         str(analysis.get('specialist') or '').strip() or None, URGENCY_LEVELS.get(analysis.get('urgency'), 0), 'Pending')
+    )
+    db.commit()
+    return jsonify({'status': 'success'})
+
 @app.route('/lab-reports')
 @login_required(role_ids=[ROLES['patient']])
-def lab_report_assessment(): return render_template('lab_report_assessment.html')
+def lab_report_assessment(): return page_cache.render('lab_report_assessment.html')
 
 @app.route('/health-awareness')
 @login_required(role_ids=[ROLES['patient']])
-def health_awareness(): return render_template('health_awareness.html')
+def health_awareness(): return page_cache.render('health_awareness.html')
 
 @app.route('/search-medicines')
 @login_required(role_ids=[ROLES['patient']])
-def search_medicines(): return render_template('search_medicines.html')
+def search_medicines(): return page_cache.render('search_medicines.html')
 
 @app.route('/patient-history')
 @login_required(role_ids=[ROLES['patient']])
 def patient_history():
     db = get_db()
     patient_id = session['user_id']
-    consultations = db.execute(
-        'SELECT c.*, d.name as doctor_name FROM consultations c LEFT JOIN users d ON c.doctor_id = d.id WHERE c.patient_id = ? ORDER BY c.created_at DESC',
-        (patient_id,)
-    ).fetchall()
-    
-    return render_template('patient_history.html', consultations=consultations, lab_reports=[])
+    # Older cases are reached through the timeline, which pages through everything.
+    consultations = db.execute(PATIENT_CONSULTATIONS_SQL, (patient_id, HISTORY_CONSULTATIONS + 1)).fetchall()
+    timeline, next_cursor = get_timeline(db, patient_id, partitions=partition_dbs())
+    return render_template('patient_history.html', consultations=consultations[:HISTORY_CONSULTATIONS],
+                           more_consultations=len(consultations) > HISTORY_CONSULTATIONS,
+                           timeline=timeline, next_cursor=next_cursor, lab_reports=[])
+
+@app.route('/api/patient/timeline')
+@login_required(role_ids=[ROLES['patient']])
+def patient_timeline():
+    items, next_cursor = get_timeline(
+        get_db(), session['user_id'],
+        before_ts=request.args.get('before_ts'), before_id=request.args.get('before_id', type=int),
+        limit=request.args.get('limit', TIMELINE_PAGE_SIZE, type=int), partitions=partition_dbs()
+    )
+    return jsonify({'items': items, 'next_cursor': next_cursor})
 
 @app.route('/government-schemes')
 @login_required(role_ids=[ROLES['patient']])
-def government_schemes(): return render_template('government_schemes.html')
+def government_schemes(): return page_cache.render('government_schemes.html')
 
 @app.route('/chatbot')
 @login_required(role_ids=[ROLES['patient'], ROLES['doctor'], ROLES['asha']])
@@ -375,32 +457,132 @@ def chatbot(): return render_template('chatbot.html')
 @login_required(role_ids=[ROLES['patient']])
 def symptom_checker(): return render_template('symptom_checker.html')
 
+@app.route('/api/medicines/search')
+@login_required(role_ids=[ROLES['patient'], ROLES['doctor'], ROLES['asha']])
+def medicine_catalogue_search():
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', 20, type=int), 50)
+    rows = search_medicine_catalogue(get_db(), query, limit=limit)
+    return jsonify({'query': query, 'results': [dict(row) for row in rows]})
+
+@app.route('/ai-wellness')
+@login_required(role_ids=[ROLES['patient'], ROLES['doctor'], ROLES['asha']])
+def ai_wellness_chat(): return render_template('ai_wellness_chat.html')
+
+# --- AI Proxy Routes ---
+# The pages post their inputs here; prompts and API keys stay on the server.
+SYMPTOM_CHECK_SYSTEM_PROMPT = 'You are an expert medical AI... Your response MUST be a valid JSON object with four keys: "predicted_illness", "urgency", "specialist", "explanation". Urgency must be one of: \'Low\', \'Medium\', \'High\', \'Immediate\'.'
+SYMPTOM_CHECK_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'predicted_illness': {'type': 'STRING'}, 'urgency': {'type': 'STRING'},
+        'specialist': {'type': 'STRING'}, 'explanation': {'type': 'STRING'}
+    },
+    'required': ['predicted_illness', 'urgency', 'specialist', 'explanation']
+}
+MEDICINE_SEARCH_SYSTEM_PROMPT = "You are a helpful pharmacy assistant. Your task is to find pharmacies near a given Indian pincode that are likely to stock a specific medicine, based on your training data. Your response must be a valid JSON object. The JSON object should have a single key named 'pharmacies'. The value should be an array of objects, where each object represents a pharmacy and has the following keys: 'name', 'address', and 'phone_number'. If you cannot find any pharmacies or phone numbers, return an empty array or null for the phone number."
+WELLNESS_SYSTEM_PROMPT = "You are Aroghub AI, an empathetic and supportive wellness assistant. Your primary goal is to provide a safe, non-judgmental space for users to discuss their feelings, stress, and mental well-being. You are not a doctor and cannot give medical advice, diagnoses, or prescriptions. Instead, you should listen, offer supportive statements, and suggest general wellness strategies like mindfulness, breathing exercises, or talking to a friend. If the user mentions severe distress or self-harm, you must gently but clearly advise them to seek help from a qualified healthcare professional or a crisis hotline immediately."
+
+def ai_request(provider, system, messages, **kwargs):
+    """Runs one proxied completion and maps proxy failures onto HTTP errors."""
+    try:
+        return ai_proxy.complete(provider, system, messages, **kwargs), None
+    except UpstreamBusy as e:
+        return None, (jsonify({'status': 'error', 'message': str(e)}), 503)
+    except (UpstreamError, requests.RequestException) as e:
+        return None, (jsonify({'status': 'error', 'message': str(e)}), 502)
+
+@app.route('/api/ai/symptom-check', methods=['POST'])
+@login_required(role_ids=[ROLES['patient']])
+def ai_symptom_check():
+    data = request.get_json(silent=True) or {}
+    symptoms = ' '.join(str(data.get('symptoms', '')).split())
+    user_prompt = f'Patient: {data.get("age")}, {data.get("gender")}. Location: Kapriwas, Haryana, India. Symptoms: "{symptoms}". Provide analysis in JSON format.'
+    text, error = ai_request('gemini', SYMPTOM_CHECK_SYSTEM_PROMPT, [{'role': 'user', 'content': user_prompt}],
+                             options={'json_schema': SYMPTOM_CHECK_SCHEMA})
+    if error:
+        return error
+    try:
+        return jsonify(json.loads(text))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'The AI service returned an unreadable answer.'}), 502
+
+@app.route('/api/ai/medicine-search', methods=['POST'])
+@login_required(role_ids=[ROLES['patient']])
+def ai_medicine_search():
+    data = request.get_json(silent=True) or {}
+    pincode = str(data.get('pincode', '')).strip()
+    medicine = ' '.join(str(data.get('medicine', '')).split())
+    user_prompt = f'Please find pharmacies near the pincode {pincode} in India that sell the medicine "{medicine}". Provide their name, address, and phone number based on your knowledge.'
+    text, error = ai_request('openrouter', MEDICINE_SEARCH_SYSTEM_PROMPT, [{'role': 'user', 'content': user_prompt}],
+                             options={'json': True})
+    if error:
+        return error
+    try:
+        return jsonify(json.loads(text))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'The AI service returned an unreadable answer.'}), 502
+
+@app.route('/api/ai/wellness', methods=['POST'])
+@login_required(role_ids=[ROLES['patient'], ROLES['doctor'], ROLES['asha']])
+def ai_wellness():
+    data = request.get_json(silent=True) or {}
+    messages = [{'role': m.get('role'), 'content': str(m.get('content', ''))}
+                for m in data.get('messages', []) if m.get('role') in ('user', 'assistant')]
+    if not messages:
+        return jsonify({'status': 'error', 'message': 'Cannot send an empty message.'}), 400
+    # Conversations are personal, so they are never served from the shared cache.
+    text, error = ai_request('openrouter', WELLNESS_SYSTEM_PROMPT, messages, cache=False)
+    if error:
+        return error
+    return jsonify({'reply': text})
+
 # --- CHAT WORKFLOW ROUTES ---
+MESSAGE_PAGE_SIZE = 100
+MAX_MESSAGE_PAGE_SIZE = 500
+# Event streams send a comment every KEEPALIVE seconds and end after STREAM_SECONDS;
+# EventSource reconnects on its own and resumes from Last-Event-ID.
+CHAT_STREAM_KEEPALIVE = 15
+CHAT_STREAM_SECONDS = 120
+# An open stream holds a worker thread and a pooled connection. Past
+# CHAT_STREAM_LIMIT streams in one process the route answers 204, which stops
+# EventSource from reconnecting, and the page polls get_messages instead. Keep
+# the limit well under the worker's thread count (see gunicorn.conf.py) so
+# logins, uploads and polls always find a free thread.
+CHAT_STREAM_LIMIT = int(os.environ.get('CHAT_STREAM_LIMIT', '6'))
+chat_stream_slots = threading.BoundedSemaphore(CHAT_STREAM_LIMIT)
+
+def participant_thread(db, thread_id):
+    """The chat thread if the logged-in user is its patient or doctor, otherwise None."""
+    thread = db.execute('SELECT * FROM chat_threads WHERE id = ?', (thread_id,)).fetchone()
+    if thread is None or session['user_id'] not in (thread['patient_id'], thread['doctor_id']):
+        return None
+    return thread
+
+def no_chat_access():
+    return jsonify({'status': 'error', 'message': 'You do not have access to this chat.'}), 403
+
 @app.route('/chat/start/<int:doctor_id>')
 @login_required(role_ids=[ROLES['patient']])
 def start_chat(doctor_id):
     patient_id = session.get('user_id')
     db = get_db()
-    thread = db.execute(
-        'SELECT * FROM chat_threads WHERE patient_id = ? AND doctor_id = ?',
-        (patient_id, doctor_id)
-    ).fetchone()
+    thread = db.execute(CHAT_THREAD_SQL, (patient_id, doctor_id)).fetchone()
     
     if not thread:
-        cursor = db.execute('INSERT INTO chat_threads (patient_id, doctor_id) VALUES (?, ?)', (patient_id, doctor_id))
+        # UNIQUE(patient_id, doctor_id) settles a double-click race: the loser's insert is ignored.
+        db.execute('INSERT OR IGNORE INTO chat_threads (patient_id, doctor_id) VALUES (?, ?)', (patient_id, doctor_id))
         db.commit()
-        thread_id = cursor.lastrowid
-    else:
-        thread_id = thread['id']
+        thread = db.execute(CHAT_THREAD_SQL, (patient_id, doctor_id)).fetchone()
+    thread_id = thread['id']
     return redirect(url_for('chat_page', thread_id=thread_id))
 
 @app.route('/chat/view/<int:thread_id>')
 @login_required(role_ids=[ROLES['patient'], ROLES['doctor'], ROLES['asha']])
 def chat_page(thread_id):
     db = get_db()
-    thread = db.execute('SELECT * FROM chat_threads WHERE id = ?', (thread_id,)).fetchone()
-    
-    if not thread or session['user_id'] not in [thread['patient_id'], thread['doctor_id']]:
+    thread = participant_thread(db, thread_id)
+    if not thread:
         flash('You do not have access to this chat.', 'danger')
         return redirect(url_for('home'))
 
@@ -419,84 +601,207 @@ def chat_page(thread_id):
 @app.route('/chat/<int:thread_id>/messages')
 @login_required(role_ids=[ROLES['patient'], ROLES['doctor'], ROLES['asha']])
 def get_messages(thread_id):
+    # Clients poll with ?after_id=<last id they have>; without it the latest page is returned.
+    after_id = request.args.get('after_id', type=int)
+    limit = min(max(request.args.get('limit', MESSAGE_PAGE_SIZE, type=int), 1), MAX_MESSAGE_PAGE_SIZE)
     db = get_db()
-    messages = db.execute(
-        'SELECT * FROM chat_messages WHERE thread_id = ? ORDER BY sent_at ASC',
-        (thread_id,)
-    ).fetchall()
-    message_list = [dict(row) for row in messages]
-    return jsonify(message_list)
+    if not participant_thread(db, thread_id):
+        return no_chat_access()
+
+    # The newest message decides the validators, so an idle thread costs one index seek.
+    latest = db.execute(LATEST_MESSAGE_SQL, (thread_id,)).fetchone()
+    etag = f"t{thread_id}-m{latest['id'] if latest else 0}"
+    last_modified = parse_db_timestamp(latest['sent_at']) if latest else None
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = app.response_class(status=304)
+    else:
+        if after_id is not None:
+            messages = db.execute(MESSAGES_AFTER_SQL, (thread_id, after_id, limit)).fetchall()
+        else:
+            messages = db.execute(LATEST_MESSAGES_SQL, (thread_id, limit)).fetchall()[::-1]
+        response = jsonify([message_to_dict(row) for row in messages])
+        # Handing a participant messages moves their read position. Commit even
+        # when the UPDATE matched nothing (they had read that far): it opened a
+        # transaction either way, which must not hold the write lock until
+        # teardown. An empty page runs no UPDATE and has nothing to commit.
+        if messages:
+            mark_read(db, thread_id, session['user_id'], messages[-1]['id'])
+            db.commit()
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/chat/<int:thread_id>/events')
+@login_required(role_ids=[ROLES['patient'], ROLES['doctor'], ROLES['asha']])
+def chat_events(thread_id):
+    db = get_db()
+    if not participant_thread(db, thread_id):
+        return no_chat_access()
+    if not chat_stream_slots.acquire(blocking=False):
+        return app.response_class(status=204)
+
+    cursor = request.headers.get('Last-Event-ID', type=int)
+    if cursor is None:
+        cursor = request.args.get('after_id', 0, type=int)
+    user_id = session['user_id']
+
+    def stream(cursor):
+        # Subscribe before the first read so a message sent in between still wakes us.
+        with chat_hub.subscribe(thread_id) as sub:
+            deadline = time.monotonic() + CHAT_STREAM_SECONDS
+            yield "retry: 2000\n\n"
+            while True:
+                messages = db.execute(MESSAGES_AFTER_SQL, (thread_id, cursor, MAX_MESSAGE_PAGE_SIZE)).fetchall()
+                # Like get_messages, handing the messages over marks them read.
+                if messages:
+                    mark_read(db, thread_id, user_id, messages[-1]['id'])
+                    db.commit()
+                for row in messages:
+                    cursor = row['id']
+                    yield f"id: {cursor}\ndata: {json.dumps(message_to_dict(row))}\n\n"
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                if len(messages) == MAX_MESSAGE_PAGE_SIZE:
+                    continue
+                if not sub.wait(min(CHAT_STREAM_KEEPALIVE, remaining)):
+                    yield ": keepalive\n\n"
+
+    response = app.response_class(stream_with_context(stream(cursor)), mimetype='text/event-stream')
+    response.call_on_close(chat_stream_slots.release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/chat/<int:thread_id>/send', methods=['POST'])
 @login_required(role_ids=[ROLES['patient'], ROLES['doctor'], ROLES['asha']])
 def send_message(thread_id):
+    db = get_db()
+    if not participant_thread(db, thread_id):
+        return no_chat_access()
     message_text = request.form.get('message_text')
     file = request.files.get('file')
     file_path = None
 
     if file and file.filename != '':
-        filename = secure_filename(file.filename)
-        timestamp = int(time.time())
-        unique_filename = f"{timestamp}_{filename}"
-        file_path = os.path.join('uploads', unique_filename)
-        file.save(os.path.join(app.config['UPLOAD_FOLDER'], unique_filename))
+        try:
+            file_path = 'uploads/' + save_upload(file, app.config['UPLOAD_FOLDER'])
+        except UploadTooLarge as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 413
 
     if not message_text and not file_path:
         return jsonify({'status': 'error', 'message': 'Cannot send an empty message.'}), 400
 
-    db = get_db()
-    db.execute(
+    cursor = db.execute(
         'INSERT INTO chat_messages (thread_id, sender_id, message_text, file_path) VALUES (?, ?, ?, ?)',
         (thread_id, session['user_id'], message_text, file_path)
     )
+    if file_path:
+        queue_media_jobs(db, 'chat_messages', cursor.lastrowid, file_path[len('uploads/'):])
     db.commit()
+    chat_hub.publish(thread_id, cursor.lastrowid)
     return jsonify({'status': 'success'})
 
 # --- Doctor Feature Routes ---
+PENDING_PAGE_SIZE = 50
+
 @app.route('/doctor/available-patients')
 @login_required(role_ids=[ROLES['doctor']])
 def available_patients():
+    # Keyset pagination on (created_at, id): each page starts right after the last
+    # case of the previous one, so deep pages cost the same as the first.
+    after_ts = request.args.get('after_ts')
+    after_id = request.args.get('after_id', type=int)
     db = get_db()
-    pending_cases = db.execute("SELECT * FROM consultations WHERE status = 'Pending' ORDER BY created_at ASC").fetchall()
-    return render_template('available_patients.html', cases=pending_cases)
+    if after_ts and after_id is not None:
+        pending_cases = db.execute(
+            PENDING_CASES_SQL.format(where=PENDING_AFTER_CURSOR),
+            (after_ts, after_id, PENDING_PAGE_SIZE + 1)
+        ).fetchall()
+    else:
+        pending_cases = db.execute(PENDING_CASES_SQL.format(where=''), (PENDING_PAGE_SIZE + 1,)).fetchall()
+
+    next_cursor = None
+    if len(pending_cases) > PENDING_PAGE_SIZE:
+        pending_cases = pending_cases[:PENDING_PAGE_SIZE]
+        last = pending_cases[-1]
+        next_cursor = {'after_ts': last['created_at'], 'after_id': last['id']}
+    return render_template('available_patients.html', cases=pending_cases, next_cursor=next_cursor,
+                           is_first_page=after_id is None)
 
 @app.route('/dashboard/doctor')
 @login_required(role_ids=[ROLES['doctor']])
 def doctor_dashboard():
     db = get_db()
     doctor_id = session['user_id']
-    assigned_cases = db.execute("SELECT * FROM consultations c WHERE c.doctor_id = ? AND c.status = 'Under Review' ORDER BY c.created_at ASC", (doctor_id,)).fetchall()
-    return render_template('doctor_dashboard.html', cases=assigned_cases)
+    assigned_cases = db.execute(DOCTOR_CASES_SQL, (doctor_id,)).fetchall()
+    availability = db.execute('SELECT accepting_cases, max_active_cases FROM users WHERE id = ?', (doctor_id,)).fetchone()
+    return render_template('doctor_dashboard.html', cases=assigned_cases, availability=availability,
+                           default_capacity=DEFAULT_CASE_CAPACITY)
+
+@app.route('/doctor/availability', methods=['POST'])
+@login_required(role_ids=[ROLES['doctor']])
+def doctor_availability():
+    accepting = 1 if request.form.get('accepting_cases') else 0
+    capacity = request.form.get('max_active_cases', type=int)
+    if capacity is not None and not 1 <= capacity <= 50:
+        flash('Case limit must be between 1 and 50.', 'danger')
+        return redirect(url_for('doctor_dashboard'))
+    db = get_db()
+    db.execute('UPDATE users SET accepting_cases = ?, max_active_cases = ? WHERE id = ?', (accepting, capacity, session['user_id']))
+    db.commit()
+    flash('New cases will be assigned to you automatically.' if accepting else 'You will not be assigned new cases.', 'success')
+    return redirect(url_for('doctor_dashboard'))
 
 @app.route('/doctor/chats')
 @login_required(role_ids=[ROLES['doctor']])
 def doctor_chats():
     db = get_db()
     doctor_id = session['user_id']
-    threads = db.execute(
-        '''
-        SELECT ct.id, u.name as patient_name
-        FROM chat_threads ct
-        JOIN users u ON ct.patient_id = u.id
-        WHERE ct.doctor_id = ?
-        ''',
-        (doctor_id,)
-    ).fetchall()
-    return render_template('doctor_chats.html', threads=threads)
+    threads, next_cursor = get_inbox(db, doctor_id, 'doctor')
+    unread_threads, _unread_messages = unread_total(db, doctor_id, 'doctor')
+    return render_template('doctor_chats.html', threads=threads, next_cursor=next_cursor, unread_threads=unread_threads)
+
+@app.route('/api/chat/inbox')
+@login_required(role_ids=[ROLES['doctor'], ROLES['patient']])
+def chat_inbox():
+    # Newest activity first; pass next_cursor's before_ts/before_id back for older threads.
+    side = 'doctor' if session['user_role'] == ROLES['doctor'] else 'patient'
+    db = get_db()
+    before_id = request.args.get('before_id', type=int)
+    threads, next_cursor = get_inbox(
+        db, session['user_id'], side,
+        before_ts=request.args.get('before_ts'), before_id=before_id,
+        limit=request.args.get('limit', INBOX_PAGE_SIZE, type=int)
+    )
+    payload = {'threads': threads, 'next_cursor': next_cursor}
+    if before_id is None:
+        payload['unread_threads'], payload['unread_messages'] = unread_total(db, session['user_id'], side)
+    return jsonify(payload)
 
 @app.route('/doctor/accept-case/<int:case_id>', methods=['POST'])
 @login_required(role_ids=[ROLES['doctor']])
 def accept_case(case_id):
     db = get_db()
-    case = db.execute("SELECT * FROM consultations WHERE id = ? AND status = 'Pending'", (case_id,)).fetchone()
-    if case:
-        db.execute("UPDATE consultations SET doctor_id = ?, status = 'Under Review' WHERE id = ?", (session['user_id'], case_id))
-        db.commit()
+    # The status check and the claim are one statement, so exactly one doctor's UPDATE can match.
+    claimed = db.execute(ACCEPT_CASE_SQL, (session['user_id'], case_id)).rowcount
+    db.commit()
+    if claimed:
         flash(f'Case #{case_id} has been assigned to you. It is now in your "My Schedule".', 'success')
         return redirect(url_for('doctor_dashboard'))
+
+    case = db.execute('SELECT doctor_id, status FROM consultations WHERE id = ?', (case_id,)).fetchone()
+    if not case:
+        flash(f'Case #{case_id} no longer exists.', 'danger')
+    elif case['doctor_id'] == session['user_id']:
+        flash(f'Case #{case_id} is already in your "My Schedule".', 'info')
+        return redirect(url_for('doctor_dashboard'))
     else:
-        flash('This case has already been accepted by another doctor.', 'warning')
-        return redirect(url_for('available_patients'))
+        flash(f'Case #{case_id} was just accepted by another doctor.', 'warning')
+    return redirect(url_for('available_patients'))
 
 @app.route('/doctor/consultation/<int:case_id>')
 @login_required(role_ids=[ROLES['doctor']])
@@ -516,13 +821,16 @@ def submit_response(case_id):
     audio_note = request.files.get('audio_note')
     audio_filename = None
     if audio_note and audio_note.filename != '':
-        filename = secure_filename(audio_note.filename)
-        timestamp = int(time.time())
-        audio_filename = f"{timestamp}_{filename}"
-        audio_note.save(os.path.join(app.config['UPLOAD_FOLDER'], audio_filename))
+        try:
+            audio_filename = save_upload(audio_note, app.config['UPLOAD_FOLDER'])
+        except UploadTooLarge as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('view_consultation', case_id=case_id))
     db = get_db()
-    db.execute("UPDATE consultations SET doctor_response = ?, audio_note_filename = ?, status = 'Reviewed' WHERE id = ?",
+    db.execute("UPDATE consultations SET doctor_response = ?, audio_note_filename = ?, status = 'Reviewed', reviewed_at = CURRENT_TIMESTAMP WHERE id = ?",
               (response_text, audio_filename, case_id))
+    if audio_filename:
+        queue_media_jobs(db, 'consultations', case_id, audio_filename)
     db.commit()
     flash('Your response has been sent to the patient.', 'success')
     return redirect(url_for('doctor_dashboard'))
@@ -531,44 +839,67 @@ def submit_response(case_id):
 @login_required(role_ids=[ROLES['doctor']])
 def view_patient_history():
     db = get_db()
-    reviewed_cases = db.execute(
-        "SELECT c.*, p.name as patient_name FROM consultations c JOIN users p ON c.patient_id = p.id WHERE c.status = 'Reviewed' AND c.doctor_id = ? ORDER BY c.created_at DESC",
-        (session['user_id'],)
-    ).fetchall()
+    reviewed_cases = db.execute(REVIEWED_CASES_SQL, (session['user_id'],)).fetchall()
     return render_template('view_patient_history.html', cases=reviewed_cases)
 
 # --- ASHA Feature Routes ---
 @app.route('/asha/dashboard')
 @login_required(role_ids=[ROLES['asha']])
 def asha_dashboard():
-    db = get_db()
     asha_id = session['user_id']
-    households = db.execute('SELECT * FROM households WHERE asha_id = ?', (asha_id,)).fetchall()
-    
-    mch_summary = {'total_pregnancies': 2, 'immunization_due': 1}
-    return render_template('asha_dashboard.html', households=households, mch_summary=mch_summary)
+    db = asha_db(asha_id)
+    # Kept up to date by triggers on households and mch_records; see asha_summary.py.
+    summary = get_asha_summary(db, asha_id)
+    return render_template('asha_dashboard.html', summary=summary)
 
 @app.route('/asha/households')
 @login_required(role_ids=[ROLES['asha']])
 def asha_household_list():
-    db = get_db()
     asha_id = session['user_id']
-    households = db.execute('SELECT * FROM households WHERE asha_id = ?', (asha_id,)).fetchall()
+    db = asha_db(asha_id)
+    households = db.execute(ASHA_HOUSEHOLDS_SQL, (asha_id,)).fetchall()
     return render_template('asha_household_list.html', households=households)
     
 @app.route('/search', methods=['GET'])
 @login_required(role_ids=[ROLES['asha']])
 def search_households():
     query = request.args.get('query', '')
-    db = get_db()
-    asha_id = session['user_id']
-    
-    all_households = db.execute(
-        "SELECT * FROM households WHERE asha_id = ? AND (household_name LIKE ? OR id LIKE ?)",
-        (asha_id, f'%{query}%', f'%{query}%')
-    ).fetchall()
-    
-    return render_template('asha_household_list.html', households=all_households)
+    db = asha_db(session['user_id'])
+    all_households = search_household_index(db, session['user_id'], query)
+    return render_template('asha_household_list.html', households=all_households, query=query)
+
+@app.route('/search/autocomplete')
+@login_required(role_ids=[ROLES['asha']])
+def autocomplete_households():
+    query = request.args.get('q', '')
+    db = asha_db(session['user_id'])
+    matches = search_household_index(db, session['user_id'], query, limit=AUTOCOMPLETE_LIMIT,
+                                     columns='h.id, h.household_name, h.address')
+    return jsonify([dict(row) for row in matches])
+
+@app.route('/households/import', methods=['GET', 'POST'])
+@login_required(role_ids=[ROLES['asha'], ROLES['admin']])
+def import_households():
+    is_admin = session['user_role'] == ROLES['admin']
+    result = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        kind = request.form.get('kind', 'households')
+        if not upload or not upload.filename or kind not in IMPORT_KINDS:
+            flash('Choose a CSV file and what it contains.', 'danger')
+            return redirect(url_for('import_households'))
+        # Admins name the ASHA on every row; an ASHA imports into their own list.
+        if is_admin:
+            db, owner = get_db(), {'ashas': asha_directory(get_db(), ROLES['asha']), 'route': asha_db}
+        else:
+            db, owner = asha_db(session['user_id']), {'asha_id': session['user_id']}
+        try:
+            result = import_csv(db, io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline=''), kind, **owner)
+        except (UnicodeDecodeError, csv.Error) as e:
+            flash(f'Could not read the file: {e}', 'danger')
+            return redirect(url_for('import_households'))
+        flash(f"Imported {result['imported']} of {result['rows']} rows.", 'success' if not result['error_count'] else 'warning')
+    return render_template('household_import.html', result=result, kinds=IMPORT_KINDS, is_admin=is_admin)
 
 @app.route('/add_new_household', methods=['GET', 'POST'])
 @login_required(role_ids=[ROLES['asha']])
@@ -577,11 +908,12 @@ def add_new_household():
         household_name = request.form['household_name']
         address = request.form['address']
         members_count = request.form['members_count']
-        db = get_db()
-        db.execute(
+        db = asha_db(session['user_id'])
+        cursor = db.execute(
             "INSERT INTO households (asha_id, household_name, address, members_count) VALUES (?, ?, ?, ?)",
             (session['user_id'], household_name, address, members_count)
         )
+        index_household(db, cursor.lastrowid)
         db.commit()
         flash('New household added successfully!', 'success')
         return redirect(url_for('asha_household_list'))
@@ -591,7 +923,7 @@ def add_new_household():
 @app.route('/household/<int:household_id>')
 @login_required(role_ids=[ROLES['asha']])
 def household_details(household_id):
-    db = get_db()
+    db = asha_db(session['user_id'])
     household = db.execute('SELECT * FROM households WHERE id = ? AND asha_id = ?', (household_id, session['user_id'])).fetchone()
     
     if not household:
@@ -603,7 +935,7 @@ def household_details(household_id):
 @app.route('/edit_household/<int:household_id>', methods=['GET', 'POST'])
 @login_required(role_ids=[ROLES['asha']])
 def edit_household(household_id):
-    db = get_db()
+    db = asha_db(session['user_id'])
     household = db.execute('SELECT * FROM households WHERE id = ? AND asha_id = ?', (household_id, session['user_id'])).fetchone()
     
     if not household:
@@ -619,6 +951,7 @@ def edit_household(household_id):
             "UPDATE households SET household_name = ?, address = ?, members_count = ? WHERE id = ?",
             (household_name, address, members_count, household_id)
         )
+        index_household(db, household_id)
         db.commit()
         flash('Household updated successfully!', 'success')
         return redirect(url_for('household_details', household_id=household_id))
@@ -628,7 +961,7 @@ def edit_household(household_id):
 
 @app.route('/asha/mch')
 @login_required(role_ids=[ROLES['asha']])
-def asha_mch(): return render_template('asha_mch.html')
+def asha_mch(): return page_cache.render('asha_mch.html')
 
 @app.route('/asha/mch/pregnancy')
 @login_required(role_ids=[ROLES['asha']])
@@ -639,30 +972,78 @@ def asha_pregnancy_tracking():
     ]
     return render_template('asha_pregnancy_tracking.html', pregnancies=pregnancies_data)
 
-@app.route('/asha/mch/immunization')
+@app.route('/asha/mch/immunization', methods=['GET', 'POST'])
 @login_required(role_ids=[ROLES['asha']])
 def asha_immunization():
-    children_data = [
-        {'name': 'Rohan Kumar', 'dob': '2022-04-10', 'next_vaccine': 'DPT-1', 'next_vaccine_date': '2025-10-10'},
-        {'name': 'Ananya Sharma', 'dob': '2024-01-25', 'next_vaccine': 'OPV-3', 'next_vaccine_date': '2025-11-05'}
-    ]
-    return render_template('asha_immunization.html', children=children_data)
+    # Due doses are precomputed (see immunization.py); recording one posts the
+    # same change a device would sync, which refreshes the child's due dates.
+    db = asha_db(session['user_id'])
+    if request.method == 'POST':
+        data = {'child_id': request.form.get('child_id'), 'record_type': 'immunization',
+                'vaccine': request.form.get('vaccine'), 'record_date': request.form.get('record_date')}
+        change = {'client_id': request.form.get('client_id'), 'op': 'create', 'entity': 'mch_record', 'data': data}
+        result = apply_changes(db, session['user_id'], [change])[0]
+        if result['status'] == 'rejected':
+            flash(f"Could not record the dose: {result['error']}.", 'danger')
+        else:
+            flash(f"Recorded {data['vaccine']} on {data['record_date']}.", 'success')
+        return redirect(url_for('asha_immunization'))
+    today = local_today()
+    lists = immunization_due_lists(db, session['user_id'], today)
+    for item in lists['overdue'] + lists['due_soon']:
+        item['client_id'] = str(uuid.uuid4())
+    return render_template('asha_immunization.html', overdue=lists['overdue'], due_soon=lists['due_soon'],
+                           soon_days=DUE_SOON_DAYS, today=today.isoformat())
 
 @app.route('/asha/reporting')
 @login_required(role_ids=[ROLES['asha']])
-def asha_reporting(): return render_template('asha_reporting.html')
+def asha_reporting(): return page_cache.render('asha_reporting.html')
 
-@app.route('/asha/submit_birth_form')
+def field_report_form(report_type, template):
+    # The forms post the same change a device would sync, so a form re-submitted
+    # after a timeout is recognised by its client_id and only saved once.
+    if request.method == 'POST':
+        change = {'client_id': request.form.get('client_id'), 'op': 'create',
+                  'entity': f'{report_type}_report', 'data': request.form.to_dict()}
+        result = apply_changes(asha_db(session['user_id']), session['user_id'], [change])[0]
+        if result['status'] == 'rejected':
+            flash(f"Could not save the report: {result['error']}.", 'danger')
+            return render_template(template, client_id=change['client_id'] or str(uuid.uuid4()), form=request.form)
+        flash('Report saved.', 'success')
+        return redirect(url_for('asha_reporting'))
+    return render_template(template, client_id=str(uuid.uuid4()), form={})
+
+@app.route('/asha/submit_birth_form', methods=['GET', 'POST'])
 @login_required(role_ids=[ROLES['asha']])
-def asha_submit_birth_form(): return render_template('asha_birth_form.html')
+def asha_submit_birth_form(): return field_report_form('birth', 'asha_birth_form.html')
 
-@app.route('/asha/submit_death_form')
+@app.route('/asha/submit_death_form', methods=['GET', 'POST'])
 @login_required(role_ids=[ROLES['asha']])
-def asha_submit_death_form(): return render_template('asha_death_form.html')
+def asha_submit_death_form(): return field_report_form('death', 'asha_death_form.html')
 
-@app.route('/asha/submit_disease_form')
+@app.route('/asha/submit_disease_form', methods=['GET', 'POST'])
 @login_required(role_ids=[ROLES['asha']])
-def asha_submit_disease_form(): return render_template('asha_disease_form.html')
+def asha_submit_disease_form(): return field_report_form('disease', 'asha_disease_form.html')
+
+@app.route('/api/sync', methods=['POST'])
+@login_required(role_ids=[ROLES['asha']])
+def asha_sync():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get('changes', []), list):
+        return jsonify({'error': 'Expected a JSON object with a "changes" list.'}), 400
+    changes = payload.get('changes', [])
+    if len(changes) > MAX_CHANGES:
+        return jsonify({'error': f'At most {MAX_CHANGES} changes per request.'}), 413
+    since = payload.get('since')
+    if since is not None and (not isinstance(since, int) or isinstance(since, bool) or since < 0):
+        return jsonify({'error': '"since" must be a change version or null.'}), 400
+    asha_id = session['user_id']
+    db = asha_db(asha_id)
+    response = {'applied': apply_changes(db, asha_id, changes) if changes else []}
+    # Without "since" the device only wants its changes acknowledged.
+    if since is not None:
+        response['changes'], response['version'], response['more'] = changes_since(db, asha_id, since)
+    return jsonify(response)
 
 @app.route('/asha/incentives')
 @login_required(role_ids=[ROLES['asha']])
@@ -699,11 +1080,40 @@ def asha_educational_resources():
 def admin_dashboard():
     return render_template('admin_dashboard.html')
 
+@app.route('/api/admin/analytics')
+@login_required(role_ids=[ROLES['admin']])
+def admin_analytics():
+    metrics = get_admin_metrics(get_db(), ROLES, app.config['DATABASE'], refresh=request.args.get('refresh') == '1',
+                                partitions=partition_dbs())
+    return jsonify(metrics)
+
+@app.route('/admin/export/<table>.parquet')
+@login_required(role_ids=[ROLES['admin']])
+def admin_export(table):
+    if table not in EXPORTS:
+        abort(404)
+    since = request.args.get('since') or None
+    until = request.args.get('until') or None
+    incremental = request.args.get('incremental') == '1'
+    try:
+        export_mode(since, until, incremental)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    partitions = partition_dbs() if table in PARTITIONED_TABLES else ()
+    chunks = stream_parquet(get_db(), table, since=since, until=until, incremental=incremental, partitions=partitions)
+    return app.response_class(
+        stream_with_context(chunks),
+        mimetype='application/vnd.apache.parquet',
+        headers={'Content-Disposition': f'attachment; filename="{export_filename(table, since, until, incremental)}"'}
+    )
+
 # --- Main Execution ---
 if __name__ == '__main__':
-    if not os.path.exists(DATABASE):
+    with app.app_context():
         init_db()
-    seed_db()
+        seed_db()
+    # In production the Procfile's worker process runs the job queue.
+    JobWorker(app.config['DATABASE'], app.config['UPLOAD_FOLDER']).start()
     # Use use_reloader=False if you are on Windows and experience crashes
     app.run(debug=True)
 
@@ -0,0 +1,94 @@
+import argparse
+import os
+import sys
+
+# --- ASHA Dashboard Aggregates ---
+# asha_summary keeps one row of counts per ASHA. Triggers on households and
+# mch_records (migration 9) adjust it on every insert, update and delete, so the
+# dashboard reads its numbers with one primary-key lookup instead of grouping
+# both tables. rebuild_summaries() recomputes everything from scratch, and
+# check_summaries() reports any row that has drifted from a live recount.
+
+SUMMARY_COLUMNS = ('households', 'verified_households', 'household_members',
+                   'mch_records', 'pregnancies', 'immunizations', 'growth_records')
+SUMMARY_SQL = f'SELECT {", ".join(SUMMARY_COLUMNS)} FROM asha_summary WHERE asha_id = ?'
+
+# The same numbers the triggers maintain, computed directly from the source tables.
+LIVE_SUMMARY_SQL = '''
+    WITH ashas AS (
+        SELECT asha_id FROM households WHERE asha_id IS NOT NULL
+        UNION
+        SELECT asha_id FROM mch_records WHERE asha_id IS NOT NULL
+    ),
+    h AS (
+        SELECT asha_id,
+               COUNT(*) AS households,
+               SUM(COALESCE(is_verified, 0) <> 0) AS verified_households,
+               COALESCE(SUM(CAST(members_count AS INTEGER)), 0) AS household_members
+        FROM households WHERE asha_id IS NOT NULL GROUP BY asha_id
+    ),
+    m AS (
+        SELECT asha_id,
+               COUNT(*) AS mch_records,
+               SUM(record_type = 'pregnancy') AS pregnancies,
+               SUM(record_type = 'immunization') AS immunizations,
+               SUM(record_type = 'growth') AS growth_records
+        FROM mch_records WHERE asha_id IS NOT NULL GROUP BY asha_id
+    )
+    SELECT a.asha_id,
+           COALESCE(h.households, 0), COALESCE(h.verified_households, 0), COALESCE(h.household_members, 0),
+           COALESCE(m.mch_records, 0), COALESCE(m.pregnancies, 0), COALESCE(m.immunizations, 0), COALESCE(m.growth_records, 0)
+    FROM ashas a
+    LEFT JOIN h ON h.asha_id = a.asha_id
+    LEFT JOIN m ON m.asha_id = a.asha_id
+'''
+
+def get_summary(db, asha_id):
+    """The dashboard counts for one ASHA; all zero if they have no records yet."""
+    row = db.execute(SUMMARY_SQL, (asha_id,)).fetchone()
+    if row is None:
+        return dict.fromkeys(SUMMARY_COLUMNS, 0)
+    return dict(zip(SUMMARY_COLUMNS, row))
+
+def rebuild_summaries(db):
+    """Recompute every ASHA's counts from households and mch_records; returns the number of rows written."""
+    db.execute('DELETE FROM asha_summary')
+    cursor = db.execute(f'INSERT INTO asha_summary (asha_id, {", ".join(SUMMARY_COLUMNS)}) {LIVE_SUMMARY_SQL}')
+    return cursor.rowcount
+
+def check_summaries(db):
+    """Return {asha_id: {column: (stored, actual)}} for every ASHA whose stored counts are wrong."""
+    stored = {row[0]: tuple(row[1:]) for row in db.execute(f'SELECT asha_id, {", ".join(SUMMARY_COLUMNS)} FROM asha_summary')}
+    actual = {row[0]: tuple(row[1:]) for row in db.execute(LIVE_SUMMARY_SQL)}
+    zeros = (0,) * len(SUMMARY_COLUMNS)
+    problems = {}
+    for asha_id in stored.keys() | actual.keys():
+        have, want = stored.get(asha_id, zeros), actual.get(asha_id, zeros)
+        if have != want:
+            problems[asha_id] = {column: (h, w) for column, h, w in zip(SUMMARY_COLUMNS, have, want) if h != w}
+    return problems
+
+if __name__ == '__main__':
+    from database import connect
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Check or rebuild the per-ASHA dashboard summaries.')
+    parser.add_argument('command', choices=['check', 'rebuild'])
+    parser.add_argument('--db', default=os.environ.get('DATABASE', 'swasthsathi.db'))
+    args = parser.parse_args()
+    conn = connect(args.db)
+    migrate(conn)
+    if args.command == 'rebuild':
+        conn.execute('BEGIN IMMEDIATE')
+        count = rebuild_summaries(conn)
+        conn.commit()
+        print(f"Rebuilt summaries for {count} ASHAs.")
+    else:
+        problems = check_summaries(conn)
+        for asha_id, columns in sorted(problems.items()):
+            details = ', '.join(f'{c} stored {h} actual {w}' for c, (h, w) in columns.items())
+            print(f"- ASHA {asha_id}: {details}")
+        if problems:
+            print(f"{len(problems)} ASHA summaries are out of date; run with 'rebuild'.")
+            sys.exit(1)
+        print("All ASHA summaries match.")
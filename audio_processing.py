@@ -0,0 +1,232 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import wave
+
+import numpy as np
+
+from media_store import store_file
+
+# --- Voice Note Processing ---
+# An offline pass over consultations.audio_note_filename and chat voice messages:
+#   * re-encode every note to mono Opus at 24 kbit/s in WebM (needs ffmpeg),
+#   * record audio_duration_ms and a short audio_peaks array on the row, so
+#     players can draw a waveform and show the length without fetching the file.
+# Without ffmpeg, plain PCM WAV is still analysed and shrunk to 16 kHz mono
+# PCM; other containers are analysed only when ffmpeg is present.
+# Notes uploaded through the app are queued as 'voice_note' jobs (job_queue.py)
+# and processed one by one with process_row(); this pass catches up the rest.
+
+FFMPEG = os.environ.get('FFMPEG_BINARY') or shutil.which('ffmpeg')
+AUDIO_EXTENSIONS = {'.wav', '.mp3', '.m4a', '.webm', '.ogg', '.opus'}
+OPUS_BITRATE = '24k'
+ANALYSIS_RATE = 8000
+FALLBACK_RATE = 16000
+PEAK_BUCKETS = 64
+# Table -> column holding the voice note's stored name.
+NOTE_COLUMNS = {'consultations': 'audio_note_filename', 'chat_messages': 'file_path'}
+# Chat attachments are voice notes only when their name says so.
+CHAT_AUDIO_SQL = '(' + ' OR '.join(f"lower(file_path) LIKE '%{ext}'" for ext in sorted(AUDIO_EXTENSIONS)) + ')'
+
+def sniff_extension(path):
+    """The container a file really is. Browsers happily record WebM into a '.wav' name."""
+    with open(path, 'rb') as f:
+        head = f.read(12)
+    if head.startswith(b'\x1a\x45\xdf\xa3'):
+        return '.webm'
+    if head.startswith(b'RIFF') and head[8:12] == b'WAVE':
+        return '.wav'
+    if head.startswith(b'OggS'):
+        return '.ogg'
+    if head.startswith(b'ID3') or head[:2] in (b'\xff\xfb', b'\xff\xf3', b'\xff\xf2'):
+        return '.mp3'
+    if head[4:8] == b'ftyp':
+        return '.m4a'
+    return os.path.splitext(path)[1].lower()
+
+def _read_pcm_wav(path):
+    with wave.open(path, 'rb') as w:
+        if w.getcomptype() != 'NONE' or w.getsampwidth() != 2:
+            return None, None
+        channels, rate = w.getnchannels(), w.getframerate()
+        samples = np.frombuffer(w.readframes(w.getnframes()), dtype='<i2')
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return samples, rate
+
+def decode_pcm(path, rate=ANALYSIS_RATE):
+    """Mono int16 samples for analysis, or (None, None) if nothing here can decode the file."""
+    if FFMPEG:
+        result = subprocess.run(
+            [FFMPEG, '-v', 'error', '-i', path, '-f', 's16le', '-ac', '1', '-ar', str(rate), '-'],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False,
+        )
+        if result.returncode == 0:
+            return np.frombuffer(result.stdout, dtype='<i2'), rate
+    if sniff_extension(path) == '.wav':
+        return _read_pcm_wav(path)
+    return None, None
+
+def waveform_peaks(samples, buckets=PEAK_BUCKETS):
+    """Peak amplitude per bucket, scaled to 0-100 against the loudest bucket."""
+    if samples is None or len(samples) == 0:
+        return []
+    magnitude = np.abs(samples.astype(np.int32))
+    buckets = min(buckets, len(magnitude))
+    # Pad to a whole number of buckets so one reshape does the grouping.
+    size = -(-len(magnitude) // buckets)
+    padded = np.zeros(size * buckets, dtype=np.int32)
+    padded[:len(magnitude)] = magnitude
+    peaks = padded.reshape(buckets, size).max(axis=1)
+    loudest = peaks.max()
+    if loudest == 0:
+        return [0] * buckets
+    return np.round(peaks * 100 / loudest).astype(int).tolist()
+
+def _resample_wav(samples, rate, target_rate, out_path):
+    if rate != target_rate:
+        positions = np.arange(0, len(samples), rate / target_rate)
+        samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.int16)
+    with wave.open(out_path, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(target_rate)
+        w.writeframes(samples.astype('<i2').tobytes())
+
+def transcode(path, upload_folder):
+    """Compact copy of the note in the upload store; returns its name, or None to keep the original."""
+    fd, out_path = tempfile.mkstemp(dir=upload_folder, prefix='.transcode-', suffix='.webm' if FFMPEG else '.wav')
+    os.close(fd)
+    try:
+        if FFMPEG:
+            result = subprocess.run(
+                [FFMPEG, '-v', 'error', '-y', '-i', path, '-vn', '-ac', '1', '-c:a', 'libopus',
+                 '-b:a', OPUS_BITRATE, '-application', 'voip', out_path],
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=False,
+            )
+            ok = result.returncode == 0
+            ext = '.webm'
+        else:
+            ok = False
+            ext = '.wav'
+            if sniff_extension(path) == '.wav':
+                samples, rate = _read_pcm_wav(path)
+                if samples is not None:
+                    _resample_wav(samples, rate, min(rate, FALLBACK_RATE), out_path)
+                    ok = True
+        if not ok or os.path.getsize(out_path) >= os.path.getsize(path):
+            os.unlink(out_path)
+            return None
+        return store_file(out_path, ext, upload_folder)
+    except BaseException:
+        if os.path.exists(out_path):
+            os.unlink(out_path)
+        raise
+
+def process_file(upload_folder, name):
+    """Returns (stored name, duration_ms, peaks) for one upload."""
+    path = os.path.join(upload_folder, name)
+    samples, rate = decode_pcm(path)
+    duration_ms = int(len(samples) * 1000 / rate) if samples is not None else None
+    peaks = waveform_peaks(samples)
+
+    new_name = transcode(path, upload_folder)
+    if new_name is None and sniff_extension(path) != os.path.splitext(name)[1].lower():
+        # Keep the bytes but give the file the extension browsers need to pick a decoder.
+        fd, copy_path = tempfile.mkstemp(dir=upload_folder, prefix='.rename-')
+        os.close(fd)
+        shutil.copyfile(path, copy_path)
+        new_name = store_file(copy_path, sniff_extension(path), upload_folder)
+    return new_name or name, duration_ms, peaks
+
+def _is_referenced(db, name):
+    return db.execute(
+        'SELECT 1 FROM consultations WHERE audio_note_filename = ? OR photo_filename = ? '
+        'UNION ALL SELECT 1 FROM chat_messages WHERE file_path = ? LIMIT 1',
+        (name, name, 'uploads/' + name)
+    ).fetchone() is not None
+
+def process_pending(db, upload_folder, limit=None, log=print):
+    """Process every voice note not yet handled; returns (processed, bytes saved)."""
+    jobs = []
+    for row in db.execute(
+        'SELECT id, audio_note_filename FROM consultations '
+        'WHERE audio_note_filename IS NOT NULL AND audio_processed_at IS NULL'
+    ):
+        jobs.append(('consultations', NOTE_COLUMNS['consultations'], row[0], row[1], row[1]))
+    # Other attachments (images) have nothing to process; stamping them keeps
+    # them out of the pending index and out of every later pass.
+    db.execute(
+        'UPDATE chat_messages SET audio_processed_at = CURRENT_TIMESTAMP '
+        f'WHERE file_path IS NOT NULL AND audio_processed_at IS NULL AND NOT {CHAT_AUDIO_SQL}'
+    )
+    db.commit()
+    for row in db.execute(
+        'SELECT id, file_path FROM chat_messages '
+        f'WHERE file_path IS NOT NULL AND audio_processed_at IS NULL AND {CHAT_AUDIO_SQL}'
+    ):
+        jobs.append(('chat_messages', NOTE_COLUMNS['chat_messages'], row[0], row[1], row[1][len('uploads/'):]))
+    if limit is not None:
+        jobs = jobs[:limit]
+
+    processed = saved = 0
+    for table, column, row_id, _stored_value, name in jobs:
+        result = _process_note(db, upload_folder, table, column, row_id, name, log)
+        if result is not None:
+            processed += 1
+            saved += result
+    return processed, saved
+
+def process_row(db, upload_folder, table, row_id, log=print):
+    """Process the voice note on one consultations/chat_messages row, unless that is already done."""
+    column = NOTE_COLUMNS[table]
+    row = db.execute(
+        f'SELECT {column} FROM {table} WHERE id = ? AND {column} IS NOT NULL AND audio_processed_at IS NULL', (row_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    name = row[0] if table == 'consultations' else row[0][len('uploads/'):]
+    return _process_note(db, upload_folder, table, column, row_id, name, log)
+
+def _process_note(db, upload_folder, table, column, row_id, name, log):
+    """Returns the bytes saved, or None if the file was missing."""
+    path = os.path.join(upload_folder, name)
+    if not os.path.exists(path):
+        log(f"- {table} #{row_id}: {name} is missing, skipped")
+        db.execute(f'UPDATE {table} SET audio_processed_at = CURRENT_TIMESTAMP WHERE id = ?', (row_id,))
+        db.commit()
+        return None
+    new_name, duration_ms, peaks = process_file(upload_folder, name)
+    new_value = new_name if table == 'consultations' else 'uploads/' + new_name
+    db.execute(
+        f'UPDATE {table} SET {column} = ?, audio_duration_ms = ?, audio_peaks = ?, '
+        f'audio_processed_at = CURRENT_TIMESTAMP WHERE id = ?',
+        (new_value, duration_ms, json.dumps(peaks) if peaks else None, row_id)
+    )
+    db.commit()
+    saved = 0
+    if new_name != name:
+        new_size = os.path.getsize(os.path.join(upload_folder, new_name))
+        if not _is_referenced(db, name):
+            saved = os.path.getsize(path) - new_size
+            os.unlink(path)
+    log(f"- {table} #{row_id}: {name} -> {new_name} ({duration_ms} ms)")
+    return saved
+
+if __name__ == '__main__':
+    from database import connect
+
+    parser = argparse.ArgumentParser(description='Transcode voice notes and precompute waveforms.')
+    parser.add_argument('--db', default=os.environ.get('DATABASE', 'swasthsathi.db'))
+    parser.add_argument('--uploads', default='static/uploads')
+    parser.add_argument('--limit', type=int)
+    args = parser.parse_args()
+    if not FFMPEG:
+        print("ffmpeg not found: only PCM WAV notes will be shrunk.", file=sys.stderr)
+    conn = connect(args.db)
+    count, saved = process_pending(conn, args.uploads, args.limit)
+    print(f"Processed {count} voice notes, saved {saved / 1024:.0f} KB.")
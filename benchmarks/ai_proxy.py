@@ -0,0 +1,80 @@
+"""Load test for the AI proxy against an offline stub upstream.
+
+Many threads ask symptom-style questions drawn from a skewed pool (a few
+questions are very common, most are rare), the way a clinic's patients do.
+Reports how many requests were served from cache, coalesced onto an
+in-flight call, or actually sent upstream, plus client-side latency.
+
+    python -m benchmarks.ai_proxy --clients 64 --requests 2000 --delay 0.3
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+
+from ai_proxy import AIProxy, StubTransport
+
+SYSTEM = 'You are an expert medical AI.'
+SYMPTOMS = ['fever', 'headache', 'cough', 'stomach ache', 'rash', 'joint pain', 'dizziness', 'sore throat']
+
+
+def prompt_pool(size):
+    rng = random.Random(0)
+    return [f'Patient: {rng.randint(1, 80)}, {rng.choice(["male", "female"])}. '
+            f'Symptoms: "{rng.choice(SYMPTOMS)} and {rng.choice(SYMPTOMS)}"' for _ in range(size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--prompts', type=int, default=300)
+    parser.add_argument('--delay', type=float, default=0.3, help='stub upstream latency in seconds')
+    parser.add_argument('--concurrency', type=int, default=8, help='upstream slots per worker')
+    args = parser.parse_args()
+
+    transport = StubTransport(args.delay)
+    proxy = AIProxy(transport, max_concurrency=args.concurrency, queue_timeout=600)
+    prompts = prompt_pool(args.prompts)
+    # Zipf-like weights: the i-th most common question is asked 1/(i+1) as often.
+    weights = [1 / (i + 1) for i in range(len(prompts))]
+    per_client = args.requests // args.clients
+    timings = []
+    lock = threading.Lock()
+
+    def client(seed):
+        rng = random.Random(seed)
+        local = []
+        for _ in range(per_client):
+            # Vary case and spacing; the proxy should still treat these as the same prompt.
+            text = rng.choices(prompts, weights)[0]
+            if rng.random() < 0.3:
+                text = '  ' + text.upper()
+            t0 = time.perf_counter()
+            proxy.complete('gemini', SYSTEM, [{'role': 'user', 'content': text}], options={'json_schema': {}})
+            local.append((time.perf_counter() - t0) * 1000)
+        with lock:
+            timings.extend(local)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    total = len(timings)
+    timings.sort()
+    stats = proxy.stats
+    print(f'{total} requests from {args.clients} clients in {elapsed:.1f}s ({total / elapsed:.0f} req/s)')
+    print(f'cache hits {stats["hits"]} ({stats["hits"] / total:.0%}), coalesced {stats["coalesced"]}, '
+          f'upstream calls {transport.calls} ({transport.calls / total:.0%})')
+    print(f'latency p50 {statistics.median(timings):.1f} ms  p95 {timings[int(total * 0.95) - 1]:.1f} ms  '
+          f'max {timings[-1]:.1f} ms')
+    print(f'without the proxy: {total} upstream calls, ~{args.delay * 1000:.0f} ms each')
+
+
+if __name__ == '__main__':
+    main()
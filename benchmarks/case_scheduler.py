@@ -0,0 +1,181 @@
+"""Simulation of case assignment: doctors pulling from the queue vs. the scheduler.
+
+Replays the same synthetic stream of consultations (Poisson arrivals, a mix of
+specialties, some urgent cases) against a scratch database twice, on a
+simulated clock with one-minute steps:
+
+  * manual: what happens today. Each doctor on shift opens the queue every
+    so often and accepts the oldest pending case if they have room.
+  * scheduler: case_scheduler.run_once() every minute.
+
+Doctors work shifts, review their cases one at a time, and occasionally claim
+a case and never answer it. Reports time from submission to assignment and
+to the doctor's review, overall and for urgent cases.
+
+    python -m benchmarks.case_scheduler --hours 72 --doctors 12 --arrivals 10
+"""
+import argparse
+import heapq
+import math
+import os
+import random
+import tempfile
+
+import case_scheduler
+from case_scheduler import run_once, URGENCY_LEVELS
+from database import connect
+from migrations import migrate
+
+DOCTOR_ROLE = 2
+START = 1_736_121_600  # 2025-01-06 00:00 UTC
+SPECIALTIES = ['General Physician', 'General Physician', 'Dermatologist', 'Pediatrician', 'Cardiologist', 'Gynecologist']
+CASE_MIX = {None: 0.4, 'General Physician': 0.2, 'Dermatologist': 0.15, 'Pediatrician': 0.1,
+            'Cardiologist': 0.08, 'Gynecologist': 0.07}
+
+
+def make_workload(hours, arrivals_per_hour, seed):
+    rng = random.Random(seed)
+    cases, t = [], START
+    end = START + hours * 3600
+    while True:
+        t += rng.expovariate(arrivals_per_hour / 3600)
+        if t >= end:
+            return cases
+        category = rng.choices(list(CASE_MIX), list(CASE_MIX.values()))[0]
+        urgency = rng.choices([0, 1, 2, 3], [0.7, 0.2, 0.07, 0.03])[0]
+        cases.append((t, category, urgency))
+
+
+def make_doctors(count, seed):
+    rng = random.Random(seed)
+    # (specialty, shift start hour, capacity)
+    return [(SPECIALTIES[i % len(SPECIALTIES)], rng.randrange(24), rng.choice([3, 5, 8])) for i in range(count)]
+
+
+def on_shift(shift_start, now, shift_hours=10):
+    hour = (now - START) / 3600 % 24
+    return (hour - shift_start) % 24 < shift_hours
+
+
+def prepare(path, doctors):
+    db = connect(path)
+    migrate(db)
+    ids = []
+    for i, (specialty, _shift, capacity) in enumerate(doctors):
+        ids.append(db.execute(
+            "INSERT INTO users (name, email, password_hash, role_id, specialty, max_active_cases) VALUES (?, ?, 'x', ?, ?, ?)",
+            (f'Doctor {i}', f'doctor{i}@sim', DOCTOR_ROLE, specialty, capacity)
+        ).lastrowid)
+    db.commit()
+    return db, ids
+
+
+def simulate(policy, workload, doctors, args):
+    path = os.path.join(tempfile.mkdtemp(prefix='swasthsathi-sim-'), 'sim.db')
+    db, doctor_ids = prepare(path, doctors)
+    rng = random.Random(args.seed + 1)
+    info = dict(zip(doctor_ids, doctors))
+    busy_until = dict.fromkeys(doctor_ids, 0.0)
+    next_poll = {d: START + rng.uniform(0, args.poll_minutes * 60) for d in doctor_ids}
+    reviews = []  # heap of (finish time, case id, doctor id)
+    pending_arrivals = list(workload)
+    ts = case_scheduler._timestamp
+
+    def claimed(case_id, doctor_id, now):
+        if rng.random() < args.abandon:
+            return  # claimed and forgotten
+        start = max(now, busy_until[doctor_id])
+        busy_until[doctor_id] = start + rng.expovariate(1 / (args.review_minutes * 60))
+        heapq.heappush(reviews, (busy_until[doctor_id], case_id, doctor_id))
+
+    now = START
+    end = START + args.hours * 3600
+    while now < end:
+        while pending_arrivals and pending_arrivals[0][0] <= now:
+            created, category, urgency = pending_arrivals.pop(0)
+            db.execute(
+                "INSERT INTO consultations (patient_id, symptoms, category, urgency, status, created_at) VALUES (1, 'sim', ?, ?, 'Pending', ?)",
+                (category, urgency, ts(created))
+            )
+        if now % 3600 < 60:
+            for doctor_id, (_specialty, shift, _capacity) in info.items():
+                db.execute('UPDATE users SET accepting_cases = ? WHERE id = ?', (int(on_shift(shift, now)), doctor_id))
+        db.commit()
+
+        if policy == 'scheduler':
+            for case_id, doctor_id in run_once(db, DOCTOR_ROLE, now)['assigned']:
+                claimed(case_id, doctor_id, now)
+        else:
+            for doctor_id, (_specialty, shift, capacity) in info.items():
+                if next_poll[doctor_id] > now:
+                    continue
+                next_poll[doctor_id] = now + rng.expovariate(1 / (args.poll_minutes * 60))
+                if not on_shift(shift, now):
+                    continue
+                active = db.execute("SELECT COUNT(*) FROM consultations WHERE doctor_id = ? AND status = 'Under Review'", (doctor_id,)).fetchone()[0]
+                if active >= capacity:
+                    continue
+                oldest = db.execute("SELECT id FROM consultations WHERE status = 'Pending' ORDER BY created_at, id LIMIT 1").fetchone()
+                if oldest and db.execute(
+                    "UPDATE consultations SET doctor_id = ?, status = 'Under Review', accepted_at = ? WHERE id = ? AND status = 'Pending'",
+                    (doctor_id, ts(now), oldest[0])
+                ).rowcount:
+                    db.commit()
+                    claimed(oldest[0], doctor_id, now)
+
+        while reviews and reviews[0][0] <= now:
+            finished, case_id, doctor_id = heapq.heappop(reviews)
+            db.execute(
+                "UPDATE consultations SET status = 'Reviewed', doctor_response = 'Reviewed', reviewed_at = ? "
+                "WHERE id = ? AND doctor_id = ? AND status = 'Under Review'",
+                (ts(finished), case_id, doctor_id)
+            )
+        db.commit()
+        now += 60
+
+    rows = db.execute(
+        '''
+        SELECT urgency,
+               (julianday(accepted_at) - julianday(created_at)) * 1440,
+               (julianday(reviewed_at) - julianday(created_at)) * 1440
+        FROM consultations
+        '''
+    ).fetchall()
+    db.close()
+    return rows
+
+
+def percentiles(values):
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return 'n/a'
+    pick = lambda p: values[min(len(values) - 1, math.ceil(p / 100 * len(values)) - 1)]
+    return f"p50 {pick(50):7.0f}  p90 {pick(90):7.0f}  p99 {pick(99):7.0f}  (n={len(values)})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hours', type=int, default=72)
+    parser.add_argument('--doctors', type=int, default=12)
+    parser.add_argument('--arrivals', type=float, default=10, help='new cases per hour')
+    parser.add_argument('--review-minutes', type=float, default=20, help='mean time a doctor spends on one case')
+    parser.add_argument('--poll-minutes', type=float, default=45, help='manual policy: mean time between queue visits')
+    parser.add_argument('--abandon', type=float, default=0.03, help='share of claims a doctor never answers')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    workload = make_workload(args.hours, args.arrivals, args.seed)
+    doctors = make_doctors(args.doctors, args.seed)
+    urgent = URGENCY_LEVELS['High']
+    print(f"{len(workload)} cases over {args.hours}h, {args.doctors} doctors. Minutes from submission:")
+    for policy in ('manual', 'scheduler'):
+        rows = simulate(policy, workload, doctors, args)
+        unreviewed = sum(1 for row in rows if row[2] is None)
+        print(f"\n{policy}: {unreviewed} cases still unreviewed at the end")
+        print(f"  to assignment       {percentiles(row[1] for row in rows)}")
+        print(f"  to review           {percentiles(row[2] for row in rows)}")
+        print(f"  to review (urgent)  {percentiles(row[2] for row in rows if row[0] >= urgent)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Concurrent-writer benchmark for the SQLite connection layer.
+
+Runs the same chat/symptom workload through the Flask app from several worker
+processes, first with the old connect-per-call get_db() on a rollback-journal
+database and then with the pooled WAL connections from database.py.
+
+    python -m benchmarks.db_concurrency --workers 8 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+import app as app_module
+from app import app, init_db, seed_db
+
+pooled_get_db = app_module.get_db
+
+
+def legacy_get_db():
+    # The pre-pool implementation: a fresh connection per call, never closed.
+    conn = sqlite3.connect(app.config['DATABASE'])
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def prepare_database(path):
+    app.config['DATABASE'] = path
+    with app.app_context():
+        init_db()
+        seed_db()
+        db = app_module.get_db()
+        patient = db.execute("SELECT id FROM users WHERE email = 'patient@test.com'").fetchone()['id']
+        doctor = db.execute("SELECT id FROM users WHERE email = 'sharma@doctor.com'").fetchone()['id']
+        thread_id = db.execute('INSERT INTO chat_threads (patient_id, doctor_id) VALUES (?, ?)', (patient, doctor)).lastrowid
+        db.commit()
+    return patient, thread_id
+
+
+def worker(path, patient_id, thread_id, seconds, results):
+    app.config['DATABASE'] = path
+    app.config['PROPAGATE_EXCEPTIONS'] = True
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = patient_id
+        sess['user_name'] = 'Bench Patient'
+        sess['user_role'] = app_module.ROLES['patient']
+
+    done = locked = 0
+    deadline = time.perf_counter() + seconds
+    i = 0
+    while time.perf_counter() < deadline:
+        i += 1
+        try:
+            if i % 3 == 0:
+                client.post('/submit-symptoms', data={'name': 'Bench', 'age': 30, 'gender': 'F', 'symptoms': 'fever'})
+            elif i % 3 == 1:
+                client.post(f'/chat/{thread_id}/send', data={'message_text': f'msg {i}'})
+            else:
+                client.get(f'/chat/{thread_id}/messages')
+            done += 1
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+    results.put((done, locked))
+
+
+def run(label, legacy, workers, seconds, tmpdir):
+    path = os.path.join(tmpdir, f'{label}.db')
+    # Legacy connections never switch the file to WAL, so it keeps the rollback journal.
+    app_module.get_db = legacy_get_db if legacy else pooled_get_db
+    patient_id, thread_id = prepare_database(path)
+
+    ctx = multiprocessing.get_context('fork')
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(path, patient_id, thread_id, seconds, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    totals = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    done = sum(t[0] for t in totals)
+    locked = sum(t[1] for t in totals)
+    print(f'{label:>8}: {done / seconds:8.1f} req/s  {locked:5d} lock errors  ({workers} workers, {seconds}s)')
+    return done / seconds, locked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        before, before_locked = run('legacy', True, args.workers, args.seconds, tmpdir)
+        after, after_locked = run('pooled', False, args.workers, args.seconds, tmpdir)
+    print(f'speedup: {after / before:.2f}x, lock errors {before_locked} -> {after_locked}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Autocomplete latency for the household search index.
+
+Fills a scratch database with synthetic households spread over many ASHAs
+and times the autocomplete query for a few typical prefixes.
+
+    python -m benchmarks.household_search --households 100000 --ashas 500
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from faker import Faker
+
+from database import connect
+from household_search import AUTOCOMPLETE_LIMIT, rebuild_index, search_households
+from migrations import migrate
+
+QUERIES = ['ver', 'sin', 'hou', 'ward 1', 'ward 12 kap', '12']
+
+
+def populate(db, households, ashas):
+    fake = Faker('en_IN')
+    Faker.seed(0)
+    random.seed(0)
+    surnames = [fake.last_name() for _ in range(2000)]
+    villages = [fake.city() for _ in range(500)]
+    db.executemany(
+        'INSERT INTO households (asha_id, household_name, address, members_count) VALUES (?, ?, ?, ?)',
+        ((random.randint(1, ashas), f'{random.choice(surnames)} Household',
+          f'Ward {random.randint(1, 40)}, {random.choice(villages)}', random.randint(1, 9))
+         for _ in range(households))
+    )
+    rebuild_index(db)
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--households', type=int, default=100000)
+    parser.add_argument('--ashas', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db = connect(os.path.join(tmpdir, 'search.db'))
+        migrate(db)
+        started = time.perf_counter()
+        populate(db, args.households, args.ashas)
+        print(f'indexed {args.households} households in {time.perf_counter() - started:.1f}s')
+
+        for query in QUERIES:
+            timings = []
+            for _ in range(args.repeat):
+                asha_id = random.randint(1, args.ashas)
+                t0 = time.perf_counter()
+                rows = search_households(db, asha_id, query, limit=AUTOCOMPLETE_LIMIT, columns='h.id, h.household_name, h.address')
+                timings.append((time.perf_counter() - t0) * 1000)
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            print(f'{query!r:>14}: p50 {statistics.median(timings):6.2f} ms  p95 {p95:6.2f} ms  ({len(rows)} hits last run)')
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Immunization lists from the precomputed due-date table versus recomputing them.
+
+Gives one ASHA --children children with a birth record and a random share of
+their doses, then times, per page load:
+
+  * recompute: working out every child's due doses from mch_records again
+    (rebuild_due, rolled back), which is what the page would cost without
+    immunization_due;
+  * range query: due_lists(), two range scans of the (asha_id, due_date) index.
+
+    python -m benchmarks.immunization_due --children 2000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+
+from database import connect
+from immunization import SCHEDULE, due_lists, local_today, rebuild_due
+from migrations import migrate
+
+
+def prepare(db, children, seed):
+    from app import ROLES
+
+    rng = random.Random(seed)
+    today = local_today()
+    asha_id = db.execute("INSERT INTO users (name, email, password_hash, role_id) VALUES ('Bench ASHA', 'asha@bench.test', 'x', ?)",
+                         (ROLES['asha'],)).lastrowid
+    first = db.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM users').fetchone()[0]
+    db.executemany("INSERT INTO users (id, name, email, password_hash, role_id) VALUES (?, ?, ?, 'x', ?)",
+                   ((first + n, f'Child {n}', f'child{n}@bench.test', ROLES['patient']) for n in range(children)))
+    records = []
+    for n in range(children):
+        dob = today - timedelta(days=rng.randint(0, 6 * 365))
+        records.append((asha_id, first + n, 'birth', None, dob.isoformat()))
+        for dose in SCHEDULE:
+            given = dob + timedelta(days=dose['due_days'] + rng.randint(0, 30))
+            if given < today and rng.random() < 0.8:
+                records.append((asha_id, first + n, 'immunization', dose['code'], given.isoformat()))
+    db.executemany('INSERT INTO mch_records (asha_id, patient_id, record_type, vaccine, record_date) VALUES (?, ?, ?, ?, ?)', records)
+    rebuild_due(db)
+    db.commit()
+    return asha_id, len(records)
+
+
+def timed(label, fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f'{label:>12}: {elapsed * 1000:8.2f} ms per page')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--children', type=int, default=2000, help="children in the ASHA's caseload")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db = connect(os.path.join(tmpdir, 'bench.db'))
+        migrate(db)
+        asha_id, records = prepare(db, args.children, args.seed)
+        due = db.execute('SELECT COUNT(*) FROM immunization_due').fetchone()[0]
+        print(f'{args.children} children, {records} MCH records, {due} outstanding doses')
+
+        def recompute():
+            db.execute('BEGIN IMMEDIATE')
+            rebuild_due(db)
+            db.rollback()
+
+        slow = timed('recompute', recompute, max(1, args.repeat // 10))
+        today = local_today()
+        fast = timed('range query', lambda: due_lists(db, asha_id, today), args.repeat)
+        db.close()
+    print(f'speedup: {slow / fast:.0f}x')
+
+
+if __name__ == '__main__':
+    main()
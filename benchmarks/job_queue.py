@@ -0,0 +1,61 @@
+"""Throughput of the background job queue on one node.
+
+Request threads each enqueue jobs one transaction at a time, as routes do,
+while worker threads drain the queue. The handler sleeps for --work-ms to
+stand in for the job itself. Reports enqueue and completion rates.
+
+    python -m benchmarks.job_queue --jobs 20000 --producers 8 --workers 4
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import job_queue
+from database import connect
+from migrations import migrate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=20000)
+    parser.add_argument('--producers', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--work-ms', type=float, default=0, help='time each job takes')
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix='swasthsathi-jobs-'), 'jobs.db')
+    migrate(connect(path))
+    job_queue.handler('benchmark')(lambda worker, n: time.sleep(args.work_ms / 1000))
+
+    def produce(count):
+        db = connect(path)
+        for n in range(count):
+            job_queue.enqueue(db, 'benchmark', {'n': n})
+            db.commit()
+        db.close()
+
+    started = time.perf_counter()
+    workers = [job_queue.Worker(path, poll=0.05, log=lambda message: None).start() for _ in range(args.workers)]
+    producers = [threading.Thread(target=produce, args=(args.jobs // args.producers,)) for _ in range(args.producers)]
+    for thread in producers:
+        thread.start()
+    for thread in producers:
+        thread.join()
+    enqueued = time.perf_counter() - started
+    total = args.jobs // args.producers * args.producers
+
+    db = connect(path)
+    while db.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    for worker in workers:
+        worker.stop()
+    print(f"Enqueued {total} jobs in {enqueued:.1f}s ({total / enqueued * 60:,.0f}/min).")
+    print(f"Finished all of them in {elapsed:.1f}s ({total / elapsed * 60:,.0f} jobs/min) "
+          f"with {args.workers} worker threads.")
+
+
+if __name__ == '__main__':
+    main()
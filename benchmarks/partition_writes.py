@@ -0,0 +1,102 @@
+"""Field-data write throughput with and without district partitions.
+
+One worker process per district plays an ASHA of that district. It posts
+/api/sync through the Flask app, one new household per request, so every
+request is one write transaction. The run happens twice on fresh databases:
+first with every district in the catalog, then with each district split into
+its own partition file (partitions.py).
+
+    python -m benchmarks.partition_writes --districts 4 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+
+import app as app_module
+from app import app, init_db
+from database import connect
+from partitions import split
+
+
+def prepare_database(path, districts, partitioned):
+    app.config['DATABASE'] = path
+    with app.app_context():
+        init_db()
+        db = app_module.get_db()
+        ashas = [
+            db.execute("INSERT INTO users (name, email, password_hash, role_id, district) VALUES (?, ?, 'x', ?, ?)",
+                       (f'ASHA {n}', f'asha{n}@bench.test', app_module.ROLES['asha'], f'District {n}')).lastrowid
+            for n in range(districts)
+        ]
+        db.commit()
+    if partitioned:
+        catalog = connect(path)
+        for n in range(districts):
+            split(catalog, path, [f'District {n}'], os.path.join(os.path.dirname(path), f'district-{n}.db'))
+        catalog.close()
+    return ashas
+
+
+def worker(path, asha_id, seconds, results):
+    app.config['DATABASE'] = path
+    app.config['PROPAGATE_EXCEPTIONS'] = True
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = asha_id
+        sess['user_name'] = 'Bench ASHA'
+        sess['user_role'] = app_module.ROLES['asha']
+
+    done = locked = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        change = {'client_id': str(uuid.uuid4()), 'op': 'create', 'entity': 'household',
+                  'data': {'household_name': f'Household {done}', 'address': 'Ward 1', 'members_count': 4}}
+        try:
+            client.post('/api/sync', json={'changes': [change]})
+            done += 1
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+    results.put((done, locked))
+
+
+def run(label, partitioned, districts, seconds, tmpdir):
+    path = os.path.join(tmpdir, label, 'catalog.db')
+    os.makedirs(os.path.dirname(path))
+    ashas = prepare_database(path, districts, partitioned)
+
+    ctx = multiprocessing.get_context('fork')
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(path, asha_id, seconds, results)) for asha_id in ashas]
+    for p in procs:
+        p.start()
+    totals = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    done = sum(t[0] for t in totals)
+    locked = sum(t[1] for t in totals)
+    print(f'{label:>12}: {done / seconds:8.1f} writes/s  {locked:5d} lock errors  ({districts} districts, {seconds}s)')
+    return done / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--districts', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    os.environ.setdefault('CASE_SCHEDULER', '0')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        single = run('single-file', False, args.districts, args.seconds, tmpdir)
+        partitioned = run('partitioned', True, args.districts, args.seconds, tmpdir)
+    print(f'speedup: {partitioned / single:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
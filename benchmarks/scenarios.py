@@ -0,0 +1,289 @@
+"""Replay the main user workflows against the app and compare with a baseline.
+
+Scenarios, each run by --users concurrent virtual users for --seconds:
+
+  * patient_submit: a patient submits symptoms and opens their dashboard.
+  * doctor_claim_respond: a doctor opens the pending queue, accepts a case
+    from the first page and responds to it.
+  * chat_poll: a chat participant polls for new messages, sending one now
+    and then.
+  * asha_search: an ASHA types a prefix into household autocomplete.
+
+By default requests go through the Flask test client, against a scratch
+database filled by benchmarks.synthetic_data (--scale). With --url they go
+over HTTP to a running server instead, such as a local gunicorn. In that
+case --db must name the database the server uses, so the runner can pick
+users and threads.
+
+Reports p50/p95/p99 latency and throughput for every step. With a baseline
+file (benchmarks/baseline.json), the run fails if any step's p95 latency
+rises, or its throughput falls, by more than --tolerance, or if any step
+returns errors. A run with other settings (target, users, seconds, scale)
+than the baseline's is not compared and fails. Use --save-baseline to record a new one on the machine that
+runs the comparison.
+
+    python -m benchmarks.scenarios --scale 1 --users 8 --seconds 20
+    python -m benchmarks.scenarios --url http://127.0.0.1:8000 --db swasthsathi.db
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.synthetic_data import PASSWORD, SYMPTOMS, generate
+from database import connect
+from migrations import migrate
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+PREFIXES = ['ward 1', 'ward 2', 'hou', 'sha', 'ver', 'kum', 'sin', 'pat']
+CASE_LINK = re.compile(r'/doctor/accept-case/(\d+)')
+
+
+class TestClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.headers.get('Location', ''), response.get_data()
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def request(self, method, path, data=None):
+        response = self.session.request(method, self.base_url + path, data=data, allow_redirects=False)
+        return response.status_code, response.headers.get('Location', ''), response.content
+
+
+class VirtualUser:
+    def __init__(self, client, recorder, scenario, rng, **context):
+        self.client = client
+        self.recorder = recorder
+        self.scenario = scenario
+        self.rng = rng
+        self.__dict__.update(context)
+
+    def login(self, email):
+        status, _location, _body = self.client.request('POST', '/login', {'email': email, 'password': PASSWORD})
+        if status != 302:
+            raise RuntimeError(f'could not log in as {email} (HTTP {status})')
+
+    def call(self, step, method, path, data=None):
+        """Time one request; returns (status, Location header or '', body)."""
+        started = time.perf_counter()
+        status, location, body = self.client.request(method, path, data)
+        self.recorder.record(f'{self.scenario}.{step}', time.perf_counter() - started, status >= 400)
+        return status, location, body
+
+
+# --- Scenarios ---
+# Each runs one iteration of its workflow as a VirtualUser; setup_users() picks who plays it.
+
+def _users(db, role_id, count, rng):
+    rows = db.execute('SELECT id, email FROM users WHERE role_id = ? AND email LIKE ?', (role_id, '%@bench.test')).fetchall()
+    return [{'user_id': row[0], 'email': row[1]} for row in rng.sample(rows, min(count, len(rows)))]
+
+def patient_submit(user):
+    user.call('submit_symptoms', 'POST', '/submit-symptoms', {
+        'name': 'Bench Patient', 'age': str(user.rng.randint(1, 90)), 'gender': user.rng.choice('MF'),
+        'symptoms': ', '.join(user.rng.sample(SYMPTOMS, 2)),
+    })
+    user.call('patient_dashboard', 'GET', '/dashboard/patient')
+
+def doctor_claim_respond(user):
+    _status, _location, body = user.call('available_patients', 'GET', '/doctor/available-patients')
+    cases = CASE_LINK.findall(body.decode('utf-8', 'replace'))
+    if not cases:
+        return
+    case_id = user.rng.choice(cases)
+    _status, location, _body = user.call('accept_case', 'POST', f'/doctor/accept-case/{case_id}')
+    # accept_case redirects either way: to the doctor's dashboard only when this doctor won the case.
+    if location.rstrip('/').endswith('/dashboard/doctor'):
+        user.call('submit_response', 'POST', f'/doctor/respond/{case_id}', {'response': 'Take rest and fluids.'})
+
+def chat_poll(user):
+    status, _location, body = user.call('get_messages', 'GET', f'/chat/{user.thread_id}/messages?after_id={user.last_id}')
+    if status == 200:
+        messages = json.loads(body)
+        if messages:
+            user.last_id = messages[-1]['id']
+    if user.rng.random() < 0.1:
+        user.call('send_message', 'POST', f'/chat/{user.thread_id}/send', {'message_text': 'Any update?'})
+
+def asha_search(user):
+    user.call('autocomplete', 'GET', f'/search/autocomplete?q={user.rng.choice(PREFIXES)}')
+
+def setup_users(db, roles, scenario, count, rng):
+    if scenario == 'chat_poll':
+        rows = db.execute(
+            'SELECT t.id, u.id, u.email, (SELECT MAX(id) FROM chat_messages m WHERE m.thread_id = t.id) '
+            "FROM chat_threads t JOIN users u ON u.id = t.patient_id WHERE u.email LIKE '%@bench.test' LIMIT 1000"
+        ).fetchall()
+        return [{'thread_id': row[0], 'user_id': row[1], 'email': row[2], 'last_id': row[3] or 0}
+                for row in rng.sample(rows, min(count, len(rows)))]
+    role = {'patient_submit': 'patient', 'doctor_claim_respond': 'doctor', 'asha_search': 'asha'}[scenario]
+    return _users(db, roles[role], count, rng)
+
+SCENARIOS = {
+    'patient_submit': patient_submit,
+    'doctor_claim_respond': doctor_claim_respond,
+    'chat_poll': chat_poll,
+    'asha_search': asha_search,
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.timings = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, label, seconds, error):
+        with self._lock:
+            self.timings.setdefault(label, []).append(seconds)
+            self.errors[label] = self.errors.get(label, 0) + int(error)
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, max(0, math.ceil(p / 100 * len(values)) - 1))]
+
+def summarise(recorder, elapsed):
+    """{label: {'count', 'errors', 'p50_ms', 'p95_ms', 'p99_ms', 'rps'}}"""
+    results = {}
+    for label, timings in sorted(recorder.timings.items()):
+        timings.sort()
+        results[label] = {
+            'count': len(timings),
+            'errors': recorder.errors[label],
+            'p50_ms': round(percentile(timings, 50) * 1000, 2),
+            'p95_ms': round(percentile(timings, 95) * 1000, 2),
+            'p99_ms': round(percentile(timings, 99) * 1000, 2),
+            'rps': round(len(timings) / elapsed, 1),
+        }
+    return results
+
+def regressions(results, baseline, tolerance):
+    problems = []
+    for label, result in results.items():
+        if result['errors']:
+            problems.append(f"{label}: {result['errors']} of {result['count']} requests failed")
+        base = baseline.get(label)
+        if base is None:
+            continue
+        if result['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            problems.append(f"{label}: p95 {result['p95_ms']:.1f} ms, baseline {base['p95_ms']:.1f} ms")
+        if result['rps'] < base['rps'] * (1 - tolerance):
+            problems.append(f"{label}: {result['rps']:.1f} req/s, baseline {base['rps']:.1f} req/s")
+    return problems
+
+
+def run_scenario(name, make_client, contexts, seconds, seed):
+    recorder = Recorder()
+    users = []
+    for i, context in enumerate(contexts):
+        user = VirtualUser(make_client(), recorder, name, random.Random(seed + i), **context)
+        user.login(context['email'])
+        users.append(user)
+
+    iteration = SCENARIOS[name]
+    deadline = time.perf_counter() + seconds
+
+    def loop(user):
+        while time.perf_counter() < deadline:
+            iteration(user)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=loop, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarise(recorder, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='base URL of a running server (default: Flask test client)')
+    parser.add_argument('--db', help='database to use (default: a scratch one generated at --scale)')
+    parser.add_argument('--scale', type=float, default=0.2, help='synthetic data size for the scratch database')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='run only these (repeatable)')
+    parser.add_argument('--users', type=int, default=8, help='concurrent virtual users per scenario')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.3, help='allowed relative change before a step fails')
+    parser.add_argument('--save-baseline', action='store_true', help='write this run to --baseline instead of comparing')
+    args = parser.parse_args()
+
+    if args.url and not args.db:
+        parser.error('--url needs --db: the database the server uses')
+    path = args.db
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix='swasthsathi-bench-'), 'bench.db')
+        db = connect(path)
+        migrate(db)
+        generate(db, args.scale, args.seed)
+        db.close()
+
+    if args.url:
+        from app import ROLES
+        make_client = lambda: HttpClient(args.url)
+    else:
+        os.environ.setdefault('CASE_SCHEDULER', '0')  # doctors claim cases themselves in this run
+        from app import ROLES, app
+        app.config['DATABASE'] = path
+        make_client = lambda: TestClient(app)
+
+    db = connect(path)
+    rng = random.Random(args.seed)
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        contexts = setup_users(db, ROLES, name, args.users, rng)
+        if not contexts:
+            print(f"{name}: no synthetic users in {path}; generate some with benchmarks.synthetic_data")
+            continue
+        results.update(run_scenario(name, make_client, contexts, args.seconds, args.seed))
+    db.close()
+
+    print(f"{'step':<42}{'count':>8}{'err':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}")
+    for label, r in results.items():
+        print(f"{label:<42}{r['count']:>8}{r['errors']:>6}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['rps']:>9.1f}")
+
+    # Numbers are only comparable between runs with the same target and load.
+    settings = {'target': 'http' if args.url else 'test_client', 'users': args.users, 'seconds': args.seconds,
+                'scale': None if args.db else args.scale}
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'settings': settings, 'steps': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Saved baseline to {args.baseline}.")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one.")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline['settings'] != settings:
+        print(f"Not comparing: {args.baseline} was recorded with {baseline['settings']}, this run used {settings}. "
+              "Rerun with the same settings, or record a new baseline with --save-baseline.")
+        sys.exit(1)
+    problems = regressions(results, baseline['steps'], args.tolerance)
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    if problems:
+        sys.exit(1)
+    print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%}).")
+
+
+if __name__ == '__main__':
+    main()
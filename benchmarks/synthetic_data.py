@@ -0,0 +1,165 @@
+"""Fill a database with synthetic users, consultations, chats, households and MCH records.
+
+Row counts are BASE_COUNTS times --scale (scale 20 is a few million rows).
+Names and places come from Faker; to keep millions of rows fast, a pool of
+them is drawn once and rows pick from it. Rows go in with executemany,
+CHUNK_ROWS at a time, one commit per chunk, through the app's own schema and
+triggers. Every user's password is "password" and emails follow
+<role><n>@bench.test, so scenario runs can log in as any of them.
+
+    python -m benchmarks.synthetic_data --db /tmp/bench.db --scale 20
+"""
+import argparse
+import random
+import time
+
+from faker import Faker
+from werkzeug.security import generate_password_hash
+
+from database import connect
+from household_search import rebuild_index
+from migrations import migrate
+
+CHUNK_ROWS = 10000
+PASSWORD = 'password'
+START = 1_704_067_200  # 2024-01-01 00:00 UTC
+
+BASE_COUNTS = {
+    'patients': 10000,
+    'doctors': 200,
+    'ashas': 500,
+    'consultations': 50000,
+    'chat_threads': 5000,
+    'chat_messages': 100000,
+    'households': 50000,
+    'mch_records': 25000,
+}
+SPECIALTIES = ['General Physician', 'Dermatologist', 'Pediatrician', 'Cardiologist', 'Gynecologist']
+SYMPTOMS = ['fever', 'cough', 'headache', 'rash on arms', 'stomach pain', 'back pain', 'sore throat',
+            'dizziness', 'joint pain', 'shortness of breath', 'vomiting', 'ear ache']
+RECORD_TYPES = ['pregnancy', 'immunization', 'growth']
+
+
+def email(role, n):
+    return f'{role}{n}@bench.test'
+
+
+def _timestamp(t):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(t))
+
+
+def _insert(db, sql, rows, log, label, total):
+    started = time.perf_counter()
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_ROWS:
+            db.executemany(sql, chunk)
+            db.commit()
+            chunk = []
+    if chunk:
+        db.executemany(sql, chunk)
+        db.commit()
+    elapsed = time.perf_counter() - started
+    log(f"{label:>14}: {total:>9,} rows in {elapsed:6.1f}s ({total / elapsed if elapsed else 0:,.0f} rows/s)")
+
+
+def generate(db, scale=1.0, seed=0, days=365, log=print):
+    """Add BASE_COUNTS * scale rows to an empty, migrated database; returns the counts used."""
+    from app import ROLES
+
+    counts = {name: max(1, int(n * scale)) for name, n in BASE_COUNTS.items()}
+    rng = random.Random(seed)
+    fake = Faker('en_IN')
+    Faker.seed(seed)
+    names = [fake.name() for _ in range(5000)]
+    surnames = [fake.last_name() for _ in range(2000)]
+    villages = [fake.city() for _ in range(1000)]
+    password_hash = generate_password_hash(PASSWORD)
+    span = days * 86400
+
+    # Users: patients, then doctors, then ASHAs, so ids are predictable ranges.
+    first_id = db.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM users").fetchone()[0]
+    patients = range(first_id, first_id + counts['patients'])
+    doctors = range(patients.stop, patients.stop + counts['doctors'])
+    ashas = range(doctors.stop, doctors.stop + counts['ashas'])
+    _insert(db, 'INSERT INTO users (id, name, email, username, password_hash, role_id, specialty, age, gender, phone_number) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            ((user_id, rng.choice(names), email(role, user_id - ids.start), f'{role}{user_id - ids.start}',
+              password_hash, ROLES[role], SPECIALTIES[user_id % len(SPECIALTIES)] if role == 'doctor' else None,
+              rng.randint(1, 90), rng.choice('MF'), f'9{rng.randrange(10 ** 9):09d}')
+             for role, ids in (('patient', patients), ('doctor', doctors), ('asha', ashas)) for user_id in ids),
+            log, 'users', len(patients) + len(doctors) + len(ashas))
+
+    def consultation():
+        created = START + rng.random() * span
+        roll = rng.random()
+        status = 'Pending' if roll < 0.1 else 'Under Review' if roll < 0.2 else 'Reviewed'
+        doctor = None if status == 'Pending' else rng.choice(doctors)
+        accepted = created + rng.random() * 7200 if doctor else None
+        reviewed = accepted + rng.random() * 86400 if status == 'Reviewed' else None
+        return (rng.choice(patients), doctor, rng.choice(names), rng.randint(1, 90), rng.choice('MF'),
+                ', '.join(rng.sample(SYMPTOMS, rng.randint(1, 3))), 'Take rest and fluids.' if reviewed else None,
+                status, rng.choice([None, *SPECIALTIES]), rng.choices([0, 1, 2, 3], [70, 20, 7, 3])[0],
+                _timestamp(created), accepted and _timestamp(accepted), reviewed and _timestamp(reviewed))
+    _insert(db, 'INSERT INTO consultations (patient_id, doctor_id, patient_name, patient_age, patient_gender, symptoms, '
+                'doctor_response, status, category, urgency, created_at, accepted_at, reviewed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (consultation() for _ in range(counts['consultations'])), log, 'consultations', counts['consultations'])
+
+    first_thread = db.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM chat_threads").fetchone()[0]
+    pairs = set()
+    while len(pairs) < counts['chat_threads']:
+        pairs.add((rng.choice(patients), rng.choice(doctors)))
+    threads = sorted(pairs)
+    thread_start = [START + rng.random() * span for _ in threads]
+    _insert(db, 'INSERT INTO chat_threads (id, patient_id, doctor_id, created_at) VALUES (?, ?, ?, ?)',
+            ((first_thread + i, patient, doctor, _timestamp(thread_start[i])) for i, (patient, doctor) in enumerate(threads)),
+            log, 'chat_threads', len(threads))
+
+    def message(n):
+        i = n % len(threads)
+        patient, doctor = threads[i]
+        # Messages arrive in id order, so each thread's clock only moves forward.
+        thread_start[i] += rng.random() * 3600
+        return (first_thread + i, rng.choice((patient, doctor)), fake.sentence() if n < 5000 else rng.choice(SYMPTOMS),
+                _timestamp(thread_start[i]))
+    _insert(db, 'INSERT INTO chat_messages (thread_id, sender_id, message_text, sent_at) VALUES (?, ?, ?, ?)',
+            (message(n) for n in range(counts['chat_messages'])), log, 'chat_messages', counts['chat_messages'])
+
+    _insert(db, 'INSERT INTO households (asha_id, household_name, address, members_count, is_verified) VALUES (?, ?, ?, ?, ?)',
+            ((rng.choice(ashas), f'{rng.choice(surnames)} Household', f'Ward {rng.randint(1, 40)}, {rng.choice(villages)}',
+              rng.randint(1, 9), int(rng.random() < 0.6)) for _ in range(counts['households'])),
+            log, 'households', counts['households'])
+    started = time.perf_counter()
+    rebuild_index(db)
+    db.commit()
+    log(f"{'search index':>14}: rebuilt in {time.perf_counter() - started:6.1f}s")
+
+    _insert(db, 'INSERT INTO mch_records (asha_id, patient_id, record_type, record_details, record_date) VALUES (?, ?, ?, ?, ?)',
+            ((rng.choice(ashas), rng.choice(patients), rng.choice(RECORD_TYPES), fake.sentence() if n < 5000 else 'Routine visit',
+              _timestamp(START + rng.random() * span)) for n in range(counts['mch_records'])),
+            log, 'mch_records', counts['mch_records'])
+    db.execute('PRAGMA optimize')
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', required=True, help='database file to create or extend')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier on BASE_COUNTS')
+    parser.add_argument('--days', type=int, default=365, help='history the timestamps are spread over')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    db = connect(args.db)
+    migrate(db)
+    started = time.perf_counter()
+    counts = generate(db, args.scale, args.seed, args.days)
+    db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    db.close()
+    print(f"Generated {sum(counts.values()):,} rows in {time.perf_counter() - started:.1f}s.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+import argparse
+import heapq
+import os
+import socket
+import threading
+import time
+import uuid
+
+from database import connect
+
+# --- Case Auto-Assignment ---
+# Pending consultations are handed to doctors without waiting for someone to
+# open the queue page. Every TICK_SECONDS one run:
+#   1. returns stale claims to the queue: a case it assigned that has been
+#      Under Review for longer than CLAIM_TIMEOUT_SECONDS without a response
+#      goes back to Pending, and the doctor who let it lapse is only picked
+#      again if nobody else is free. Cases a doctor accepted themselves stay
+#      with that doctor;
+#   2. pops pending cases off a priority queue, oldest first, where each
+#      urgency level counts as URGENCY_HEAD_START_SECONDS of extra waiting
+#      time (so urgent cases jump ahead, but a routine case is never starved);
+#   3. gives each case to the least-loaded doctor accepting cases who has
+#      room under their capacity, preferring the specialty the case asks for.
+#      A case waits up to SPECIALIST_WAIT_SECONDS for a free specialist
+#      before any free doctor may take it.
+# Every gunicorn worker runs the loop, but only the holder of the
+# "case_scheduler" lease does any work; the lease passes to another worker if
+# its holder stops renewing it. Claims use the same conditional UPDATE as
+# accept_case, so a doctor clicking accept at the same moment is never
+# overridden.
+
+TICK_SECONDS = 15
+LEASE_SECONDS = 60
+DEFAULT_CAPACITY = 5
+CLAIM_TIMEOUT_SECONDS = 24 * 3600
+SPECIALIST_WAIT_SECONDS = 30 * 60
+URGENCY_HEAD_START_SECONDS = 2 * 3600
+BATCH_SIZE = 500
+
+# Urgency names used by the symptom checker -> consultations.urgency
+URGENCY_LEVELS = {'Low': 0, 'Medium': 1, 'High': 2, 'Immediate': 3}
+
+RELEASE_STALE_SQL = '''
+    UPDATE consultations
+    SET status = 'Pending', released_doctor_id = doctor_id, doctor_id = NULL, accepted_at = NULL, auto_assigned = 0
+    WHERE status = 'Under Review' AND auto_assigned = 1 AND doctor_response IS NULL AND accepted_at < ?
+'''
+DOCTOR_LOAD_SQL = "SELECT doctor_id, COUNT(*) FROM consultations WHERE status = 'Under Review' AND doctor_id IS NOT NULL GROUP BY doctor_id"
+
+def _timestamp(now):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(now))
+
+def _epoch(column):
+    return f'(julianday({column}) - 2440587.5) * 86400'
+
+def acquire_lease(db, name, holder, now, seconds=LEASE_SECONDS):
+    """Take or renew the named lease; True if `holder` now owns it."""
+    cursor = db.execute(
+        '''
+        INSERT INTO scheduler_leases (name, holder, expires_at) VALUES (?, ?, ?)
+        ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+        WHERE scheduler_leases.holder = excluded.holder OR scheduler_leases.expires_at < ?
+        ''',
+        (name, holder, now + seconds, now)
+    )
+    return cursor.rowcount == 1
+
+def release_stale_claims(db, now, timeout=CLAIM_TIMEOUT_SECONDS):
+    return db.execute(RELEASE_STALE_SQL, (_timestamp(now - timeout),)).rowcount
+
+def pending_queue(db, limit=BATCH_SIZE):
+    """Heap of (priority, id, category, created, released_doctor_id); smaller priority goes first.
+
+    Holds the `limit` oldest pending cases plus every urgent one, however far back the queue goes.
+    """
+    rows = db.execute(
+        f'''
+        SELECT {_epoch('created_at')} - urgency * ? AS priority, id, category, {_epoch('created_at')} AS created,
+               released_doctor_id
+        FROM consultations
+        WHERE status = 'Pending' AND (urgency > 0 OR id IN (
+            SELECT id FROM consultations WHERE status = 'Pending' ORDER BY created_at, id LIMIT ?
+        ))
+        ''',
+        (URGENCY_HEAD_START_SECONDS, limit)
+    ).fetchall()
+    queue = [tuple(row) for row in rows]
+    heapq.heapify(queue)
+    return queue
+
+def doctor_pool(db, doctor_role):
+    """{doctor id: {'specialty', 'capacity', 'active'}} for doctors accepting cases."""
+    doctors = {}
+    for doctor_id, specialty, capacity in db.execute(
+        'SELECT id, specialty, max_active_cases FROM users WHERE role_id = ? AND accepting_cases = 1', (doctor_role,)
+    ):
+        doctors[doctor_id] = {'specialty': (specialty or '').strip().casefold(),
+                              'capacity': capacity or DEFAULT_CAPACITY, 'active': 0}
+    for doctor_id, active in db.execute(DOCTOR_LOAD_SQL):
+        if doctor_id in doctors:
+            doctors[doctor_id]['active'] = active
+    return doctors
+
+def pick_doctor(doctors, category, waited, avoid=None):
+    """The least-loaded free doctor for a case, or None if it should keep waiting."""
+    free = {d: info for d, info in doctors.items() if info['active'] < info['capacity']}
+    if len(free) > 1 and avoid in free:
+        del free[avoid]
+    wanted = (category or '').strip().casefold()
+    if wanted and any(info['specialty'] == wanted for info in doctors.values()):
+        specialists = {d: info for d, info in free.items() if info['specialty'] == wanted}
+        if specialists:
+            free = specialists
+        elif waited < SPECIALIST_WAIT_SECONDS:
+            return None
+    if not free:
+        return None
+    return min(free, key=lambda d: (free[d]['active'] / free[d]['capacity'], free[d]['active'], d))
+
+def run_once(db, doctor_role, now=None):
+    """One scheduling pass in its own transaction; returns {'released': n, 'assigned': [(case, doctor), ...]}."""
+    now = time.time() if now is None else now
+    if db.in_transaction:
+        db.commit()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        released = release_stale_claims(db, now)
+        doctors = doctor_pool(db, doctor_role)
+        queue = pending_queue(db)
+        assigned = []
+        while queue and any(info['active'] < info['capacity'] for info in doctors.values()):
+            _priority, case_id, category, created, avoid = heapq.heappop(queue)
+            doctor_id = pick_doctor(doctors, category, now - (created or now), avoid)
+            if doctor_id is None:
+                continue
+            claimed = db.execute(
+                "UPDATE consultations SET doctor_id = ?, status = 'Under Review', accepted_at = ?, auto_assigned = 1 "
+                "WHERE id = ? AND status = 'Pending'",
+                (doctor_id, _timestamp(now), case_id)
+            ).rowcount
+            if claimed:
+                doctors[doctor_id]['active'] += 1
+                assigned.append((case_id, doctor_id))
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return {'released': released, 'assigned': assigned}
+
+class CaseScheduler:
+    """Background thread running run_once() every TICK_SECONDS while it holds the lease."""
+
+    LEASE_NAME = 'case_scheduler'
+
+    def __init__(self, path, doctor_role, tick=TICK_SECONDS, log=print):
+        self.path = path
+        self.doctor_role = doctor_role
+        self.tick = tick
+        self.log = log
+        self.holder = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='case-scheduler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        db = connect(self.path)
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.step(db)
+                except Exception as e:  # keep the loop alive; the next tick retries
+                    self.log(f"case scheduler: {e!r}")
+                self._stop.wait(self.tick)
+        finally:
+            db.close()
+
+    def step(self, db, now=None):
+        now = time.time() if now is None else now
+        owns = acquire_lease(db, self.LEASE_NAME, self.holder, now, max(LEASE_SECONDS, 3 * self.tick))
+        db.commit()
+        if not owns:
+            return None
+        return run_once(db, self.doctor_role, now)
+
+if __name__ == '__main__':
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Assign pending consultations to doctors.')
+    parser.add_argument('command', choices=['once', 'run'])
+    parser.add_argument('--db', default=os.environ.get('DATABASE', 'swasthsathi.db'))
+    parser.add_argument('--tick', type=float, default=TICK_SECONDS)
+    args = parser.parse_args()
+
+    from app import ROLES
+    conn = connect(args.db)
+    migrate(conn)
+    if args.command == 'once':
+        result = run_once(conn, ROLES['doctor'])
+        print(f"Assigned {len(result['assigned'])} cases; returned {result['released']} stale claims to the queue.")
+    else:
+        scheduler = CaseScheduler(args.db, ROLES['doctor'], tick=args.tick)
+        while True:
+            result = scheduler.step(conn)
+            if result and (result['assigned'] or result['released']):
+                print(f"Assigned {len(result['assigned'])} cases; returned {result['released']} stale claims to the queue.")
+            time.sleep(args.tick)
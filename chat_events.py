@@ -0,0 +1,144 @@
+import os
+import socket
+import tempfile
+import threading
+from collections import defaultdict
+
+# --- Chat Push Hub ---
+# send_message publishes (thread_id, message_id) here and every open event stream
+# for that thread wakes up. Other gunicorn workers on the same host are reached
+# through a directory of Unix datagram sockets, one per worker that has listeners.
+# Listener threads block in recv(), so nothing runs between messages.
+
+class Subscription:
+    def __init__(self, hub, thread_id):
+        self.hub = hub
+        self.thread_id = thread_id
+        self._event = threading.Event()
+
+    def notify(self):
+        self._event.set()
+
+    def wait(self, timeout):
+        """Block until a message is published or `timeout` seconds pass; True if woken."""
+        woken = self._event.wait(timeout)
+        self._event.clear()
+        return woken
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ChatHub:
+    def __init__(self, fanout_dir=None):
+        self.fanout_dir = fanout_dir
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._fanout = None
+
+    def subscribe(self, thread_id):
+        self._ensure_fanout()
+        sub = Subscription(self, thread_id)
+        with self._lock:
+            self._subscribers[thread_id].add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subscribers.get(sub.thread_id)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.thread_id]
+
+    def publish(self, thread_id, message_id=None):
+        self._notify_local(thread_id)
+        if self.fanout_dir and hasattr(socket, 'AF_UNIX'):
+            _broadcast(self.fanout_dir, thread_id, message_id, exclude=self._own_socket_path())
+
+    def _notify_local(self, thread_id):
+        with self._lock:
+            subs = list(self._subscribers.get(thread_id, ()))
+        for sub in subs:
+            sub.notify()
+
+    def _own_socket_path(self):
+        fanout = self._fanout
+        if fanout and fanout.pid == os.getpid():
+            return fanout.path
+        return None
+
+    def _ensure_fanout(self):
+        if not self.fanout_dir or not hasattr(socket, 'AF_UNIX'):
+            return
+        if self._fanout and self._fanout.pid == os.getpid():
+            return
+        with self._lock:
+            if self._fanout is None or self._fanout.pid != os.getpid():
+                # A forked worker inherits no subscribers and must bind its own socket.
+                self._subscribers = defaultdict(set)
+                self._fanout = _SocketListener(self.fanout_dir, self._notify_local)
+
+
+class _SocketListener:
+    def __init__(self, directory, on_message):
+        os.makedirs(directory, exist_ok=True)
+        self.pid = os.getpid()
+        self.path = os.path.join(directory, f'{self.pid}.sock')
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.path)
+        self.on_message = on_message
+        threading.Thread(target=self._run, name='chat-fanout', daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                data = self.sock.recv(64)
+            except OSError:
+                return
+            try:
+                thread_id = int(data.split(b':', 1)[0])
+            except ValueError:
+                continue
+            self.on_message(thread_id)
+
+
+def _broadcast(directory, thread_id, message_id, exclude=None):
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return
+    payload = f'{thread_id}:{message_id or 0}'.encode()
+    sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sender.setblocking(False)
+    try:
+        for name in names:
+            path = os.path.join(directory, name)
+            if not name.endswith('.sock') or path == exclude:
+                continue
+            try:
+                sender.sendto(payload, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The worker that owned this socket has exited.
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except BlockingIOError:
+                # That worker's receive buffer is full; its streams will catch up on
+                # their next keepalive wake-up, so dropping the nudge is harmless.
+                pass
+    finally:
+        sender.close()
+
+
+def default_fanout_dir():
+    return os.path.join(tempfile.gettempdir(), 'swasthsathi-chat')
@@ -0,0 +1,140 @@
+import argparse
+import os
+
+from patient_timeline import MESSAGE_PREVIEW
+
+# --- Chat Inbox ---
+# Each chat_threads row carries a summary of its messages:
+#   * the last message: id, time, sender and a preview;
+#   * message_count, and last_activity_at (the last message, or when the
+#     thread was opened);
+#   * for each participant, the id of the last message they have read and how
+#     many messages from the other side came after it.
+# A trigger on chat_messages (migration 16) updates the summary on every send.
+# Sending counts as reading the thread up to your own message. get_messages()
+# calls mark_read() when it hands a participant newer messages. An inbox page
+# is one range scan of the (doctor_id | patient_id, last_activity_at, id) index,
+# however many threads a doctor has. rebuild_thread_summaries() recomputes the
+# summaries from chat_messages and keeps everyone's read position.
+
+PAGE_SIZE = 30
+MAX_PAGE_SIZE = 100
+
+# Whose inbox -> the other participant's column.
+SIDES = {'doctor': 'patient', 'patient': 'doctor'}
+
+INBOX_SQL = '''
+    SELECT t.id, t.{other}_id AS other_id, u.name AS other_name, t.last_activity_at,
+           t.last_message_id, t.last_message_at, t.last_message_preview, t.last_sender_id,
+           t.message_count, t.{side}_unread AS unread
+    FROM chat_threads t
+    JOIN users u ON u.id = t.{other}_id
+    WHERE t.{side}_id = ? {where}
+    ORDER BY t.last_activity_at DESC, t.id DESC
+    LIMIT ?
+'''
+INBOX_BEFORE_CURSOR = 'AND (t.last_activity_at, t.id) < (?, ?)'
+UNREAD_SQL = 'SELECT COUNT(*), COALESCE(SUM({side}_unread), 0) FROM chat_threads WHERE {side}_id = ? AND {side}_unread > 0'
+
+def rebuild_thread_summaries(db, mark_all_read=False):
+    """Recompute every thread's summary; with mark_all_read, also treat all existing messages as read."""
+    db.execute(
+        'UPDATE chat_threads SET last_message_id = NULL, last_message_at = NULL, last_message_preview = NULL, '
+        'last_sender_id = NULL, message_count = 0, patient_unread = 0, doctor_unread = 0, '
+        'last_activity_at = COALESCE(created_at, CURRENT_TIMESTAMP)'
+    )
+    db.execute(
+        '''
+        UPDATE chat_threads AS t
+        SET last_message_id = m.last_id, last_message_at = m.last_sent_at, message_count = m.messages,
+            last_activity_at = MAX(t.last_activity_at, COALESCE(m.last_sent_at, ''))
+        FROM (SELECT thread_id, COUNT(*) AS messages, MAX(id) AS last_id, MAX(sent_at) AS last_sent_at
+              FROM chat_messages GROUP BY thread_id) AS m
+        WHERE t.id = m.thread_id
+        '''
+    )
+    db.execute(
+        f'''
+        UPDATE chat_threads AS t
+        SET last_sender_id = last.sender_id, last_message_preview = {MESSAGE_PREVIEW.format(row='last')}
+        FROM chat_messages AS last
+        WHERE last.id = t.last_message_id
+        '''
+    )
+    if mark_all_read:
+        db.execute('UPDATE chat_threads SET patient_last_read_id = COALESCE(last_message_id, 0), '
+                   'doctor_last_read_id = COALESCE(last_message_id, 0)')
+    db.execute(
+        '''
+        UPDATE chat_threads AS t
+        SET patient_unread = u.patient_unread, doctor_unread = u.doctor_unread
+        FROM (SELECT m.thread_id,
+                     SUM(m.id > r.patient_last_read_id AND m.sender_id IS NOT r.patient_id) AS patient_unread,
+                     SUM(m.id > r.doctor_last_read_id AND m.sender_id IS NOT r.doctor_id) AS doctor_unread
+              FROM chat_messages m JOIN chat_threads r ON r.id = m.thread_id
+              GROUP BY m.thread_id) AS u
+        WHERE t.id = u.thread_id
+        '''
+    )
+    return db.execute('SELECT COUNT(*) FROM chat_threads').fetchone()[0]
+
+def mark_read(db, thread_id, user_id, message_id):
+    """Move `user_id`'s read position in the thread forward to `message_id`; the caller commits.
+
+    Returns False (and writes nothing) if they had already read that far or are not in the thread.
+    """
+    return db.execute(
+        '''
+        UPDATE chat_threads SET
+            patient_last_read_id = CASE WHEN patient_id = :user THEN :message ELSE patient_last_read_id END,
+            patient_unread = CASE WHEN patient_id = :user THEN (
+                SELECT COUNT(*) FROM chat_messages m WHERE m.thread_id = :thread AND m.id > :message AND m.sender_id IS NOT :user
+            ) ELSE patient_unread END,
+            doctor_last_read_id = CASE WHEN doctor_id = :user THEN :message ELSE doctor_last_read_id END,
+            doctor_unread = CASE WHEN doctor_id = :user THEN (
+                SELECT COUNT(*) FROM chat_messages m WHERE m.thread_id = :thread AND m.id > :message AND m.sender_id IS NOT :user
+            ) ELSE doctor_unread END
+        WHERE id = :thread AND ((patient_id = :user AND patient_last_read_id < :message)
+                                OR (doctor_id = :user AND doctor_last_read_id < :message))
+        ''',
+        {'thread': thread_id, 'user': user_id, 'message': message_id}
+    ).rowcount == 1
+
+def get_inbox(db, user_id, side, before_ts=None, before_id=None, limit=PAGE_SIZE):
+    """One page of a doctor's or patient's threads, most recently active first.
+
+    `side` is 'doctor' or 'patient'. Returns (threads, next_cursor) like
+    patient_timeline.get_timeline().
+    """
+    other = SIDES[side]
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    where, params = '', [user_id]
+    if before_ts and before_id is not None:
+        where = INBOX_BEFORE_CURSOR
+        params += [before_ts, before_id]
+    rows = db.execute(INBOX_SQL.format(side=side, other=other, where=where), (*params, limit + 1)).fetchall()
+    threads = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = {'before_ts': threads[-1]['last_activity_at'], 'before_id': threads[-1]['id']}
+    return threads, next_cursor
+
+def unread_total(db, user_id, side):
+    """(threads with unread messages, unread messages) for a doctor's or patient's badge."""
+    row = db.execute(UNREAD_SQL.format(side=side), (user_id,)).fetchone()
+    return row[0], row[1]
+
+if __name__ == '__main__':
+    from database import connect
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Recompute chat thread summaries and unread counts.')
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--db', default=os.environ.get('DATABASE', 'swasthsathi.db'))
+    args = parser.parse_args()
+    conn = connect(args.db)
+    migrate(conn)
+    conn.execute('BEGIN IMMEDIATE')
+    count = rebuild_thread_summaries(conn)
+    conn.commit()
+    print(f"Rebuilt the summaries of {count} chat threads.")
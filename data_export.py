@@ -0,0 +1,257 @@
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# --- Parquet Export ---
+# Streams reporting tables to Parquet, BATCH_ROWS rows at a time: each batch
+# is fetched from SQLite, turned into one Arrow record batch and written out
+# as one row group before the next is fetched, so memory stays flat however
+# large the table is. Timestamps leave SQLite as epoch milliseconds and become
+# Arrow timestamps. Patient names and chat message text are never exported.
+#
+# Modes:
+#   * full: every row,
+#   * date range: rows whose date column falls in [since, until),
+#   * incremental: rows with an id above the last incremental export of that
+#     table (recorded in export_runs). Edits to already-exported rows are not
+#     picked up; run a full export for a fresh snapshot. An incremental export
+#     cannot also take a date range: the watermark would move past the rows
+#     the range left out, and no later incremental export would pick them up.
+#
+# households and mch_records split out into district partitions (see
+# partitions.py) are exported from the catalog and then from each partition,
+# into the same file. Every database records its own export_runs, so
+# incremental exports keep one watermark per file.
+
+BATCH_ROWS = 50_000
+COMPRESSION = 'zstd'
+
+def _ms(column):
+    return f'CAST(ROUND((julianday({column}) - 2440587.5) * 86400000) AS INTEGER) AS {column}'
+
+TIMESTAMP = pa.timestamp('ms', tz='UTC')
+
+# table -> (date column or None, [(SQL expression, field name, Arrow type)])
+EXPORTS = {
+    'consultations': ('created_at', [
+        ('id', 'id', pa.int64()),
+        ('patient_id', 'patient_id', pa.int64()),
+        ('doctor_id', 'doctor_id', pa.int64()),
+        ('CAST(patient_age AS INTEGER)', 'patient_age', pa.int32()),
+        ('patient_gender', 'patient_gender', pa.string()),
+        ('category', 'category', pa.string()),
+        ('status', 'status', pa.string()),
+        ('symptoms', 'symptoms', pa.string()),
+        ('photo_filename IS NOT NULL', 'has_photo', pa.bool_()),
+        ('audio_note_filename IS NOT NULL', 'has_audio_note', pa.bool_()),
+        (_ms('created_at'), 'created_at', TIMESTAMP),
+        (_ms('accepted_at'), 'accepted_at', TIMESTAMP),
+        (_ms('reviewed_at'), 'reviewed_at', TIMESTAMP),
+    ]),
+    'mch_records': ('record_date', [
+        ('id', 'id', pa.int64()),
+        ('asha_id', 'asha_id', pa.int64()),
+        ('patient_id', 'patient_id', pa.int64()),
+        ('record_type', 'record_type', pa.string()),
+        ('record_details', 'record_details', pa.string()),
+        ('vaccine', 'vaccine', pa.string()),
+        (_ms('record_date'), 'record_date', TIMESTAMP),
+    ]),
+    'households': (None, [
+        ('id', 'id', pa.int64()),
+        ('asha_id', 'asha_id', pa.int64()),
+        ('household_name', 'household_name', pa.string()),
+        ('address', 'address', pa.string()),
+        ('CAST(members_count AS INTEGER)', 'members_count', pa.int32()),
+        ('COALESCE(is_verified, 0) <> 0', 'is_verified', pa.bool_()),
+    ]),
+    # Metadata only: who wrote in which thread and when, never the message text.
+    'chat_messages': ('sent_at', [
+        ('id', 'id', pa.int64()),
+        ('thread_id', 'thread_id', pa.int64()),
+        ('sender_id', 'sender_id', pa.int64()),
+        ('length(message_text)', 'text_length', pa.int32()),
+        ("CASE WHEN file_path IS NULL THEN NULL ELSE lower(replace(file_path, rtrim(file_path, replace(file_path, '.', '')), '')) END",
+         'attachment_type', pa.string()),
+        ('audio_duration_ms', 'audio_duration_ms', pa.int64()),
+        (_ms('sent_at'), 'sent_at', TIMESTAMP),
+    ]),
+}
+
+def export_mode(since=None, until=None, incremental=False):
+    """'full', 'range' or 'incremental'; raises ValueError for an incremental export with a date range."""
+    if incremental and (since or until):
+        raise ValueError('an incremental export cannot take a date range (since/until)')
+    return 'incremental' if incremental else ('range' if since or until else 'full')
+
+def schema_for(table):
+    return pa.schema([(name, arrow_type) for _expr, name, arrow_type in EXPORTS[table][1]])
+
+def last_exported_id(db, table):
+    row = db.execute(
+        "SELECT MAX(last_id) FROM export_runs WHERE table_name = ? AND mode = 'incremental' AND finished_at IS NOT NULL",
+        (table,)
+    ).fetchone()
+    return row[0] or 0
+
+def build_query(db, table, since=None, until=None, incremental=False):
+    date_column, columns = EXPORTS[table]
+    where, params = [], []
+    if incremental:
+        where.append('id > ?')
+        params.append(last_exported_id(db, table))
+    if date_column and since:
+        where.append(f'{date_column} >= ?')
+        params.append(since)
+    if date_column and until:
+        where.append(f'{date_column} < ?')
+        params.append(until)
+    sql = f'SELECT {", ".join(expr for expr, _name, _type in columns)} FROM {table}'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    return sql + ' ORDER BY id', params
+
+def _to_arrow(values, arrow_type):
+    # SQLite hands booleans back as 0/1.
+    if arrow_type == pa.bool_():
+        return pa.array(values, type=pa.int8()).cast(arrow_type)
+    return pa.array(values, type=arrow_type)
+
+def iter_batches(db, table, since=None, until=None, incremental=False, batch_rows=BATCH_ROWS):
+    """Yield Arrow record batches of at most batch_rows rows, in id order."""
+    sql, params = build_query(db, table, since, until, incremental)
+    schema = schema_for(table)
+    cursor = db.cursor()
+    cursor.row_factory = None
+    cursor.execute(sql, params)
+    while True:
+        rows = cursor.fetchmany(batch_rows)
+        if not rows:
+            return
+        columns = list(zip(*rows))
+        yield pa.RecordBatch.from_arrays(
+            [_to_arrow(values, field.type) for values, field in zip(columns, schema)], schema=schema
+        )
+
+def export_batches(db, table, sink, since=None, until=None, incremental=False, batch_rows=BATCH_ROWS, partitions=()):
+    """Write `table` to `sink` (a path or writable file object) as Parquet.
+
+    Yields the running row count after every row group. The run is recorded in
+    export_runs, and only counts as finished (moving the incremental watermark)
+    once the generator has been exhausted. `partitions` are further databases
+    whose rows of `table` follow the catalog's.
+    """
+    mode = export_mode(since, until, incremental)
+    # [database, export_runs id, rows, last id] for every database read.
+    runs = []
+    for source in (db, *partitions):
+        run_id = source.execute(
+            'INSERT INTO export_runs (table_name, mode, since, until) VALUES (?, ?, ?, ?)', (table, mode, since, until)
+        ).lastrowid
+        source.commit()
+        runs.append([source, run_id, 0, last_exported_id(source, table) if incremental else None])
+    rows = 0
+    with pq.ParquetWriter(sink, schema_for(table), compression=COMPRESSION) as writer:
+        for run in runs:
+            for batch in iter_batches(run[0], table, since, until, incremental, batch_rows):
+                writer.write_batch(batch)
+                rows += batch.num_rows
+                run[2] += batch.num_rows
+                run[3] = batch.column(0)[-1].as_py()
+                yield rows
+    for source, run_id, run_rows, last_id in runs:
+        source.execute(
+            'UPDATE export_runs SET rows = ?, last_id = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?',
+            (run_rows, last_id, run_id)
+        )
+        source.commit()
+
+def write_parquet(db, table, path, **options):
+    """Export `table` to the file at `path`; returns the number of rows written."""
+    tmp_path = path + '.part'
+    rows = 0
+    try:
+        for rows in export_batches(db, table, tmp_path, **options):
+            pass
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return rows
+
+class ChunkSink:
+    """Write-only file object that collects bytes until the caller drains them."""
+
+    def __init__(self):
+        self._chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_parquet(db, table, **options):
+    """Parquet bytes for an HTTP response, one row group per chunk."""
+    sink = ChunkSink()
+    for _rows in export_batches(db, table, sink, **options):
+        yield sink.drain()
+    # The footer is written when the writer closes, after the last row group.
+    yield sink.drain()
+
+def export_filename(table, since=None, until=None, incremental=False):
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    return f'{table}-{export_mode(since, until, incremental)}-{stamp}.parquet'
+
+if __name__ == '__main__':
+    from database import connect
+    from migrations import migrate
+    from partitions import TABLES as PARTITIONED_TABLES, open_partitions
+
+    parser = argparse.ArgumentParser(description='Export reporting tables to Parquet.')
+    parser.add_argument('tables', nargs='*', metavar='table',
+                        help=f'tables to export (default: all of {", ".join(EXPORTS)})')
+    parser.add_argument('--out', default='exports', help='output directory')
+    parser.add_argument('--db', default=os.environ.get('DATABASE', 'swasthsathi.db'))
+    parser.add_argument('--since', help="only rows dated on or after this (e.g. '2025-01-01')")
+    parser.add_argument('--until', help='only rows dated before this')
+    parser.add_argument('--incremental', action='store_true', help='only rows added since the last incremental export')
+    parser.add_argument('--batch-rows', type=int, default=BATCH_ROWS)
+    args = parser.parse_args()
+    unknown = set(args.tables) - set(EXPORTS)
+    if unknown:
+        parser.error(f"unknown table(s): {', '.join(sorted(unknown))}")
+    try:
+        export_mode(args.since, args.until, args.incremental)
+    except ValueError as e:
+        parser.error(str(e))
+
+    conn = connect(args.db)
+    migrate(conn)
+    partitions = open_partitions(conn, args.db)
+    os.makedirs(args.out, exist_ok=True)
+    for table in args.tables or list(EXPORTS):
+        if EXPORTS[table][0] is None and (args.since or args.until):
+            print(f"- {table} has no date column; exporting without the date range.", file=sys.stderr)
+        path = os.path.join(args.out, export_filename(table, args.since, args.until, args.incremental))
+        started = time.perf_counter()
+        rows = write_parquet(conn, table, path, since=args.since, until=args.until, incremental=args.incremental,
+                             batch_rows=args.batch_rows, partitions=partitions if table in PARTITIONED_TABLES else ())
+        elapsed = time.perf_counter() - started
+        print(f"- {table}: {rows} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s) -> {path}")
@@ -0,0 +1,157 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from flask import g, current_app
+
+# --- Connection Settings ---
+# WAL lets readers keep going while a writer commits, busy_timeout makes writers
+# wait for the lock instead of failing straight away with "database is locked",
+# and synchronous=NORMAL is durable enough in WAL mode while skipping an fsync per commit.
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE_SIZE = 256
+POOL_SIZE = 8
+
+# --- Statement Timing ---
+# After set_statement_timer(callback), connections opened from then on call
+# callback(sql, seconds) as each execute()/executemany() returns, whether it is
+# called on the connection or on one of its cursors. That covers
+# running the statement up to its first row (for a SELECT, any sort or
+# aggregate), not fetching the rest.
+_statement_timer = None
+
+def set_statement_timer(callback):
+    global _statement_timer
+    _statement_timer = callback
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            if _statement_timer is not None:
+                _statement_timer(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            if _statement_timer is not None:
+                _statement_timer(sql, time.perf_counter() - started)
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            if _statement_timer is not None:
+                _statement_timer(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            if _statement_timer is not None:
+                _statement_timer(sql, time.perf_counter() - started)
+
+def connect(path, readonly=False):
+    conn = sqlite3.connect(
+        path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False,
+        factory=TimedConnection if _statement_timer is not None else sqlite3.Connection,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    if readonly:
+        conn.execute('PRAGMA query_only = ON')
+    return conn
+
+
+class ConnectionPool:
+    """Per-process pool of SQLite connections for a single database file.
+
+    Connections are handed out LIFO so the warmest statement cache is reused
+    first. The pool remembers the pid that created it, so a gunicorn worker
+    forked from a preloaded master never reuses the master's handles.
+    `setup(conn)`, if given, runs once on every new connection.
+    """
+
+    def __init__(self, path, size=POOL_SIZE, setup=None):
+        self.path = path
+        self.size = size
+        self.setup = setup
+        self._pid = os.getpid()
+        self._idle = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        self._check_fork()
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        conn = connect(self.path)
+        if self.setup is not None:
+            self.setup(conn)
+        return conn
+
+    def release(self, conn):
+        if self._pid != os.getpid():
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self):
+        with self._lock:
+            while self._idle:
+                self._idle.pop().close()
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            # Inherited sockets/handles belong to the parent; drop them without closing.
+            self._idle = deque()
+            self._lock = threading.Lock()
+            self._pid = os.getpid()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(path, setup=None):
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = ConnectionPool(path, current_app.config.get('DB_POOL_SIZE', POOL_SIZE), setup)
+        return pool
+
+def get_db():
+    """Return the connection bound to the current app context."""
+    if 'db' not in g:
+        g.db = get_pool(current_app.config['DATABASE']).acquire()
+    return g.db
+
+def close_db(exc=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_pool(current_app.config['DATABASE']).release(conn)
+
+def init_app(app):
+    app.config.setdefault('DATABASE', 'swasthsathi.db')
+    app.teardown_appcontext(close_db)
@@ -0,0 +1,313 @@
+import json
+import sqlite3
+from datetime import datetime
+
+from household_search import index_household
+from immunization import DOSES, refresh_due
+
+# --- Offline Field Sync ---
+# ASHA devices queue edits while offline and send them in one POST /api/sync:
+#
+#   {"since": 120, "changes": [
+#       {"client_id": "6f1c...", "op": "create", "entity": "household", "data": {...}},
+#       {"client_id": "90ab...", "op": "create", "entity": "birth_report",
+#        "data": {"household_ref": "6f1c...", ...}},
+#       {"client_id": "77e2...", "op": "update", "entity": "household", "id": 42, "data": {...}}]}
+#
+# Every change carries a client-generated id. Once applied, that id is kept in
+# sync_receipts, so a batch re-sent after a dropped connection is answered from
+# the receipts instead of being applied twice. A later change can point at a
+# row created offline through "<field>_ref" (or "ref" for the row itself),
+# using the client_id of the change that created it; the reference must name a
+# row of the entity that field expects.
+#
+# The reply lists the outcome of each change and, when "since" is given, the
+# rows of this ASHA changed after that version of change_log. Triggers on the
+# synced tables fill change_log, so edits made through the web pages reach
+# devices too.
+#
+# A child's MCH records feed the immunization schedule: a 'birth' record dates
+# the birth, and an 'immunization' record names the dose given in "vaccine"
+# (a code from immunization.SCHEDULE). A record may only name a patient the
+# ASHA already keeps records for or who lives in their district. A birth report also adds the child's
+# 'birth' record, whose child_id (sent back in the delta) is what the child's
+# later dose records give as "child_id". Due doses are refreshed before the
+# batch commits.
+
+MAX_CHANGES = 500
+DELTA_LIMIT = 500
+
+class ChangeRejected(Exception):
+    pass
+
+def _text(value, max_length=2000):
+    value = str(value).strip()
+    if len(value) > max_length:
+        raise ChangeRejected(f'must be at most {max_length} characters')
+    return value
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ChangeRejected('must be a whole number')
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ChangeRejected('must be a number')
+
+def _date(value):
+    try:
+        return datetime.strptime(str(value), '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        raise ChangeRejected('must be a date like 2025-01-31')
+
+def _bool(value):
+    return 1 if value in (True, 1, '1', 'true', 'on', 'yes') else 0
+
+def _vaccine(value):
+    value = str(value).strip()
+    if value not in DOSES:
+        raise ChangeRejected('must be a dose code from the immunization schedule')
+    return value
+
+# Field reports keep their answers as JSON in field_reports.details; `date`
+# names the answer copied to event_date.
+REPORT_FIELDS = {
+    'birth': {
+        'date': 'birth_date',
+        'fields': {'child_name': _text, 'sex': _text, 'birth_date': _date, 'birth_weight_kg': _float,
+                   'place_of_delivery': _text, 'mother_name': _text},
+        'required': {'sex', 'birth_date', 'mother_name'},
+    },
+    'death': {
+        'date': 'death_date',
+        'fields': {'deceased_name': _text, 'age_years': _int, 'sex': _text, 'death_date': _date,
+                   'cause': _text, 'place_of_death': _text},
+        'required': {'deceased_name', 'death_date'},
+    },
+    'disease': {
+        'date': 'onset_date',
+        'fields': {'disease': _text, 'cases_count': _int, 'onset_date': _date, 'symptoms': _text, 'location': _text},
+        'required': {'disease', 'cases_count'},
+    },
+}
+
+# Rows stored directly in a table, one column per field.
+TABLE_ENTITIES = {
+    'household': {
+        'table': 'households',
+        'fields': {'household_name': _text, 'address': _text, 'members_count': _int, 'is_verified': _bool},
+        'required': {'household_name'},
+    },
+    'mch_record': {
+        'table': 'mch_records',
+        'fields': {'patient_id': _int, 'child_id': _int, 'record_type': _text, 'record_details': _text,
+                   'record_date': _date, 'vaccine': _vaccine},
+        'required': {'record_type'},
+    },
+}
+
+# change_log.entity -> table
+LOGGED_TABLES = {'household': 'households', 'mch_record': 'mch_records', 'field_report': 'field_reports'}
+
+DELTA_SQL = 'SELECT version, entity, entity_id, op FROM change_log WHERE asha_id = ? AND version > ? ORDER BY version LIMIT ?'
+RECEIPT_SQL = 'SELECT entity, server_id FROM sync_receipts WHERE asha_id = ? AND client_id = ?'
+OWN_CHILD_SQL = "SELECT patient_id FROM mch_records WHERE child_id = ? AND record_type = 'birth' AND asha_id = ? LIMIT 1"
+
+def clean_values(data, fields, required, partial=False):
+    values = {}
+    for name, coerce in fields.items():
+        value = data.get(name)
+        if value is None or value == '':
+            continue
+        try:
+            values[name] = coerce(value)
+        except ChangeRejected as e:
+            raise ChangeRejected(f'{name} {e}')
+    missing = set() if partial else required - values.keys()
+    if missing:
+        raise ChangeRejected(f'missing {", ".join(sorted(missing))}')
+    return values
+
+def _resolve_ref(db, asha_id, client_id, entity):
+    row = db.execute(
+        'SELECT server_id FROM sync_receipts WHERE asha_id = ? AND client_id = ? AND entity = ?', (asha_id, client_id, entity)
+    ).fetchone()
+    if row is None:
+        raise ChangeRejected(f'unknown {entity} reference {client_id!r}')
+    return row[0]
+
+def _own_household(db, asha_id, data):
+    if data.get('household_ref'):
+        household_id = _resolve_ref(db, asha_id, str(data['household_ref']), 'household')
+    elif data.get('household_id') not in (None, ''):
+        household_id = _int(data['household_id'])
+    else:
+        return None
+    if db.execute('SELECT 1 FROM households WHERE id = ? AND asha_id = ?', (household_id, asha_id)).fetchone() is None:
+        raise ChangeRejected(f'household {household_id} is not in your area')
+    return household_id
+
+def _own_patient(db, asha_id, patient_id):
+    """Check that the ASHA already keeps records for `patient_id`, or that the patient lives in their district."""
+    if db.execute('SELECT 1 FROM mch_records WHERE patient_id = ? AND asha_id = ? LIMIT 1', (patient_id, asha_id)).fetchone():
+        return
+    if db.execute(
+        'SELECT 1 FROM users p JOIN users a ON a.id = ? WHERE p.id = ? AND p.district IS NOT NULL AND p.district = a.district',
+        (asha_id, patient_id)
+    ).fetchone() is None:
+        raise ChangeRejected(f'patient {patient_id} is not in your area')
+
+def _own_child(db, asha_id, values):
+    """Check that values['child_id'] is a child this ASHA registered, and fill in their patient_id."""
+    row = db.execute(OWN_CHILD_SQL, (values['child_id'], asha_id)).fetchone()
+    if row is None:
+        raise ChangeRejected(f"child {values['child_id']} is not in your records")
+    if row[0] is not None:
+        values.setdefault('patient_id', row[0])
+
+def _create(db, asha_id, entity, data):
+    if entity.endswith('_report') and entity[:-len('_report')] in REPORT_FIELDS:
+        report_type = entity[:-len('_report')]
+        spec = REPORT_FIELDS[report_type]
+        details = clean_values(data, spec['fields'], spec['required'])
+        household_id = _own_household(db, asha_id, data)
+        report_id = db.execute(
+            'INSERT INTO field_reports (asha_id, report_type, household_id, event_date, details) VALUES (?, ?, ?, ?, ?)',
+            (asha_id, report_type, household_id, details.get(spec['date']), json.dumps(details))
+        ).lastrowid
+        if report_type == 'birth':
+            # The child's birth record starts their immunization schedule.
+            db.execute(
+                "INSERT INTO mch_records (asha_id, record_type, record_details, record_date) VALUES (?, 'birth', ?, ?)",
+                (asha_id, details.get('child_name') or f"Baby of {details['mother_name']}", details['birth_date'])
+            )
+        return report_id
+    spec = TABLE_ENTITIES.get(entity)
+    if spec is None:
+        raise ChangeRejected(f'unknown entity {entity!r}')
+    values = clean_values(data, spec['fields'], spec['required'])
+    if 'patient_id' in values:
+        _own_patient(db, asha_id, values['patient_id'])
+    if 'child_id' in values:
+        _own_child(db, asha_id, values)
+    values['asha_id'] = asha_id
+    row_id = db.execute(
+        f'INSERT INTO {spec["table"]} ({", ".join(values)}) VALUES ({", ".join("?" * len(values))})',
+        list(values.values())
+    ).lastrowid
+    if entity == 'household':
+        index_household(db, row_id)
+    return row_id
+
+def _update(db, asha_id, entity, change):
+    spec = TABLE_ENTITIES.get(entity)
+    if spec is None:
+        raise ChangeRejected(f'{entity!r} cannot be updated')
+    row_id = _resolve_ref(db, asha_id, str(change['ref']), entity) if change.get('ref') else _int(change.get('id'))
+    values = clean_values(change.get('data') or {}, spec['fields'], spec['required'], partial=True)
+    if not values:
+        raise ChangeRejected('nothing to update')
+    if 'patient_id' in values:
+        _own_patient(db, asha_id, values['patient_id'])
+    if 'child_id' in values:
+        _own_child(db, asha_id, values)
+    updated = db.execute(
+        f'UPDATE {spec["table"]} SET {", ".join(f"{name} = ?" for name in values)} WHERE id = ? AND asha_id = ?',
+        [*values.values(), row_id, asha_id]
+    ).rowcount
+    if not updated:
+        raise ChangeRejected(f'{entity} {row_id} not found')
+    if entity == 'household':
+        index_household(db, row_id)
+    return row_id
+
+def _apply_one(db, asha_id, change):
+    if not isinstance(change, dict) or not isinstance(change.get('data', {}), dict):
+        return {'client_id': None, 'status': 'rejected', 'error': 'a change must be an object with an object "data"'}
+    client_id = str(change.get('client_id') or '')
+    result = {'client_id': client_id}
+    if not client_id or len(client_id) > 64:
+        return {**result, 'status': 'rejected', 'error': 'client_id must be 1-64 characters'}
+    receipt = db.execute(RECEIPT_SQL, (asha_id, client_id)).fetchone()
+    if receipt is not None:
+        return {**result, 'status': 'duplicate', 'entity': receipt[0], 'id': receipt[1]}
+
+    entity = str(change.get('entity') or '')
+    op = change.get('op', 'create')
+    db.execute('SAVEPOINT sync_change')
+    try:
+        if op == 'create':
+            row_id = _create(db, asha_id, entity, change.get('data') or {})
+        elif op == 'update':
+            row_id = _update(db, asha_id, entity, change)
+        else:
+            raise ChangeRejected(f'unknown op {op!r}')
+        db.execute(
+            'INSERT INTO sync_receipts (asha_id, client_id, entity, server_id) VALUES (?, ?, ?, ?)',
+            (asha_id, client_id, entity, row_id)
+        )
+    except (ChangeRejected, sqlite3.IntegrityError) as e:
+        # A constraint the validators do not check (NOT NULL, or a trigger's RAISE) rejects this change only.
+        db.execute('ROLLBACK TO sync_change')
+        db.execute('RELEASE sync_change')
+        return {**result, 'status': 'rejected', 'error': str(e)}
+    db.execute('RELEASE sync_change')
+    return {**result, 'status': 'applied', 'entity': entity, 'id': row_id}
+
+def apply_changes(db, asha_id, changes):
+    """Apply a batch of device changes in one transaction; returns one result per change.
+
+    A change that fails validation is rolled back on its own and reported as
+    rejected; the rest of the batch still commits.
+    """
+    if db.in_transaction:
+        db.commit()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        results = [_apply_one(db, asha_id, change) for change in changes]
+        refresh_due(db)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return results
+
+def _serialise(entity, row):
+    item = dict(row)
+    if entity == 'field_report':
+        item['details'] = json.loads(item['details'])
+    return item
+
+def changes_since(db, asha_id, since, limit=DELTA_LIMIT):
+    """Rows of this ASHA changed after change_log version `since`.
+
+    Returns (changes, version, more). Pass `version` back as the next `since`;
+    `more` means the limit was hit and the device should sync again.
+    """
+    log = db.execute(DELTA_SQL, (asha_id, since, limit + 1)).fetchall()
+    more = len(log) > limit
+    log = log[:limit]
+    # Only the latest entry per row matters; the row itself is read as it is now.
+    latest = {}
+    for version, entity, entity_id, op in log:
+        latest[(entity, entity_id)] = (version, op)
+    current = {}
+    for entity, table in LOGGED_TABLES.items():
+        ids = [entity_id for (e, entity_id), (_v, op) in latest.items() if e == entity and op == 'upsert']
+        if ids:
+            rows = db.execute(
+                f'SELECT * FROM {table} WHERE asha_id = ? AND id IN ({", ".join("?" * len(ids))})', (asha_id, *ids)
+            ).fetchall()
+            current.update(((entity, row['id']), _serialise(entity, row)) for row in rows)
+    changes = []
+    for (entity, entity_id), (version, _op) in sorted(latest.items(), key=lambda item: item[1][0]):
+        row = current.get((entity, entity_id))
+        change = {'version': version, 'entity': entity, 'id': entity_id, 'op': 'upsert' if row else 'delete'}
+        if row:
+            change['data'] = row
+        changes.append(change)
+    return changes, (log[-1][0] if log else since), more
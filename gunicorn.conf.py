@@ -0,0 +1,27 @@
+import os
+import shutil
+import tempfile
+
+# --- Gunicorn Settings ---
+# Loaded automatically by `gunicorn app:app` from the working directory.
+# Prometheus metrics are kept in PROMETHEUS_MULTIPROC_DIR so /metrics adds up
+# every worker's samples (see metrics.py). The variable has to be set before
+# the workers import prometheus_client, and the directory emptied on each start
+# so counters from the previous run are not added in again.
+
+# Each open chat event stream holds a worker thread (the Procfile gives every
+# worker 16) for up to two minutes, and app.py caps streams at CHAT_STREAM_LIMIT
+# per worker. Several workers keep a burst of open chats in one of them from
+# stalling everyone else's requests.
+workers = int(os.environ.get('WEB_CONCURRENCY', '4'))
+
+multiproc_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR',
+                                      os.path.join(tempfile.gettempdir(), 'swasthsathi-metrics'))
+
+def on_starting(server):
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    os.makedirs(multiproc_dir, exist_ok=True)
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,148 @@
+import argparse
+import csv
+import os
+import time
+
+from field_sync import TABLE_ENTITIES, ChangeRejected, clean_values
+from household_search import index_households
+from immunization import refresh_due
+
+# --- Bulk Household Import ---
+# Loads an existing survey register (households, or MCH beneficiaries) from a
+# CSV file. The file is read as a stream, CHUNK_ROWS rows at a time; each chunk
+# is validated with the same rules as the sync API and written with one
+# executemany, all inside a single transaction. A bad row is reported with its
+# line number and skipped; the rest of the file still loads. The summary and
+# change_log triggers fire as usual, the new households are added to the
+# search index in bulk at the end, and imported births and doses update the
+# children's due immunizations in one refresh.
+#
+# Rows belong to the importing ASHA, or, for an admin import, to the ASHA named
+# in an "asha_id" or "asha_email" column. With district partitions, `route`
+# sends each row to its ASHA's database; every database written to gets its
+# own transaction, and a failed import rolls all of them back.
+
+CHUNK_ROWS = 5000
+MAX_REPORTED_ERRORS = 200
+
+# CSV kind -> field_sync entity
+KINDS = {'households': 'household', 'beneficiaries': 'mch_record'}
+# Column defaults, which executemany would otherwise replace with NULL for blank cells.
+DEFAULTS = {'is_verified': '0', 'record_date': 'CURRENT_TIMESTAMP'}
+
+def asha_directory(db, asha_role_id):
+    """{id or lower-cased email: ASHA id} for resolving the asha column of admin imports."""
+    ashas = {}
+    for asha_id, email in db.execute('SELECT id, email FROM users WHERE role_id = ?', (asha_role_id,)):
+        ashas[str(asha_id)] = asha_id
+        ashas[email.lower()] = asha_id
+    return ashas
+
+def _row_asha(row, ashas):
+    key = (row.get('asha_id') or row.get('asha_email') or '').strip().lower()
+    if not key:
+        raise ChangeRejected('missing asha_id or asha_email')
+    if key not in ashas:
+        raise ChangeRejected(f'unknown ASHA {key!r}')
+    return ashas[key]
+
+def _index_new_households(db, after_id):
+    index_households(db, db.execute(
+        'SELECT id, asha_id, household_name, address FROM households WHERE id > ? AND asha_id IS NOT NULL', (after_id,)
+    ))
+
+def import_csv(db, f, kind, asha_id=None, ashas=None, route=None, chunk_rows=CHUNK_ROWS):
+    """Import the CSV text stream `f`; returns {'rows', 'imported', 'error_count', 'errors'}.
+
+    Pass `asha_id` to give every row to one ASHA, or `ashas` (see
+    asha_directory) to read the owner from each row. `route(asha_id)` returns
+    the connection a row goes to (default: `db`). `errors` lists the first
+    MAX_REPORTED_ERRORS problems as (line number, message).
+    """
+    spec = TABLE_ENTITIES[KINDS[kind]]
+    columns = ('asha_id', *spec['fields'])
+    placeholders = ', '.join(f'COALESCE(?, {DEFAULTS[c]})' if c in DEFAULTS else '?' for c in columns)
+    insert = f'INSERT INTO {spec["table"]} ({", ".join(columns)}) VALUES ({placeholders})'
+    reader = csv.DictReader(f)
+    if reader.fieldnames is None:
+        return {'rows': 0, 'imported': 0, 'error_count': 0, 'errors': []}
+    reader.fieldnames = [name.strip().lower().replace(' ', '_') for name in reader.fieldnames]
+    result = {'rows': 0, 'imported': 0, 'error_count': 0, 'errors': []}
+    route = route or (lambda _asha_id: db)
+    # id(connection) -> (connection, pending rows, last household id before the import)
+    targets = {}
+
+    def target(owner):
+        conn = route(owner)
+        if id(conn) not in targets:
+            if conn.in_transaction:
+                conn.commit()
+            conn.execute('BEGIN IMMEDIATE')
+            last_household = conn.execute('SELECT COALESCE(MAX(id), 0) FROM households').fetchone()[0]
+            targets[id(conn)] = (conn, [], last_household)
+        return targets[id(conn)]
+
+    try:
+        for row in reader:
+            result['rows'] += 1
+            try:
+                values = clean_values(row, spec['fields'], spec['required'])
+                owner = asha_id if asha_id is not None else _row_asha(row, ashas)
+            except ChangeRejected as e:
+                result['error_count'] += 1
+                if len(result['errors']) < MAX_REPORTED_ERRORS:
+                    result['errors'].append((reader.line_num, str(e)))
+                continue
+            conn, batch, _last_household = target(owner)
+            batch.append((owner, *(values.get(name) for name in spec['fields'])))
+            if len(batch) >= chunk_rows:
+                conn.executemany(insert, batch)
+                result['imported'] += len(batch)
+                batch.clear()
+        for conn, batch, last_household in targets.values():
+            if batch:
+                conn.executemany(insert, batch)
+                result['imported'] += len(batch)
+            if kind == 'households':
+                _index_new_households(conn, last_household)
+            else:
+                refresh_due(conn)
+        for conn, _batch, _last_household in targets.values():
+            conn.commit()
+    except BaseException:
+        for conn, _batch, _last_household in targets.values():
+            conn.rollback()
+        raise
+    return result
+
+if __name__ == '__main__':
+    from database import connect
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Bulk-import households or MCH beneficiaries from a CSV register.')
+    parser.add_argument('path')
+    parser.add_argument('--kind', choices=sorted(KINDS), default='households')
+    parser.add_argument('--asha', help='email or id of the ASHA who owns every row (default: the asha_id/asha_email column)')
+    parser.add_argument('--db', default=os.environ.get('DATABASE', 'swasthsathi.db'))
+    args = parser.parse_args()
+
+    from app import ROLES
+    from partitions import router
+    conn = connect(args.db)
+    migrate(conn)
+    ashas = asha_directory(conn, ROLES['asha'])
+    owner = None
+    if args.asha:
+        owner = ashas.get(args.asha.strip().lower())
+        if owner is None:
+            parser.error(f'no ASHA with email or id {args.asha!r}')
+    started = time.perf_counter()
+    with open(args.path, newline='', encoding='utf-8-sig') as f:
+        result = import_csv(conn, f, args.kind, asha_id=owner, ashas=ashas, route=router(conn, args.db))
+    elapsed = time.perf_counter() - started
+    for line, message in result['errors']:
+        print(f"- line {line}: {message}")
+    if result['error_count'] > len(result['errors']):
+        print(f"- ... and {result['error_count'] - len(result['errors'])} more errors")
+    print(f"Imported {result['imported']} of {result['rows']} rows in {elapsed:.1f}s "
+          f"({result['rows'] / elapsed if elapsed else 0:,.0f} rows/s).")
@@ -0,0 +1,62 @@
+import re
+
+# --- Household Search ---
+# households_fts holds one row per household (rowid = households.id). Every word
+# is stored with its ASHA's id glued on the front ("a7xverma"), so a prefix
+# query like "a7xver"* only ever touches that ASHA's part of the index. The
+# cost then tracks the size of one ASHA's caseload, not the whole state's.
+
+AUTOCOMPLETE_LIMIT = 10
+SEARCH_LIMIT = 200
+
+_WORD = re.compile(r'[^\W_]+')
+
+def _scope(asha_id):
+    return f'a{int(asha_id)}x'
+
+def scoped_text(asha_id, text):
+    prefix = _scope(asha_id)
+    return ' '.join(prefix + word for word in _WORD.findall(str(text or '').lower()))
+
+def index_household(db, household_id):
+    """Refresh the search entry for one household. Call after every insert/update."""
+    db.execute('DELETE FROM households_fts WHERE rowid = ?', (household_id,))
+    index_households(db, db.execute(
+        'SELECT id, asha_id, household_name, address FROM households WHERE id = ? AND asha_id IS NOT NULL', (household_id,)
+    ))
+
+def index_households(db, rows):
+    """Add entries for (id, asha_id, household_name, address) rows that are not in the index yet."""
+    db.executemany(
+        'INSERT INTO households_fts (rowid, household_name, address, household_id) VALUES (?, ?, ?, ?)',
+        ((r[0], scoped_text(r[1], r[2]), scoped_text(r[1], r[3]), scoped_text(r[1], r[0])) for r in rows)
+    )
+
+def rebuild_index(db):
+    db.execute('DELETE FROM households_fts')
+    index_households(db, db.execute('SELECT id, asha_id, household_name, address FROM households WHERE asha_id IS NOT NULL'))
+    db.execute("INSERT INTO households_fts (households_fts) VALUES ('optimize')")
+
+def match_expression(asha_id, query):
+    """Every word of the query must prefix-match some word of the household."""
+    prefix = _scope(asha_id)
+    words = _WORD.findall(query.lower())
+    if not words:
+        return None
+    return ' AND '.join(f'"{prefix}{word}"*' for word in words)
+
+def search_households(db, asha_id, query, limit=SEARCH_LIMIT, columns='h.*'):
+    match = match_expression(asha_id, query)
+    if match is None:
+        return db.execute(f'SELECT {columns} FROM households h WHERE h.asha_id = ? LIMIT ?', (asha_id, limit)).fetchall()
+    return db.execute(
+        f'''
+        SELECT {columns}
+        FROM households_fts f
+        JOIN households h ON h.id = f.rowid
+        WHERE households_fts MATCH ? AND h.asha_id = ?
+        ORDER BY f.rank
+        LIMIT ?
+        ''',
+        (match, asha_id, limit)
+    ).fetchall()
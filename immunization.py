@@ -0,0 +1,238 @@
+import argparse
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+# --- Immunization Schedule ---
+# Each child's outstanding vaccine doses are stored in immunization_due, so the
+# ASHA's "due this week" and "overdue" lists are one range scan of the
+# (asha_id, due_date) index instead of a recomputation on every page load.
+#
+# A child is a 'birth' record in mch_records: its record_date is the date of
+# birth, and every record of the child carries its id in child_id. A child
+# registered in the field through a birth report has no patient account, so
+# the birth record is the only thing identifying them; for a patient, triggers
+# (migration 18) give the birth and dose records an ASHA keeps for them the id
+# of their first birth record with that ASHA. Each 'immunization' record with a `vaccine` code is a dose
+# given on its record_date. The schedule (data/immunization_schedule.json, or
+# the file named by IMMUNIZATION_SCHEDULE) lists every dose with the age it
+# falls due at and the last age it is given at. A dose in a series can also
+# name the dose before it and the minimum gap after that one. compute_due()
+# works out a whole caseload at once, as NumPy arrays of children by doses.
+#
+# Dates are local to LOCAL_TZ, the one clock the due lists are read against:
+# a record_date with a time of day is a UTC timestamp (CURRENT_TIMESTAMP) and
+# is moved to its local date first, and "today" comes from local_today().
+#
+# A trigger on mch_records (migration 18) marks a child in immunization_dirty
+# whenever one of their birth or dose records changes. The write paths (sync
+# and CSV import) call refresh_due() before they commit, which recomputes only
+# the marked children. After editing the schedule, run
+#   python immunization.py rebuild
+
+BUNDLED_SCHEDULE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'immunization_schedule.json')
+# The mch_records types the engine reads.
+RECORD_TYPES = ('birth', 'immunization')
+DUE_SOON_DAYS = 7
+LIST_LIMIT = 200
+CHUNK_CHILDREN = 20_000
+# The clinics run on Indian Standard Time.
+LOCAL_UTC_OFFSET_MINUTES = 330
+LOCAL_TZ = timezone(timedelta(minutes=LOCAL_UTC_OFFSET_MINUTES), 'IST')
+
+def local_today():
+    return datetime.now(LOCAL_TZ).date()
+
+def _local_date(column):
+    # Bare dates are already local; timestamps are UTC.
+    return (f"date({column}, CASE WHEN length({column}) > 10 "
+            f"THEN '+{LOCAL_UTC_OFFSET_MINUTES} minutes' ELSE '+0 minutes' END)")
+
+def load_schedule(path):
+    """Read a schedule file; returns its doses in order. Raises ValueError if it is malformed."""
+    with open(path, encoding='utf-8') as f:
+        doses = json.load(f)['doses']
+    schedule, seen = [], set()
+    for dose in doses:
+        code, after = str(dose['code']), dose.get('after')
+        due_days, last_days = int(dose['due_days']), dose.get('last_days')
+        if code in seen:
+            raise ValueError(f'{path}: dose {code!r} is listed twice')
+        if after is not None and after not in seen:
+            raise ValueError(f'{path}: {code!r} follows {after!r}, which must be listed before it')
+        if last_days is not None and int(last_days) < due_days:
+            raise ValueError(f'{path}: {code!r} stops being given before it falls due')
+        schedule.append({
+            'code': code, 'vaccine': dose.get('vaccine', code), 'due_days': due_days,
+            'last_days': None if last_days is None else int(last_days),
+            'after': after, 'min_gap_days': int(dose.get('min_gap_days', 0)),
+        })
+        seen.add(code)
+    return schedule
+
+SCHEDULE = load_schedule(os.environ.get('IMMUNIZATION_SCHEDULE') or BUNDLED_SCHEDULE)
+DOSES = {dose['code']: dose for dose in SCHEDULE}
+
+def compute_due(dob, given, schedule=SCHEDULE):
+    """Due dates for a caseload, one row per child and one column per dose of `schedule`.
+
+    `dob` is an (n,) datetime64[D] array and `given` an (n, doses) one with
+    the date each dose was given, NaT if it was not. Returns (due, last,
+    pending): when each dose falls due, the last day it may be given (NaT: no
+    limit), and whether it is still to be given.
+    """
+    due = np.empty(given.shape, dtype='datetime64[D]')
+    last = np.full(given.shape, np.datetime64('NaT', 'D'))
+    column = {dose['code']: j for j, dose in enumerate(schedule)}
+    for j, dose in enumerate(schedule):
+        due[:, j] = dob + np.timedelta64(dose['due_days'], 'D')
+        if dose['after'] is not None:
+            # Not before the gap after the previous dose: when it was given, or when it is due.
+            k = column[dose['after']]
+            previous = np.where(np.isnat(given[:, k]), due[:, k], given[:, k])
+            due[:, j] = np.maximum(due[:, j], previous + np.timedelta64(dose['min_gap_days'], 'D'))
+        if dose['last_days'] is not None:
+            last[:, j] = dob + np.timedelta64(dose['last_days'], 'D')
+    pending = np.isnat(given) & (np.isnat(last) | (due <= last))
+    return due, last, pending
+
+CHILDREN_SQL = f'''
+    SELECT m.child_id, m.asha_id, m.patient_id, m.record_details, {_local_date('m.record_date')}
+    FROM immunization_dirty d
+    JOIN mch_records m ON m.child_id = d.child_id AND m.record_type = 'birth'
+    WHERE d.child_id > ? AND d.child_id <= ? AND {_local_date('m.record_date')} IS NOT NULL
+    ORDER BY m.id
+'''
+GIVEN_SQL = f'''
+    SELECT m.child_id, m.vaccine, MIN({_local_date('m.record_date')})
+    FROM immunization_dirty d
+    JOIN mch_records m ON m.child_id = d.child_id AND m.record_type = 'immunization'
+    WHERE d.child_id > ? AND d.child_id <= ? AND m.vaccine IS NOT NULL AND {_local_date('m.record_date')} IS NOT NULL
+    GROUP BY m.child_id, m.vaccine
+'''
+
+def _frame(db, sql, params, columns):
+    cursor = db.cursor()
+    cursor.row_factory = None
+    return pd.DataFrame(cursor.execute(sql, params).fetchall(), columns=columns, dtype=object)
+
+def _dates(values):
+    return [None if text == 'NaT' else text for text in np.datetime_as_string(values, unit='D')]
+
+def _refresh_range(db, schedule, low, high):
+    children = _frame(db, CHILDREN_SQL, (low, high), ['child_id', 'asha_id', 'patient_id', 'details', 'dob'])
+    # A later birth record corrects an earlier one.
+    children = children.drop_duplicates('child_id', keep='last')
+    # A patient's name comes from their account; a child registered in the field is named on the birth record.
+    names = children['details'].where(children['patient_id'].isna(), None)
+    given_rows = _frame(db, GIVEN_SQL, (low, high), ['child_id', 'vaccine', 'given'])
+
+    dob = children['dob'].to_numpy(dtype='datetime64[D]')
+    given = np.full((len(children), len(schedule)), np.datetime64('NaT', 'D'))
+    rows = pd.Index(children['child_id']).get_indexer(given_rows['child_id'])
+    columns = pd.Index([dose['code'] for dose in schedule]).get_indexer(given_rows['vaccine'])
+    known = (rows >= 0) & (columns >= 0)
+    given[rows[known], columns[known]] = given_rows['given'].to_numpy(dtype='datetime64[D]')[known]
+
+    due, last, pending = compute_due(dob, given, schedule)
+    child, dose = np.nonzero(pending)
+    codes = np.array([d['code'] for d in schedule], dtype=object)
+    db.execute(
+        'DELETE FROM immunization_due WHERE child_id IN '
+        '(SELECT child_id FROM immunization_dirty WHERE child_id > ? AND child_id <= ?)', (low, high)
+    )
+    db.executemany(
+        'INSERT INTO immunization_due (child_id, vaccine, patient_id, child_name, asha_id, birth_date, due_date, last_date) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        zip(children['child_id'].to_numpy()[child].tolist(), codes[dose].tolist(),
+            children['patient_id'].to_numpy()[child].tolist(), names.to_numpy()[child].tolist(),
+            children['asha_id'].to_numpy()[child].tolist(), _dates(dob[child]),
+            _dates(due[child, dose]), _dates(last[child, dose]))
+    )
+
+def refresh_due(db, schedule=SCHEDULE, chunk_children=CHUNK_CHILDREN):
+    """Recompute the due doses of every child marked in immunization_dirty; the caller commits.
+
+    Works through the marked children chunk_children at a time and returns how many there were.
+    """
+    refreshed, low = 0, -2 ** 63
+    while True:
+        high, count = db.execute(
+            'SELECT MAX(child_id), COUNT(*) FROM '
+            '(SELECT child_id FROM immunization_dirty WHERE child_id > ? ORDER BY child_id LIMIT ?)',
+            (low, chunk_children)
+        ).fetchone()
+        if not count:
+            break
+        _refresh_range(db, schedule, low, high)
+        refreshed += count
+        low = high
+    if refreshed:
+        db.execute('DELETE FROM immunization_dirty')
+    return refreshed
+
+def rebuild_due(db, schedule=SCHEDULE):
+    """Recompute every child's due doses, e.g. after the schedule changed; the caller commits."""
+    db.execute('DELETE FROM immunization_due')
+    db.execute(
+        f'''INSERT OR IGNORE INTO immunization_dirty (child_id)
+            SELECT DISTINCT child_id FROM mch_records
+            WHERE record_type IN ({", ".join("?" * len(RECORD_TYPES))}) AND child_id IS NOT NULL''',
+        RECORD_TYPES
+    )
+    return refresh_due(db, schedule)
+
+DUE_SELECT = '''
+    SELECT d.child_id, d.patient_id, COALESCE(u.name, d.child_name) AS child_name, d.birth_date, d.vaccine,
+           d.due_date, d.last_date
+    FROM immunization_due d
+    LEFT JOIN users u ON u.id = d.patient_id
+'''
+OVERDUE_SQL = (f'{DUE_SELECT} WHERE d.asha_id = ? AND d.due_date < ? AND (d.last_date IS NULL OR d.last_date >= ?) '
+               'ORDER BY d.due_date DESC LIMIT ?')
+DUE_SOON_SQL = f'{DUE_SELECT} WHERE d.asha_id = ? AND d.due_date >= ? AND d.due_date < ? ORDER BY d.due_date LIMIT ?'
+
+def _items(rows, today):
+    items = []
+    for row in rows:
+        item = dict(row)
+        item['vaccine_name'] = DOSES[item['vaccine']]['vaccine'] if item['vaccine'] in DOSES else item['vaccine']
+        item['days'] = (date.fromisoformat(item['due_date']) - today).days
+        items.append(item)
+    return items
+
+def due_lists(db, asha_id, today, soon_days=DUE_SOON_DAYS, limit=LIST_LIMIT):
+    """The ASHA's overdue doses and those due in the next `soon_days` days, from immunization_due.
+
+    `today` is a date, normally local_today(). Returns {'overdue': [...],
+    'due_soon': [...]}, each at most `limit` long. Overdue doses come most
+    recently missed first and leave the list once they are past their last
+    date; `days` is the due date relative to `today`.
+    """
+    start, end = today.isoformat(), (today + timedelta(days=soon_days)).isoformat()
+    overdue = db.execute(OVERDUE_SQL, (asha_id, start, start, limit)).fetchall()
+    due_soon = db.execute(DUE_SOON_SQL, (asha_id, start, end, limit)).fetchall()
+    return {'overdue': _items(overdue, today), 'due_soon': _items(due_soon, today)}
+
+if __name__ == '__main__':
+    from database import connect
+    from migrations import migrate
+    from partitions import partition_paths
+
+    parser = argparse.ArgumentParser(description='Recompute every child\'s due immunizations from the schedule.')
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--db', default=os.environ.get('DATABASE', 'swasthsathi.db'), help='the catalog database')
+    args = parser.parse_args()
+    catalog = connect(args.db)
+    migrate(catalog)
+    for path in [args.db, *partition_paths(catalog, args.db)]:
+        conn = catalog if path == args.db else connect(path)
+        if conn is not catalog:
+            migrate(conn)
+        conn.execute('BEGIN IMMEDIATE')
+        count = rebuild_due(conn)
+        conn.commit()
+        print(f"- {path}: rebuilt the due immunizations of {count} children.")
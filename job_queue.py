@@ -0,0 +1,257 @@
+import argparse
+import json
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+import uuid
+
+from database import connect
+
+# --- Background Jobs ---
+# Slow work a request would otherwise wait on (image derivatives, voice note
+# transcoding) is queued in the jobs table and done by `python job_queue.py
+# work`, the worker process in the Procfile.
+#
+# enqueue() only INSERTs and never commits, so a job commits (or rolls back)
+# together with the row it is about. Workers claim up to BATCH_SIZE due jobs
+# at a time in one short write transaction and hold them for LEASE_SECONDS; a
+# job still held after its lease ran out (its worker died) is claimed again.
+# The lease on each job is renewed just before it runs, so slow jobs early in
+# a batch do not let the later ones expire. A job whose lease did expire
+# (another worker may have it now) is skipped, and finish() only touches jobs
+# the worker still holds. Delivery is still at least once, since a job can
+# outlive its own lease or its worker can die, so handlers must be safe to
+# repeat.
+#
+# A job that raises is retried after an exponential, jittered backoff. After
+# max_attempts it is dead-lettered: kept with status 'dead' and its last error
+# until someone runs `python job_queue.py retry-dead`. Finished jobs are deleted.
+
+BATCH_SIZE = 50
+LEASE_SECONDS = 600
+POLL_SECONDS = 1.0
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 10
+BACKOFF_MAX_SECONDS = 3600
+ERROR_CHARS = 2000
+
+# kind -> handler(worker, **payload)
+HANDLERS = {}
+
+# Jobs whose worker died: out of attempts -> dead, otherwise back in the queue.
+RECLAIM_SQL = (
+    "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'queued' END, "
+    "locked_by = NULL, locked_until = NULL, run_at = ?, "
+    "last_error = COALESCE(last_error, 'lease expired') "
+    "WHERE status = 'running' AND locked_until < ?"
+)
+CLAIM_SQL = (
+    "SELECT id, kind, payload, attempts + 1, max_attempts FROM jobs "
+    "WHERE status = 'queued' AND run_at <= ? ORDER BY run_at, id LIMIT ?"
+)
+
+def handler(kind):
+    """Register the decorated function as the handler for jobs of `kind`."""
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+def enqueue(db, kind, payload=None, delay=0, max_attempts=MAX_ATTEMPTS):
+    """Queue a job in the caller's transaction; the caller commits. Returns the job id."""
+    return db.execute(
+        'INSERT INTO jobs (kind, payload, run_at, max_attempts) VALUES (?, ?, ?, ?)',
+        (kind, json.dumps(payload or {}), time.time() + delay, max_attempts)
+    ).lastrowid
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that has failed `attempts` times."""
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+def claim(db, holder, now=None, limit=BATCH_SIZE, lease=LEASE_SECONDS):
+    """Take up to `limit` due jobs for `holder`; returns [(id, kind, payload, attempts, max_attempts)]."""
+    now = time.time() if now is None else now
+    if db.in_transaction:
+        db.commit()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        db.execute(RECLAIM_SQL, (now, now))
+        jobs = [tuple(row) for row in db.execute(CLAIM_SQL, (now, limit))]
+        db.executemany(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_by = ?, locked_until = ? WHERE id = ?",
+            ((holder, now + lease, job[0]) for job in jobs)
+        )
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return jobs
+
+def renew(db, holder, job_id, now=None, lease=LEASE_SECONDS):
+    """Extend `holder`'s lease on a claimed job; False if the job is no longer theirs."""
+    now = time.time() if now is None else now
+    if db.in_transaction:
+        db.commit()
+    renewed = db.execute(
+        "UPDATE jobs SET locked_until = ? WHERE id = ? AND status = 'running' AND locked_by = ?",
+        (now + lease, job_id, holder)
+    ).rowcount == 1
+    db.commit()
+    return renewed
+
+def finish(db, holder, done, failed, now=None):
+    """Record a batch's outcome: delete `done` ids, retry or dead-letter `failed` (id, attempts, max, error).
+
+    Jobs `holder` no longer holds are left to whoever claimed them since.
+    """
+    now = time.time() if now is None else now
+    if db.in_transaction:
+        db.commit()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        db.executemany('DELETE FROM jobs WHERE id = ? AND locked_by = ?', ((job_id, holder) for job_id in done))
+        db.executemany(
+            'UPDATE jobs SET status = ?, run_at = ?, locked_by = NULL, locked_until = NULL, last_error = ? '
+            'WHERE id = ? AND locked_by = ?',
+            (('dead', now, error[-ERROR_CHARS:], job_id, holder) if attempts >= max_attempts
+             else ('queued', now + backoff(attempts), error[-ERROR_CHARS:], job_id, holder)
+             for job_id, attempts, max_attempts, error in failed)
+        )
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+
+def retry_dead(db, kind=None):
+    """Put dead-lettered jobs (of one kind, or all) back in the queue with fresh attempts."""
+    where, params = '', [time.time()]
+    if kind:
+        where, params = 'AND kind = ?', params + [kind]
+    count = db.execute(
+        f"UPDATE jobs SET status = 'queued', attempts = 0, run_at = ? WHERE status = 'dead' {where}", params
+    ).rowcount
+    db.commit()
+    return count
+
+def queue_stats(db):
+    """{(kind, status): (count, oldest run_at)}"""
+    return {(kind, status): (count, oldest) for kind, status, count, oldest in db.execute(
+        'SELECT kind, status, COUNT(*), MIN(run_at) FROM jobs GROUP BY kind, status'
+    )}
+
+class Worker:
+    """Claims and runs jobs on its own connection; run several for concurrency."""
+
+    def __init__(self, path, upload_folder='static/uploads', batch_size=BATCH_SIZE, poll=POLL_SECONDS, log=print):
+        self.path = path
+        self.upload_folder = upload_folder
+        self.batch_size = batch_size
+        self.poll = poll
+        self.log = log
+        self.holder = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.db = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name='job-worker', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self):
+        if self._thread is not None:
+            self._thread.join()
+
+    def run(self):
+        self.db = connect(self.path)
+        try:
+            while not self._stop.is_set():
+                try:
+                    ran = self.step()
+                except Exception as e:  # e.g. the database is locked for longer than busy_timeout
+                    self.log(f"job worker: {e!r}")
+                    ran = 0
+                if ran < self.batch_size:
+                    self._stop.wait(self.poll)
+        finally:
+            self.db.close()
+            self.db = None
+
+    def step(self):
+        """Claim one batch and run it; returns the number of jobs run."""
+        jobs = claim(self.db, self.holder, limit=self.batch_size)
+        done, failed = [], []
+        for job_id, kind, payload, attempts, max_attempts in jobs:
+            if not renew(self.db, self.holder, job_id):
+                self.log(f"job {job_id} ({kind}) skipped: its lease ran out before it started")
+                continue
+            try:
+                fn = HANDLERS.get(kind)
+                if fn is None:
+                    raise LookupError(f'no handler for job kind {kind!r}')
+                fn(self, **json.loads(payload))
+                done.append(job_id)
+            except Exception:
+                error = traceback.format_exc()
+                self.log(f"job {job_id} ({kind}) failed, attempt {attempts} of {max_attempts}: {error.splitlines()[-1]}")
+                # Retrying cannot help a job nobody handles.
+                failed.append((job_id, max_attempts if fn is None else attempts, max_attempts, error))
+            finally:
+                if self.db.in_transaction:
+                    self.db.rollback()  # a handler that failed half way
+        if jobs:
+            finish(self.db, self.holder, done, failed)
+        return len(jobs)
+
+# --- Job Handlers ---
+
+@handler('image_derivatives')
+def build_image_derivatives(worker, name):
+    from media_store import make_derivatives
+    make_derivatives(worker.upload_folder, name)
+
+@handler('voice_note')
+def process_voice_note(worker, table, row_id):
+    from audio_processing import process_row
+    process_row(worker.db, worker.upload_folder, table, row_id, log=worker.log)
+
+if __name__ == '__main__':
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Run background jobs, or inspect the job queue.')
+    parser.add_argument('command', choices=['work', 'stats', 'retry-dead'])
+    parser.add_argument('--db', default=os.environ.get('DATABASE', 'swasthsathi.db'))
+    parser.add_argument('--uploads', default=os.environ.get('UPLOAD_FOLDER', 'static/uploads'))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('JOB_THREADS', '4')))
+    parser.add_argument('--kind', help='retry-dead: only jobs of this kind')
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    migrate(conn)
+    if args.command == 'stats':
+        stats = queue_stats(conn)
+        now = time.time()
+        for (kind, status), (count, oldest) in sorted(stats.items()):
+            print(f"{kind:20} {status:8} {count:8}  oldest due {max(0, now - oldest):.0f}s ago")
+        if not stats:
+            print("The job queue is empty.")
+    elif args.command == 'retry-dead':
+        print(f"Requeued {retry_dead(conn, args.kind)} dead jobs.")
+    else:
+        conn.close()
+        workers = [Worker(args.db, args.uploads).start() for _ in range(max(1, args.threads))]
+        print(f"Running {len(workers)} job worker threads on {args.db}.")
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.stop()
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from werkzeug.utils import secure_filename
+
+from metrics import observe_upload
+
+# --- Upload Storage ---
+# Uploads are streamed to disk in chunks and stored under their SHA-256, in a
+# two-character fan-out directory: "3f/3fa9...c1.png". Saving the same file
+# twice costs one hash pass and no extra disk. Images also get bounded-size
+# derivatives ("3f/3fa9...c1.display.webp", ".thumb.webp"). Saving never
+# builds them: the app's routes queue an 'image_derivatives' job (see
+# needs_derivatives), so the request never waits on Pillow and the work
+# survives a worker restart.
+
+CHUNK_SIZE = 64 * 1024
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp', '.tif', '.tiff'}
+# Longest edge in pixels for each derivative.
+IMAGE_VARIANTS = {'display': 1280, 'thumb': 320}
+
+class UploadTooLarge(Exception):
+    pass
+
+def save_upload(file, upload_folder, max_bytes=MAX_UPLOAD_BYTES):
+    """Store a werkzeug FileStorage by content hash and return its name relative to upload_folder.
+
+    Image derivatives are left to the caller (see needs_derivatives).
+    """
+    ext = os.path.splitext(secure_filename(file.filename or ''))[1].lower()
+    started = time.perf_counter()
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=upload_folder, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    observe_upload(ext, size, time.perf_counter() - started, 'too_large')
+                    raise UploadTooLarge(f'Uploads are limited to {max_bytes // (1024 * 1024)} MB.')
+                digest.update(chunk)
+                out.write(chunk)
+
+        name = _move_into_store(tmp_path, digest.hexdigest(), ext, upload_folder)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    observe_upload(ext, size, time.perf_counter() - started)
+    return name
+
+def needs_derivatives(name):
+    return Image is not None and os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+def store_file(path, ext, upload_folder):
+    """Move an already-written file (e.g. a transcoder's output) into the content-addressed store."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return _move_into_store(path, digest.hexdigest(), ext, upload_folder)
+
+def _move_into_store(tmp_path, content_hash, ext, upload_folder):
+    name = f'{content_hash[:2]}/{content_hash}{ext}'
+    final_path = os.path.join(upload_folder, name)
+    if os.path.exists(final_path):
+        os.unlink(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(tmp_path, final_path)
+    return name
+
+# --- Image Derivatives ---
+try:
+    from PIL import Image, ImageOps, features
+    VARIANT_FORMAT, VARIANT_EXT = ('WEBP', '.webp') if features.check('webp') else ('JPEG', '.jpg')
+except ImportError:
+    Image = None
+    VARIANT_FORMAT, VARIANT_EXT = None, None
+
+def variant_name(name, variant):
+    return f'{os.path.splitext(name)[0]}.{variant}{VARIANT_EXT}'
+
+def is_content_addressed(name):
+    head, _, filename = name.rpartition('/')
+    digest = filename.split('.', 1)[0]
+    return len(digest) == 64 and head == digest[:2]
+
+def original_name_range(name):
+    """(low, high) bounds for names of the upload `name` was derived from.
+
+    For an original upload both bounds are the name itself. For a derivative
+    like "3f/3fa9...c1.thumb.webp", any "3f/3fa9...c1.<ext>" lies in
+    [low, high), which an index on the filename column can range-scan.
+    """
+    for variant in IMAGE_VARIANTS:
+        suffix = f'.{variant}{VARIANT_EXT}'
+        if VARIANT_EXT and name.endswith(suffix):
+            stem = name[:-len(suffix)]
+            return stem + '.', stem + '/'
+    return name, name
+
+def variant_or_original(upload_folder, name, variant):
+    """The derivative if it has been generated yet, otherwise the original upload."""
+    if variant and Image is not None and os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+        candidate = variant_name(name, variant)
+        if os.path.exists(os.path.join(upload_folder, candidate)):
+            return candidate
+    return name
+
+def make_derivatives(upload_folder, name):
+    if Image is None:
+        return
+    pending = [(v, edge) for v, edge in IMAGE_VARIANTS.items()
+               if not os.path.exists(os.path.join(upload_folder, variant_name(name, v)))]
+    if not pending:
+        return
+    source = os.path.join(upload_folder, name)
+    with Image.open(source) as img:
+        img = ImageOps.exif_transpose(img)
+        img = img.convert('RGBA' if VARIANT_FORMAT == 'WEBP' and img.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        for variant, edge in pending:
+            target = os.path.join(upload_folder, variant_name(name, variant))
+            copy = img.copy()
+            copy.thumbnail((edge, edge))
+            tmp_target = f'{target}.{os.getpid()}-{threading.get_ident()}.part'
+            copy.save(tmp_target, VARIANT_FORMAT, quality=80)
+            os.replace(tmp_target, target)
+
+def _make_derivatives_logged(upload_folder, name):
+    try:
+        make_derivatives(upload_folder, name)
+    except Exception as e:
+        # A corrupt or unsupported image keeps being served as the original.
+        print(f"Could not build derivatives for {name}: {e}", file=sys.stderr)
+
+def backfill_derivatives(upload_folder):
+    """Build missing derivatives for every image already in upload_folder (run offline)."""
+    count = 0
+    for root, _dirs, files in os.walk(upload_folder):
+        for filename in files:
+            stem, ext = os.path.splitext(filename)
+            if ext.lower() not in IMAGE_EXTENSIONS or any(stem.endswith(f'.{v}') for v in IMAGE_VARIANTS):
+                continue
+            name = os.path.relpath(os.path.join(root, filename), upload_folder).replace(os.sep, '/')
+            _make_derivatives_logged(upload_folder, name)
+            count += 1
+    return count
+
+if __name__ == '__main__':
+    folder = sys.argv[1] if len(sys.argv) > 1 else 'static/uploads'
+    print(f"Built derivatives for {backfill_derivatives(folder)} images in {folder}.")
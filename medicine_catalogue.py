@@ -0,0 +1,132 @@
+import argparse
+import csv
+import json
+import os
+import re
+
+# --- Medicine Catalogue ---
+# A local table of generic names, brands and strengths, so the medicine search
+# page can answer name lookups from SQLite instead of a remote model. Two FTS5
+# indexes sit over it as external-content tables (they store no copy of the text):
+#   * medicines_fts: word-prefix matches ("para 500" -> Paracetamol 500 mg),
+#   * medicines_trigram: substring matches for the middle of a word ("cillin").
+# The remote model is only asked when neither finds anything.
+
+SEARCH_LIMIT = 20
+BATCH_SIZE = 1000
+BUNDLED_CATALOGUE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'medicines.csv')
+COLUMNS = ('generic_name', 'brand_name', 'strength', 'dosage_form', 'manufacturer')
+# Header spellings accepted from other dumps.
+ALIASES = {
+    'generic': 'generic_name', 'name': 'generic_name', 'salt': 'generic_name', 'composition': 'generic_name',
+    'brand': 'brand_name', 'form': 'dosage_form', 'dosage': 'dosage_form', 'company': 'manufacturer',
+}
+
+_WORD = re.compile(r'[^\W_]+')
+
+def _normalise(record):
+    row = {}
+    for key, value in record.items():
+        key = str(key or '').strip().lower().replace(' ', '_')
+        key = ALIASES.get(key, key)
+        if key in COLUMNS and value not in (None, ''):
+            row[key] = str(value).strip()
+    return row
+
+def _raw_records(path):
+    if path.lower().endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        yield from data.get('medicines', []) if isinstance(data, dict) else data
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            yield from csv.DictReader(f)
+
+def read_records(path):
+    """Yield catalogue rows from a CSV file or a JSON list (optionally under a "medicines" key)."""
+    for record in _raw_records(path):
+        row = _normalise(record)
+        if row.get('generic_name'):
+            yield tuple(row.get(column) for column in COLUMNS)
+
+def rebuild_index(db):
+    db.execute("INSERT INTO medicines_fts (medicines_fts) VALUES ('rebuild')")
+    db.execute("INSERT INTO medicines_trigram (medicines_trigram) VALUES ('rebuild')")
+    db.execute("INSERT INTO medicines_fts (medicines_fts) VALUES ('optimize')")
+
+def load_catalogue(db, path, replace=False):
+    """Bulk-load a dump into the catalogue and rebuild its indexes; returns the number of rows loaded."""
+    if replace:
+        db.execute('DELETE FROM medicines')
+    insert = f'INSERT INTO medicines ({", ".join(COLUMNS)}) VALUES ({", ".join("?" * len(COLUMNS))})'
+    count = 0
+    batch = []
+    for row in read_records(path):
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            db.executemany(insert, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        db.executemany(insert, batch)
+        count += len(batch)
+    rebuild_index(db)
+    db.commit()
+    return count
+
+def load_bundled_catalogue(db):
+    """Load the sample catalogue shipped in data/ if the table is still empty."""
+    if db.execute('SELECT 1 FROM medicines LIMIT 1').fetchone() or not os.path.exists(BUNDLED_CATALOGUE):
+        return 0
+    return load_catalogue(db, BUNDLED_CATALOGUE)
+
+def prefix_expression(query):
+    words = _WORD.findall(query.lower())
+    if not words:
+        return None
+    return ' AND '.join(f'"{word}"*' for word in words)
+
+def search_medicines(db, query, limit=SEARCH_LIMIT):
+    query = ' '.join(str(query or '').split())
+    match = prefix_expression(query)
+    if match is None:
+        return []
+    rows = db.execute(
+        '''
+        SELECT m.id, m.generic_name, m.brand_name, m.strength, m.dosage_form, m.manufacturer
+        FROM medicines_fts f
+        JOIN medicines m ON m.id = f.rowid
+        WHERE medicines_fts MATCH ?
+        ORDER BY f.rank
+        LIMIT ?
+        ''',
+        (match, limit)
+    ).fetchall()
+    # Trigram matching needs at least three characters of a single run of text.
+    if len(rows) < limit and len(query) >= 3:
+        seen = [row['id'] for row in rows]
+        rows += db.execute(
+            f'''
+            SELECT m.id, m.generic_name, m.brand_name, m.strength, m.dosage_form, m.manufacturer
+            FROM medicines_trigram t
+            JOIN medicines m ON m.id = t.rowid
+            WHERE medicines_trigram MATCH ? AND m.id NOT IN ({", ".join("?" * len(seen))})
+            ORDER BY t.rank
+            LIMIT ?
+            ''',
+            ['"' + query.replace('"', '""') + '"', *seen, limit - len(rows)]
+        ).fetchall()
+    return rows
+
+if __name__ == '__main__':
+    from database import connect
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Load a medicine catalogue dump (CSV or JSON).')
+    parser.add_argument('path', nargs='?', default=BUNDLED_CATALOGUE)
+    parser.add_argument('--db', default=os.environ.get('DATABASE', 'swasthsathi.db'))
+    parser.add_argument('--replace', action='store_true', help='drop the current catalogue first')
+    args = parser.parse_args()
+    conn = connect(args.db)
+    migrate(conn)
+    print(f"Loaded {load_catalogue(conn, args.path, replace=args.replace)} medicines from {args.path}.")
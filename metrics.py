@@ -0,0 +1,100 @@
+import logging
+import mimetypes
+import os
+import re
+import time
+from functools import lru_cache
+
+from flask import Response, abort, g, has_request_context, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+import database
+
+# --- Prometheus Metrics ---
+# /metrics exposes, for every Flask endpoint, a latency histogram and a request
+# counter by status; the time of every SQL statement by operation and table;
+# slow statements; and upload bytes and durations.
+#
+# Under gunicorn, gunicorn.conf.py points PROMETHEUS_MULTIPROC_DIR at a fresh
+# directory before the workers start. Each worker then writes its samples to
+# its own files there and /metrics, whichever worker answers it, adds them all
+# up. Without that variable (python app.py) the numbers are per process.
+#
+# A statement slower than SLOW_QUERY_MS is also logged to the "swasthsathi.sql"
+# logger with the endpoint that ran it (never its parameters). Set METRICS_TOKEN
+# to require "Authorization: Bearer <token>" on /metrics.
+
+SLOW_QUERY_MS = 250
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SQL_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5)
+
+REQUEST_SECONDS = Histogram('swasthsathi_request_duration_seconds', 'Time to produce a response, by endpoint.',
+                            ['endpoint', 'method'], buckets=LATENCY_BUCKETS)
+REQUESTS = Counter('swasthsathi_requests', 'Responses by endpoint and status.', ['endpoint', 'method', 'status'])
+SQL_SECONDS = Histogram('swasthsathi_sql_duration_seconds', 'SQL statement time, by operation and table.',
+                        ['operation', 'table'], buckets=SQL_BUCKETS)
+SLOW_QUERIES = Counter('swasthsathi_slow_queries', 'Statements slower than SLOW_QUERY_MS, by endpoint.', ['endpoint'])
+UPLOAD_BYTES = Counter('swasthsathi_upload_bytes', 'Bytes received in file uploads.', ['kind'])
+UPLOAD_SECONDS = Histogram('swasthsathi_upload_duration_seconds', 'Time to receive and store an upload.',
+                           ['kind', 'outcome'], buckets=LATENCY_BUCKETS)
+
+slow_log = logging.getLogger('swasthsathi.sql')
+
+_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE)\s+(?:\w+\.)?([A-Za-z_]\w*)', re.IGNORECASE)
+
+@lru_cache(maxsize=2048)
+def statement_labels(sql):
+    """(operation, table) for a statement, e.g. ('SELECT', 'consultations')."""
+    words = sql.split(None, 1)
+    table = _TABLE.search(sql)
+    return (words[0].upper() if words else ''), (table.group(1).lower() if table else '')
+
+def upload_kind(ext):
+    return ((mimetypes.guess_type('upload' + ext)[0] or 'other').split('/')[0])
+
+def observe_upload(ext, size, seconds, outcome='stored'):
+    kind = upload_kind(ext)
+    UPLOAD_BYTES.labels(kind).inc(size)
+    UPLOAD_SECONDS.labels(kind, outcome).observe(seconds)
+
+def _endpoint():
+    return (request.endpoint or 'unmatched') if has_request_context() else 'background'
+
+def init_app(app):
+    """Instrument every view and SQL statement. Call before registering other request hooks."""
+    threshold = float(os.environ.get('SLOW_QUERY_MS', app.config.get('SLOW_QUERY_MS', SLOW_QUERY_MS))) / 1000
+
+    def time_statement(sql, seconds):
+        SQL_SECONDS.labels(*statement_labels(sql)).observe(seconds)
+        if seconds >= threshold:
+            endpoint = _endpoint()
+            SLOW_QUERIES.labels(endpoint).inc()
+            slow_log.warning('%.0f ms in %s: %s', seconds * 1000, endpoint, ' '.join(sql.split())[:500])
+
+    database.set_statement_timer(time_statement)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        # A streamed response is timed up to its first byte.
+        started = g.pop('request_started', None)
+        if started is not None and request.endpoint != 'metrics':
+            endpoint = request.endpoint or 'unmatched'
+            REQUEST_SECONDS.labels(endpoint, request.method).observe(time.perf_counter() - started)
+            REQUESTS.labels(endpoint, request.method, str(response.status_code)).inc()
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        token = os.environ.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            abort(403)
+        registry = REGISTRY
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
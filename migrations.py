@@ -0,0 +1,663 @@
+import re
+import sqlite3
+
+from asha_summary import rebuild_summaries
+from chat_inbox import rebuild_thread_summaries
+from household_search import rebuild_index as rebuild_household_index
+from immunization import RECORD_TYPES as IMMUNIZATION_RECORD_TYPES, rebuild_due as rebuild_immunization_due
+from patient_timeline import (
+    SOURCES as TIMELINE_SOURCES, COLUMNS as TIMELINE_COLUMNS, MESSAGE_PREVIEW, rebuild_timeline,
+    TIMELINE_SQL, TIMELINE_BEFORE_CURSOR,
+)
+from asha_summary import SUMMARY_SQL as ASHA_SUMMARY_SQL
+from chat_inbox import INBOX_SQL, INBOX_BEFORE_CURSOR, UNREAD_SQL
+from case_scheduler import RELEASE_STALE_SQL, DOCTOR_LOAD_SQL
+from job_queue import CLAIM_SQL as JOBS_CLAIM_SQL, RECLAIM_SQL as JOBS_RECLAIM_SQL
+from immunization import DUE_SOON_SQL, OVERDUE_SQL
+from field_sync import DELTA_SQL as SYNC_DELTA_SQL, RECEIPT_SQL as SYNC_RECEIPT_SQL, OWN_CHILD_SQL
+from queries import (
+    PENDING_CASES_SQL, PENDING_AFTER_CURSOR, ACCEPT_CASE_SQL, DOCTOR_CASES_SQL, REVIEWED_CASES_SQL,
+    PATIENT_CONSULTATIONS_SQL, DOCTORS_SQL, CHAT_THREAD_SQL, LATEST_MESSAGE_SQL, MESSAGES_AFTER_SQL,
+    LATEST_MESSAGES_SQL, ASHA_HOUSEHOLDS_SQL, PARTITION_PATH_SQL, MEDIA_CONSULTATION_SQL,
+    MEDIA_CONSULTATION_DERIVATIVE_SQL, MEDIA_CHAT_SQL, MEDIA_CHAT_NAME, MEDIA_CHAT_RANGE,
+)
+
+# --- Schema Migrations ---
+# Each migration is (version, description, steps). A step is either a SQL string
+# or a callable taking the connection. Migrations run in order inside one
+# transaction each, and the applied version is recorded in `schema_version`.
+
+def _add_missing_columns(table, columns):
+    def step(conn):
+        existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        for name, decl in columns:
+            if name not in existing:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {decl}')
+    return step
+
+def _dedupe_chat_threads(conn):
+    # Older databases may hold several threads for the same patient/doctor pair.
+    # Keep the oldest one and move the messages of the others onto it.
+    dupes = conn.execute('''
+        SELECT patient_id, doctor_id, MIN(id) AS keep_id
+        FROM chat_threads
+        GROUP BY patient_id, doctor_id
+        HAVING COUNT(*) > 1
+    ''').fetchall()
+    for patient_id, doctor_id, keep_id in dupes:
+        conn.execute(
+            'UPDATE chat_messages SET thread_id = ? WHERE thread_id IN (SELECT id FROM chat_threads WHERE patient_id IS ? AND doctor_id IS ? AND id != ?)',
+            (keep_id, patient_id, doctor_id, keep_id)
+        )
+        conn.execute('DELETE FROM chat_threads WHERE patient_id IS ? AND doctor_id IS ? AND id != ?', (patient_id, doctor_id, keep_id))
+
+def _change_log_triggers(table, entity):
+    """Triggers recording every insert, update and delete on `table` in change_log."""
+    def log(row, op, condition=''):
+        return (f"INSERT INTO change_log (asha_id, entity, entity_id, op) "
+                f"SELECT {row}.asha_id, '{entity}', {row}.id, '{op}' WHERE {row}.asha_id IS NOT NULL{condition};\n")
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS trg_{table}_changelog_insert AFTER INSERT ON {table} BEGIN\n{log("NEW", "upsert")}END',
+        f'CREATE TRIGGER IF NOT EXISTS trg_{table}_changelog_update AFTER UPDATE ON {table} BEGIN\n'
+        # A row moved to another ASHA disappears from the old ASHA's devices.
+        f'{log("OLD", "delete", " AND OLD.asha_id IS NOT NEW.asha_id")}{log("NEW", "upsert")}END',
+        f'CREATE TRIGGER IF NOT EXISTS trg_{table}_changelog_delete AFTER DELETE ON {table} BEGIN\n{log("OLD", "delete")}END',
+        # Existing rows start out in the log so a device's first sync gets everything.
+        f"INSERT INTO change_log (asha_id, entity, entity_id, op) SELECT asha_id, '{entity}', id, 'upsert' FROM {table} WHERE asha_id IS NOT NULL ORDER BY id",
+    ]
+
+def _columns_in(expressions):
+    return {name for expr in expressions for name in re.findall(r'\{row\}\.(\w+)', expr)}
+
+def _summary_triggers(table, deltas):
+    """Triggers keeping asha_summary in step with `table`.
+
+    `deltas` maps a summary column to the amount one row adds to it, written
+    against a `{row}` placeholder that becomes NEW or OLD.
+    """
+    def apply(row, sign):
+        sets = ', '.join(f'{column} = {column} {sign} ({delta.format(row=row)})' for column, delta in deltas.items())
+        return (
+            f'INSERT OR IGNORE INTO asha_summary (asha_id) SELECT {row}.asha_id WHERE {row}.asha_id IS NOT NULL;\n'
+            f'UPDATE asha_summary SET {sets} WHERE asha_id = {row}.asha_id;\n'
+        )
+    watched = ', '.join(sorted({'asha_id'} | _columns_in(deltas.values())))
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS trg_{table}_summary_insert AFTER INSERT ON {table} BEGIN\n{apply("NEW", "+")}END',
+        f'CREATE TRIGGER IF NOT EXISTS trg_{table}_summary_delete AFTER DELETE ON {table} BEGIN\n{apply("OLD", "-")}END',
+        f'CREATE TRIGGER IF NOT EXISTS trg_{table}_summary_update AFTER UPDATE OF {watched} ON {table} BEGIN\n'
+        f'{apply("OLD", "-")}{apply("NEW", "+")}END',
+    ]
+
+def _backfill_thread_summaries(conn):
+    # Existing conversations start out read rather than flooding every inbox with old messages.
+    rebuild_thread_summaries(conn, mark_all_read=True)
+
+def _timeline_triggers(kind):
+    """Triggers keeping patient_timeline in step with the source table of `kind`."""
+    table, columns = TIMELINE_SOURCES[kind]
+    def upsert(row):
+        return (
+            f"INSERT INTO patient_timeline (kind, source_id, {', '.join(TIMELINE_COLUMNS)})\n"
+            f"SELECT '{kind}', {row}.id, {', '.join(columns[c].format(row=row) for c in TIMELINE_COLUMNS)}\n"
+            f"WHERE {row}.patient_id IS NOT NULL\n"
+            f"ON CONFLICT (kind, source_id) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in TIMELINE_COLUMNS)};\n"
+        )
+    def remove(row, condition=''):
+        return f"DELETE FROM patient_timeline WHERE kind = '{kind}' AND source_id = {row}.id{condition};\n"
+    watched = ', '.join(sorted(_columns_in(columns.values())))
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS trg_{table}_timeline_insert AFTER INSERT ON {table} BEGIN\n{upsert("NEW")}END',
+        f'CREATE TRIGGER IF NOT EXISTS trg_{table}_timeline_update AFTER UPDATE OF {watched} ON {table} BEGIN\n'
+        f'{remove("OLD", " AND NEW.patient_id IS NULL")}{upsert("NEW")}END',
+        f'CREATE TRIGGER IF NOT EXISTS trg_{table}_timeline_delete AFTER DELETE ON {table} BEGIN\n{remove("OLD")}END',
+    ]
+
+_IMMUNIZATION_TYPES = ', '.join(f"'{record_type}'" for record_type in IMMUNIZATION_RECORD_TYPES)
+
+def _immunization_triggers():
+    """Triggers marking a child in immunization_dirty whenever one of their birth or dose records changes."""
+    def mark(row):
+        return (f'INSERT OR IGNORE INTO immunization_dirty (child_id) SELECT {row}.child_id '
+                f'WHERE {row}.child_id IS NOT NULL AND {row}.record_type IN ({_IMMUNIZATION_TYPES});\n')
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS trg_mch_records_immunization_insert AFTER INSERT ON mch_records BEGIN\n{mark("NEW")}END',
+        'CREATE TRIGGER IF NOT EXISTS trg_mch_records_immunization_update '
+        'AFTER UPDATE OF asha_id, patient_id, child_id, record_type, record_date, record_details, vaccine ON mch_records '
+        f'BEGIN\n{mark("OLD")}{mark("NEW")}END',
+        f'CREATE TRIGGER IF NOT EXISTS trg_mch_records_immunization_delete AFTER DELETE ON mch_records BEGIN\n{mark("OLD")}END',
+    ]
+
+# A patient's first birth record with an ASHA identifies them as that ASHA's
+# child; every birth or dose record of theirs the ASHA keeps gets its id.
+# Another ASHA's records of the same patient never attach to it.
+_FIRST_BIRTH = ("SELECT MIN(b.id) FROM mch_records b "
+                "WHERE b.patient_id = {row}.patient_id AND b.asha_id IS {row}.asha_id AND b.record_type = 'birth'")
+
+def _child_link_triggers():
+    """Triggers filling in mch_records.child_id for birth and dose records that do not name their child."""
+    return [
+        f'''CREATE TRIGGER IF NOT EXISTS trg_mch_records_child_link AFTER INSERT ON mch_records
+        WHEN NEW.child_id IS NULL AND NEW.record_type IN ({_IMMUNIZATION_TYPES})
+        BEGIN
+            UPDATE mch_records SET child_id = COALESCE(({_FIRST_BIRTH.format(row='NEW')}),
+                                                       CASE WHEN NEW.record_type = 'birth' THEN NEW.id END)
+            WHERE id = NEW.id;
+            -- Doses recorded before the patient's birth record was.
+            UPDATE mch_records SET child_id = ({_FIRST_BIRTH.format(row='NEW')})
+            WHERE NEW.record_type = 'birth' AND patient_id = NEW.patient_id AND asha_id IS NEW.asha_id
+              AND record_type = 'immunization' AND child_id IS NULL;
+        END''',
+    ]
+
+def _backfill_child_ids(conn):
+    conn.execute(
+        f'''UPDATE mch_records SET child_id = ({_FIRST_BIRTH.format(row='mch_records')})
+            WHERE record_type IN ({_IMMUNIZATION_TYPES}) AND patient_id IS NOT NULL'''
+    )
+    conn.execute("UPDATE mch_records SET child_id = id WHERE record_type = 'birth' AND child_id IS NULL")
+
+MIGRATIONS = [
+    (1, 'base schema', [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            username TEXT UNIQUE,
+            password_hash TEXT NOT NULL,
+            role_id INTEGER NOT NULL,
+            specialty TEXT,
+            hospital TEXT,
+            age INTEGER,
+            gender TEXT,
+            phone_number TEXT,
+            abha_id TEXT,
+            profile_photo_filename TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS consultations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id INTEGER,
+            doctor_id INTEGER,
+            patient_name TEXT,
+            patient_age INTEGER,
+            patient_gender TEXT,
+            symptoms TEXT,
+            photo_filename TEXT,
+            doctor_response TEXT,
+            audio_note_filename TEXT,
+            status TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (patient_id) REFERENCES users(id),
+            FOREIGN KEY (doctor_id) REFERENCES users(id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS chat_threads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id INTEGER,
+            doctor_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (patient_id) REFERENCES users(id),
+            FOREIGN KEY (doctor_id) REFERENCES users(id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            thread_id INTEGER,
+            sender_id INTEGER,
+            message_text TEXT,
+            file_path TEXT,
+            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (thread_id) REFERENCES chat_threads(id),
+            FOREIGN KEY (sender_id) REFERENCES users(id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS households (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            asha_id INTEGER,
+            household_name TEXT NOT NULL,
+            address TEXT,
+            members_count INTEGER,
+            is_verified BOOLEAN DEFAULT 0,
+            FOREIGN KEY (asha_id) REFERENCES users(id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS mch_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            asha_id INTEGER,
+            patient_id INTEGER,
+            record_type TEXT, -- e.g., 'pregnancy', 'immunization', 'growth'
+            record_details TEXT,
+            record_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (asha_id) REFERENCES users(id),
+            FOREIGN KEY (patient_id) REFERENCES users(id)
+        )
+        ''',
+    ]),
+    # Databases created by the old standalone init_db.py lack some of the app's
+    # columns, and the app never had init_db.py's consultations.category.
+    (2, 'reconcile columns from the old init_db.py schema', [
+        _add_missing_columns('users', [('username', 'TEXT'), ('age', 'INTEGER'), ('gender', 'TEXT')]),
+        _add_missing_columns('consultations', [('category', 'TEXT')]),
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users(username)',
+    ]),
+    (3, 'indexes for hot queries', [
+        _dedupe_chat_threads,
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_chat_threads_patient_doctor ON chat_threads(patient_id, doctor_id)',
+        'CREATE INDEX IF NOT EXISTS idx_chat_threads_doctor ON chat_threads(doctor_id)',
+        'CREATE INDEX IF NOT EXISTS idx_chat_messages_thread_sent ON chat_messages(thread_id, sent_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_consultations_status_created ON consultations(status, created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_consultations_doctor_status_created ON consultations(doctor_id, status, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_consultations_patient_created ON consultations(patient_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_households_asha ON households(asha_id)',
+        'CREATE INDEX IF NOT EXISTS idx_mch_records_asha_type ON mch_records(asha_id, record_type)',
+        'CREATE INDEX IF NOT EXISTS idx_users_role ON users(role_id)',
+    ]),
+    # Messages are now paged by id. An index on thread_id alone already ends in the
+    # rowid, so it serves both `id > ? ORDER BY id` and the newest-message lookup.
+    (4, 'index chat messages by (thread_id, id)', [
+        'DROP INDEX IF EXISTS idx_chat_messages_thread_sent',
+        'CREATE INDEX IF NOT EXISTS idx_chat_messages_thread ON chat_messages(thread_id)',
+    ]),
+    # See household_search.py for how rows are scoped per ASHA inside the index.
+    (5, 'full-text household search', [
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS households_fts USING fts5(
+            household_name, address, household_id,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+        ''',
+        # Name hits outrank id hits, which outrank address hits.
+        "INSERT INTO households_fts (households_fts, rank) VALUES ('rank', 'bm25(10.0, 2.0, 5.0)')",
+        rebuild_household_index,
+    ]),
+    # Filled in by the offline pass in audio_processing.py.
+    (6, 'voice note metadata', [
+        _add_missing_columns('consultations', [
+            ('audio_duration_ms', 'INTEGER'), ('audio_peaks', 'TEXT'), ('audio_processed_at', 'TIMESTAMP'),
+        ]),
+        _add_missing_columns('chat_messages', [
+            ('audio_duration_ms', 'INTEGER'), ('audio_peaks', 'TEXT'), ('audio_processed_at', 'TIMESTAMP'),
+        ]),
+        # Partial indexes keep "what still needs processing" cheap once most rows are done.
+        'CREATE INDEX IF NOT EXISTS idx_consultations_audio_pending ON consultations(id) WHERE audio_note_filename IS NOT NULL AND audio_processed_at IS NULL',
+        'CREATE INDEX IF NOT EXISTS idx_chat_messages_audio_pending ON chat_messages(id) WHERE file_path IS NOT NULL AND audio_processed_at IS NULL',
+    ]),
+    (7, 'indexes for upload ownership checks', [
+        'CREATE INDEX IF NOT EXISTS idx_consultations_photo ON consultations(photo_filename)',
+        'CREATE INDEX IF NOT EXISTS idx_consultations_audio ON consultations(audio_note_filename)',
+        'CREATE INDEX IF NOT EXISTS idx_chat_messages_file ON chat_messages(file_path)',
+    ]),
+    # See medicine_catalogue.py; the catalogue itself is loaded separately.
+    (8, 'medicine catalogue', [
+        '''
+        CREATE TABLE IF NOT EXISTS medicines (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            generic_name TEXT NOT NULL,
+            brand_name TEXT,
+            strength TEXT,
+            dosage_form TEXT,
+            manufacturer TEXT
+        )
+        ''',
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS medicines_fts USING fts5(
+            generic_name, brand_name, strength,
+            content = 'medicines', content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+        ''',
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS medicines_trigram USING fts5(
+            generic_name, brand_name,
+            content = 'medicines', content_rowid = 'id',
+            tokenize = 'trigram'
+        )
+        ''',
+        # A brand hit is usually what the user typed; strength only narrows.
+        "INSERT INTO medicines_fts (medicines_fts, rank) VALUES ('rank', 'bm25(5.0, 10.0, 1.0)')",
+    ]),
+    # See asha_summary.py. Must match LIVE_SUMMARY_SQL there.
+    (9, 'per-ASHA dashboard summaries', [
+        '''
+        CREATE TABLE IF NOT EXISTS asha_summary (
+            asha_id INTEGER PRIMARY KEY,
+            households INTEGER NOT NULL DEFAULT 0,
+            verified_households INTEGER NOT NULL DEFAULT 0,
+            household_members INTEGER NOT NULL DEFAULT 0,
+            mch_records INTEGER NOT NULL DEFAULT 0,
+            pregnancies INTEGER NOT NULL DEFAULT 0,
+            immunizations INTEGER NOT NULL DEFAULT 0,
+            growth_records INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        *_summary_triggers('households', {
+            'households': '1',
+            'verified_households': 'COALESCE({row}.is_verified, 0) <> 0',
+            'household_members': 'COALESCE(CAST({row}.members_count AS INTEGER), 0)',
+        }),
+        *_summary_triggers('mch_records', {
+            'mch_records': '1',
+            'pregnancies': "{row}.record_type = 'pregnancy'",
+            'immunizations': "{row}.record_type = 'immunization'",
+            'growth_records': "{row}.record_type = 'growth'",
+        }),
+        rebuild_summaries,
+    ]),
+    # Set by accept_case and submit_response; the admin analytics measure time to review from them.
+    (10, 'consultation review timestamps', [
+        _add_missing_columns('consultations', [('accepted_at', 'TIMESTAMP'), ('reviewed_at', 'TIMESTAMP')]),
+    ]),
+    # One row per Parquet export; incremental exports resume after the highest
+    # last_id of a finished incremental run. See data_export.py.
+    (11, 'export runs', [
+        '''
+        CREATE TABLE IF NOT EXISTS export_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            mode TEXT NOT NULL,
+            since TEXT,
+            until TEXT,
+            rows INTEGER,
+            last_id INTEGER,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_export_runs_table ON export_runs(table_name, mode, last_id)',
+    ]),
+    # Birth, death and disease forms, and the bookkeeping for offline sync. See field_sync.py.
+    (12, 'field reports and offline sync', [
+        '''
+        CREATE TABLE IF NOT EXISTS field_reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            asha_id INTEGER NOT NULL,
+            report_type TEXT NOT NULL, -- 'birth', 'death' or 'disease'
+            household_id INTEGER,
+            event_date TEXT,
+            details TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (asha_id) REFERENCES users(id),
+            FOREIGN KEY (household_id) REFERENCES households(id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_field_reports_asha_type ON field_reports(asha_id, report_type, event_date)',
+        '''
+        CREATE TABLE IF NOT EXISTS sync_receipts (
+            asha_id INTEGER NOT NULL,
+            client_id TEXT NOT NULL,
+            entity TEXT NOT NULL,
+            server_id INTEGER,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (asha_id, client_id)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS change_log (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            asha_id INTEGER NOT NULL,
+            entity TEXT NOT NULL,
+            entity_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_change_log_asha_version ON change_log(asha_id, version)',
+        *_change_log_triggers('households', 'household'),
+        *_change_log_triggers('mch_records', 'mch_record'),
+        *_change_log_triggers('field_reports', 'field_report'),
+    ]),
+    # Consultations, chats and MCH records as one stream per patient. See patient_timeline.py.
+    (13, 'patient timeline projection', [
+        '''
+        CREATE TABLE IF NOT EXISTS patient_timeline (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL, -- 'consultation', 'mch_record' or 'chat'
+            source_id INTEGER NOT NULL,
+            patient_id INTEGER NOT NULL,
+            occurred_at TIMESTAMP NOT NULL,
+            status TEXT,
+            title TEXT,
+            summary TEXT,
+            actor_id INTEGER, -- doctor or ASHA
+            item_count INTEGER NOT NULL DEFAULT 0, -- messages, for chats
+            UNIQUE (kind, source_id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_patient_timeline_patient_time ON patient_timeline(patient_id, occurred_at, id)',
+        *_timeline_triggers('consultation'),
+        *_timeline_triggers('mch_record'),
+        *_timeline_triggers('chat'),
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_chat_messages_timeline_insert AFTER INSERT ON chat_messages BEGIN
+        UPDATE patient_timeline
+        SET occurred_at = MAX(occurred_at, COALESCE(NEW.sent_at, CURRENT_TIMESTAMP)),
+            item_count = item_count + 1,
+            summary = {MESSAGE_PREVIEW.format(row='NEW')}
+        WHERE kind = 'chat' AND source_id = NEW.thread_id;
+        END
+        ''',
+        rebuild_timeline,
+    ]),
+    # Auto-assignment of pending cases; see case_scheduler.py.
+    (14, 'case auto-assignment', [
+        _add_missing_columns('consultations', [
+            ('urgency', 'INTEGER NOT NULL DEFAULT 0'),
+            ('auto_assigned', 'INTEGER NOT NULL DEFAULT 0'),
+            ('released_doctor_id', 'INTEGER'),
+        ]),
+        _add_missing_columns('users', [
+            ('accepting_cases', 'INTEGER NOT NULL DEFAULT 1'),
+            ('max_active_cases', 'INTEGER'),
+        ]),
+        '''
+        CREATE TABLE IF NOT EXISTS scheduler_leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_consultations_status_doctor ON consultations(status, doctor_id, accepted_at)',
+    ]),
+    # Durable background job queue; see job_queue.py.
+    (15, 'background job queue', [
+        '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL DEFAULT '{}',
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 5,
+            run_at REAL NOT NULL,
+            locked_by TEXT,
+            locked_until REAL,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_jobs_status_run_at ON jobs(status, run_at)',
+    ]),
+    # Last message and unread counts on each chat thread; see chat_inbox.py.
+    (16, 'chat thread summaries', [
+        _add_missing_columns('chat_threads', [
+            ('last_message_id', 'INTEGER'),
+            ('last_message_at', 'TIMESTAMP'),
+            ('last_message_preview', 'TEXT'),
+            ('last_sender_id', 'INTEGER'),
+            ('message_count', 'INTEGER NOT NULL DEFAULT 0'),
+            ('last_activity_at', 'TIMESTAMP'),
+            ('patient_last_read_id', 'INTEGER NOT NULL DEFAULT 0'),
+            ('patient_unread', 'INTEGER NOT NULL DEFAULT 0'),
+            ('doctor_last_read_id', 'INTEGER NOT NULL DEFAULT 0'),
+            ('doctor_unread', 'INTEGER NOT NULL DEFAULT 0'),
+        ]),
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_chat_threads_activity AFTER INSERT ON chat_threads
+        WHEN NEW.last_activity_at IS NULL BEGIN
+        UPDATE chat_threads SET last_activity_at = COALESCE(NEW.created_at, CURRENT_TIMESTAMP) WHERE id = NEW.id;
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_chat_messages_summary_insert AFTER INSERT ON chat_messages BEGIN
+        UPDATE chat_threads
+        SET last_message_id = NEW.id,
+            last_message_at = COALESCE(NEW.sent_at, CURRENT_TIMESTAMP),
+            last_message_preview = {MESSAGE_PREVIEW.format(row='NEW')},
+            last_sender_id = NEW.sender_id,
+            message_count = message_count + 1,
+            last_activity_at = MAX(COALESCE(last_activity_at, ''), COALESCE(NEW.sent_at, CURRENT_TIMESTAMP)),
+            patient_last_read_id = CASE WHEN NEW.sender_id = patient_id THEN NEW.id ELSE patient_last_read_id END,
+            patient_unread = CASE WHEN NEW.sender_id = patient_id THEN 0 ELSE patient_unread + 1 END,
+            doctor_last_read_id = CASE WHEN NEW.sender_id = doctor_id THEN NEW.id ELSE doctor_last_read_id END,
+            doctor_unread = CASE WHEN NEW.sender_id = doctor_id THEN 0 ELSE doctor_unread + 1 END
+        WHERE id = NEW.thread_id;
+        END
+        ''',
+        _backfill_thread_summaries,
+        'DROP INDEX IF EXISTS idx_chat_threads_doctor',
+        'CREATE INDEX IF NOT EXISTS idx_chat_threads_doctor_activity ON chat_threads(doctor_id, last_activity_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_chat_threads_patient_activity ON chat_threads(patient_id, last_activity_at, id)',
+    ]),
+    # Users' districts, and which partition file holds each district's ASHA data; see partitions.py.
+    (17, 'district partitions', [
+        _add_missing_columns('users', [('district', 'TEXT')]),
+        'CREATE INDEX IF NOT EXISTS idx_users_district ON users(district)',
+        '''
+        CREATE TABLE IF NOT EXISTS district_partitions (
+            district TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    # Children's outstanding vaccine doses, kept up to date as doses are recorded; see immunization.py.
+    # Children registered through a field birth report have no patient account,
+    # so children are keyed by their birth record (mch_records.child_id).
+    (18, 'immunization due dates', [
+        _add_missing_columns('mch_records', [('vaccine', 'TEXT'), ('child_id', 'INTEGER')]),
+        'CREATE INDEX IF NOT EXISTS idx_mch_records_patient_type ON mch_records(patient_id, record_type)',
+        'CREATE INDEX IF NOT EXISTS idx_mch_records_child_type ON mch_records(child_id, record_type)',
+        _backfill_child_ids,
+        '''
+        CREATE TABLE IF NOT EXISTS immunization_due (
+            child_id INTEGER NOT NULL,
+            vaccine TEXT NOT NULL,
+            patient_id INTEGER,
+            child_name TEXT,
+            asha_id INTEGER,
+            birth_date TEXT NOT NULL,
+            due_date TEXT NOT NULL,
+            last_date TEXT,
+            PRIMARY KEY (child_id, vaccine)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_immunization_due_asha_due ON immunization_due(asha_id, due_date)',
+        'CREATE TABLE IF NOT EXISTS immunization_dirty (child_id INTEGER PRIMARY KEY)',
+        *_child_link_triggers(),
+        *_immunization_triggers(),
+        rebuild_immunization_due,
+    ]),
+]
+
+def current_version(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+def migrate(conn, target=None):
+    """Apply every pending migration up to `target`; returns the versions applied."""
+    if conn.in_transaction:
+        conn.commit()
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        # BEGIN IMMEDIATE takes the write lock up front so two workers booting at
+        # once serialize here instead of both applying the same migration.
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if version <= current_version(conn):
+                conn.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)', (version, description))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+        print(f"- Applied migration {version}: {description}")
+    return applied
+
+# --- Query Plan Checks ---
+# The queries the busiest routes run, with representative parameters. If any of
+# them stops using an index, check_query_plans() reports it. The SQL is the
+# code's own: route queries come from queries.py, the rest from the module
+# that runs them. The immunization refresh is left out: it sorts each chunk of
+# children it reads, which is bounded by CHUNK_CHILDREN.
+HOT_QUERIES = {
+    'available_patients': (PENDING_CASES_SQL.format(where=''), (51,)),
+    'available_patients_next': (PENDING_CASES_SQL.format(where=PENDING_AFTER_CURSOR), ('2025-01-01 00:00:00', 1, 51)),
+    'accept_case': (ACCEPT_CASE_SQL, (1, 1)),
+    'doctor_dashboard': (DOCTOR_CASES_SQL, (1,)),
+    'view_patient_history': (REVIEWED_CASES_SQL, (1,)),
+    'patient_history': (PATIENT_CONSULTATIONS_SQL, (1, 51)),
+    'get_messages': (MESSAGES_AFTER_SQL, (1, 0, 100)),
+    'get_messages_page': (LATEST_MESSAGES_SQL, (1, 100)),
+    'get_messages_latest': (LATEST_MESSAGE_SQL, (1,)),
+    'start_chat': (CHAT_THREAD_SQL, (1, 2)),
+    'chat_inbox': (INBOX_SQL.format(side='doctor', other='patient', where=''), (1, 31)),
+    'chat_inbox_next': (INBOX_SQL.format(side='patient', other='doctor', where=INBOX_BEFORE_CURSOR),
+                        (1, '2025-01-01 00:00:00', 1, 31)),
+    'chat_unread_total': (UNREAD_SQL.format(side='doctor'), (1,)),
+    'asha_households': (ASHA_HOUSEHOLDS_SQL, (1,)),
+    'media_consultation': (MEDIA_CONSULTATION_SQL, ('a', 'a', 1, 1)),
+    'media_derivative': (MEDIA_CONSULTATION_DERIVATIVE_SQL, ('a.', 'a/', 1, 1)),
+    'media_chat': (MEDIA_CHAT_SQL.format(match=MEDIA_CHAT_NAME), ('uploads/a', 1, 1)),
+    'media_chat_derivative': (MEDIA_CHAT_SQL.format(match=MEDIA_CHAT_RANGE), ('uploads/a.', 'uploads/a/', 1, 1)),
+    'asha_dashboard': (ASHA_SUMMARY_SQL, (1,)),
+    'sync_delta': (SYNC_DELTA_SQL, (1, 0, 501)),
+    'sync_receipt': (SYNC_RECEIPT_SQL, (1, 'x')),
+    'patient_timeline': (TIMELINE_SQL.format(where=''), (0, 1, 21)),
+    'patient_timeline_next': (TIMELINE_SQL.format(where=TIMELINE_BEFORE_CURSOR), (0, 1, '2025-01-01 00:00:00', 1, 21)),
+    'release_stale_claims': (RELEASE_STALE_SQL, ('2025-01-01 00:00:00',)),
+    'scheduler_doctor_load': (DOCTOR_LOAD_SQL, ()),
+    'jobs_claim': (JOBS_CLAIM_SQL, (0.0, 50)),
+    'jobs_reclaim': (JOBS_RECLAIM_SQL, (0.0, 0.0)),
+    'find_doctor': (DOCTORS_SQL, (2,)),
+    'asha_partition': (PARTITION_PATH_SQL, (1,)),
+    'immunization_due_soon': (DUE_SOON_SQL, (1, '2025-01-01', '2025-01-08', 200)),
+    'immunization_overdue': (OVERDUE_SQL, (1, '2025-01-01', '2025-01-01', 200)),
+    # The child-link triggers' subquery, run for one inserted row.
+    'immunization_child_link': (f"SELECT ({_FIRST_BIRTH.format(row='n')}) FROM mch_records n WHERE n.id = ?", (1,)),
+    'immunization_child_check': (OWN_CHILD_SQL, (1, 1)),
+}
+
+def explain(conn, sql, params=()):
+    return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+def check_query_plans(conn, queries=None):
+    """Return {name: plan} for every hot query that scans a table or sorts in a temp b-tree."""
+    problems = {}
+    for name, (sql, params) in (queries or HOT_QUERIES).items():
+        plan = explain(conn, sql, params)
+        if any(step.startswith('SCAN') or 'TEMP B-TREE' in step for step in plan):
+            problems[name] = plan
+    return problems
@@ -0,0 +1,77 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+from flask import render_template, request, session
+from jinja2 import FileSystemBytecodeCache
+
+# --- Rendered Page Cache ---
+# Informational pages (home, about, health awareness, schemes, ...) only differ
+# by the navbar, which depends on the visitor's role. PageCache keeps each
+# rendered page per (template, role, locale) and answers repeat requests from
+# memory, with an ETag so a browser revalidating gets a bodiless 304.
+#
+# Only pages whose template reads nothing from the session but the role may go
+# through it; a page greeting the user by name must keep using render_template.
+# A request with pending flash messages is rendered normally, so the messages
+# are shown (and consumed) as usual.
+#
+# The cache lives in each worker's memory. Templates only change on deploy,
+# which restarts the workers; with TEMPLATES_AUTO_RELOAD an edited template is
+# also picked up straight away. invalidate() drops entries explicitly.
+
+DEFAULT_LOCALE = 'en'
+
+def default_bytecode_dir():
+    return os.path.join(tempfile.gettempdir(), 'swasthsathi-jinja')
+
+def init_bytecode_cache(app, directory=None):
+    """Keep compiled templates on disk so new workers load them instead of compiling every template again."""
+    directory = directory or os.environ.get('JINJA_CACHE_DIR') or default_bytecode_dir()
+    os.makedirs(directory, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+class PageCache:
+    def __init__(self, app):
+        self.app = app
+        self._pages = {}  # (template, role, locale) -> (template object, body, etag)
+        self._lock = threading.Lock()
+
+    def _key(self, template):
+        return template, session.get('user_role'), session.get('locale', DEFAULT_LOCALE)
+
+    def _fresh(self, entry):
+        # Checking the template's mtime costs a stat, so only do it when templates may change at runtime.
+        return entry is not None and (not self.app.jinja_env.auto_reload or entry[0].is_up_to_date)
+
+    def render(self, template):
+        """Like render_template(template), but served from the cache with ETag revalidation."""
+        if session.get('_flashes'):
+            return render_template(template)
+        key = self._key(template)
+        entry = self._pages.get(key)
+        if not self._fresh(entry):
+            body = render_template(template).encode('utf-8')
+            entry = (self.app.jinja_env.get_template(template), body, hashlib.blake2b(body, digest_size=16).hexdigest())
+            with self._lock:
+                self._pages[key] = entry
+        response = self.app.response_class(entry[1], mimetype='text/html')
+        response.set_etag(entry[2])
+        # The page depends on the login cookie: browsers may keep it, shared caches may not.
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        return response.make_conditional(request)
+
+    def invalidate(self, template=None):
+        """Drop every cached page, or only those rendered from `template`."""
+        with self._lock:
+            if template is None:
+                self._pages.clear()
+            else:
+                for key in [key for key in self._pages if key[0] == template]:
+                    del self._pages[key]
+
+    def __len__(self):
+        return len(self._pages)
@@ -0,0 +1,352 @@
+import argparse
+import os
+import sys
+from urllib.parse import quote
+
+from flask import current_app, g
+
+import database
+from database import connect, get_db
+from household_search import index_households
+from migrations import migrate
+from queries import PARTITION_PATH_SQL
+
+# --- District Partitions ---
+# ASHA field data can be split out of the main database into per-district
+# SQLite files ("partitions"). The main database stays the catalog: users,
+# consultations, chats, jobs and every other table. district_partitions maps
+# a district to the file holding the field data (TABLES) of every user in that
+# district. Users in an unmapped district, and everyone until the first split,
+# keep theirs in the catalog, so a single-file deployment works as before.
+#
+# Each file has its own write lock. ASHAs in different partitions no longer
+# queue behind each other, or behind doctors and patients writing to the
+# catalog, so field-data write throughput grows with the number of files.
+#
+# Consultations stay in the catalog. The doctor queue, the case scheduler and
+# /media checks all read them across every district, and ids in URLs must be
+# unique. Splitting them would turn each of those requests into a scatter
+# over every file.
+#
+# Partition files carry the full schema, so the summary, change_log, search
+# index and timeline triggers work unchanged. A partition connection attaches
+# the catalog read-only (so BEGIN IMMEDIATE locks only the partition) and
+# shadows its own empty users table with a TEMP view of catalog.users, so
+# queries that join users need no changes. Admin aggregates
+# and exports run over the catalog plus partition_dbs() and combine the
+# results. Every file gets its own id range (RANGE_BITS) for the
+# AUTOINCREMENT tables, so ids stay unique across files.
+#
+#   python partitions.py split "Jaipur" "Ajmer" --into partitions/rajasthan-1.db
+#   python partitions.py assign "Ajmer" rekha.kumari@asha.com
+#   python partitions.py list
+
+# Field data moved with its owner, all keyed by asha_id. Their search index,
+# summary and timeline rows follow through the triggers. immunization_due is
+# derived too, but copied as it is; the children the copy marks for a refresh
+# come out the same.
+TABLES = ('households', 'mch_records', 'field_reports', 'sync_receipts', 'change_log', 'immunization_due')
+# AUTOINCREMENT tables whose ids start at (partition number << RANGE_BITS).
+RANGED_TABLES = ('households', 'mch_records', 'field_reports', 'change_log')
+RANGE_BITS = 40
+
+def resolve(catalog_path, path):
+    """Partition paths are stored relative to the catalog's directory."""
+    return os.path.join(os.path.dirname(os.path.abspath(catalog_path)), path)
+
+def partition_path(catalog, catalog_path, user_id):
+    """The file holding `user_id`'s field data, or None if it is the catalog."""
+    row = catalog.execute(PARTITION_PATH_SQL, (user_id,)).fetchone()
+    return resolve(catalog_path, row[0]) if row else None
+
+def partition_paths(catalog, catalog_path):
+    return [resolve(catalog_path, row[0]) for row in catalog.execute('SELECT DISTINCT path FROM district_partitions ORDER BY path')]
+
+def _attach_readonly(conn, path, name):
+    # A read-write attachment would be locked by every BEGIN IMMEDIATE on `conn` too.
+    conn.execute(f'ATTACH DATABASE ? AS {name}', (f'file:{quote(os.path.abspath(path))}?mode=ro',))
+    attached = {row[1]: row[2] for row in conn.execute('PRAGMA database_list')}
+    if attached.get(name) != os.path.abspath(path):
+        raise RuntimeError(f'SQLite was built without URI filenames; could not attach {path} read-only')
+
+def attach_catalog(conn, catalog_path):
+    _attach_readonly(conn, catalog_path, 'catalog')
+    conn.execute('CREATE TEMP VIEW IF NOT EXISTS users AS SELECT * FROM catalog.users')
+    return conn
+
+def open_partition(path, catalog_path, readonly=False):
+    conn = attach_catalog(connect(path), catalog_path)
+    if readonly:
+        conn.execute('PRAGMA query_only = ON')
+    return conn
+
+def open_partitions(catalog, catalog_path, readonly=False):
+    return [open_partition(path, catalog_path, readonly) for path in partition_paths(catalog, catalog_path)]
+
+def router(catalog, catalog_path):
+    """route(user_id) -> connection to the database holding their field data, for scripts.
+
+    Partitions are opened on first use and stay open as long as the router.
+    """
+    conns = {}
+
+    def route(user_id):
+        path = partition_path(catalog, catalog_path, user_id)
+        if path is None:
+            return catalog
+        if path not in conns:
+            conns[path] = open_partition(path, catalog_path)
+        return conns[path]
+    return route
+
+# --- Request Connections ---
+# Pooled like get_db(), and returned on app-context teardown.
+
+def _acquire(path):
+    conns = g.setdefault('partition_dbs', {})
+    if path not in conns:
+        catalog_path = current_app.config['DATABASE']
+        conns[path] = database.get_pool(path, lambda conn: attach_catalog(conn, catalog_path)).acquire()
+    return conns[path]
+
+def asha_db(user_id):
+    """The request's connection to the database holding `user_id`'s field data."""
+    path = partition_path(get_db(), current_app.config['DATABASE'], user_id)
+    return get_db() if path is None else _acquire(path)
+
+def partition_dbs():
+    """The request's connections to every partition (not the catalog), for scatter-gather."""
+    return [_acquire(path) for path in partition_paths(get_db(), current_app.config['DATABASE'])]
+
+def close_partitions(exc=None):
+    for path, conn in g.pop('partition_dbs', {}).items():
+        database.get_pool(path).release(conn)
+
+def init_app(app):
+    app.teardown_appcontext(close_partitions)
+
+# --- Splitting ---
+
+def migrate_partitions(catalog, catalog_path):
+    """Bring every partition file up to the latest schema; returns their paths."""
+    paths = partition_paths(catalog, catalog_path)
+    for path in paths:
+        conn = connect(path)
+        try:
+            migrate(conn)
+        finally:
+            conn.close()
+    return paths
+
+def partition_number(conn):
+    """The number of the partition `conn` is open on; 0 for the catalog."""
+    row = conn.execute("SELECT seq FROM main.sqlite_sequence WHERE name = 'households'").fetchone()
+    return (row[0] if row else 0) >> RANGE_BITS
+
+def id_base(conn):
+    return partition_number(conn) << RANGE_BITS
+
+def prepare_partition(catalog, catalog_path, path):
+    """Create or migrate the partition file at `path` and give it its own id range."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = connect(path)
+    try:
+        migrate(conn)
+        if partition_number(conn) == 0:
+            number = 1
+            for other in partition_paths(catalog, catalog_path):
+                if os.path.abspath(other) != os.path.abspath(path):
+                    other_conn = connect(other, readonly=True)
+                    try:
+                        number = max(number, partition_number(other_conn) + 1)
+                    finally:
+                        other_conn.close()
+            base = number << RANGE_BITS
+            for table in RANGED_TABLES:
+                if conn.execute('UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?', (base, table)).rowcount == 0:
+                    conn.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (table, base))
+            conn.commit()
+    finally:
+        conn.close()
+
+def _columns(db, table):
+    return ', '.join(row[1] for row in db.execute(f'PRAGMA main.table_info({table})'))
+
+def _moving(db, user_ids):
+    db.execute('CREATE TEMP TABLE IF NOT EXISTS partition_move (user_id INTEGER PRIMARY KEY)')
+    db.execute('DELETE FROM temp.partition_move')
+    db.executemany('INSERT INTO temp.partition_move (user_id) VALUES (?)', ((user_id,) for user_id in user_ids))
+
+def _delete(db, user_ids):
+    """Delete the users' field data and everything derived from it; the caller commits."""
+    _moving(db, user_ids)
+    owned = 'asha_id IN (SELECT user_id FROM temp.partition_move)'
+    db.execute(f'DELETE FROM households_fts WHERE rowid IN (SELECT id FROM households WHERE {owned})')
+    for table in TABLES:
+        db.execute(f'DELETE FROM {table} WHERE {owned}')
+    # The deletes above were logged and counted again; drop that too.
+    db.execute(f'DELETE FROM change_log WHERE {owned}')
+    db.execute(f'DELETE FROM asha_summary WHERE {owned}')
+
+def _copy(target, user_ids):
+    """Copy the users' rows from the attached `source` schema into `target`, keeping their ids."""
+    # Anything already here is left over from an interrupted move; nothing routes to it yet.
+    _delete(target, user_ids)
+    owned = 'asha_id IN (SELECT user_id FROM temp.partition_move)'
+    for table in TABLES:
+        if table != 'change_log':
+            columns = _columns(target, table)
+            target.execute(f'INSERT INTO main.{table} ({columns}) SELECT {columns} FROM source.{table} WHERE {owned}')
+    # Keep the original change_log versions instead of the ones the inserts just
+    # logged, so every device's "since" stays valid. New versions continue above them.
+    target.execute(f'DELETE FROM main.change_log WHERE {owned}')
+    columns = _columns(target, 'change_log')
+    target.execute(f'INSERT INTO main.change_log ({columns}) SELECT {columns} FROM source.change_log WHERE {owned}')
+    index_households(target, target.execute(f'SELECT id, asha_id, household_name, address FROM main.households WHERE {owned}'))
+
+def move_out(catalog, catalog_path, target_path, user_ids, switch):
+    """Move the users' field data from the catalog into the partition file at `target_path`.
+
+    The catalog keeps its write lock from the first copied row until the
+    delete commits, so nothing written for these users in between is lost.
+    switch() must point their routing at the target; it runs in the same
+    transaction as the delete. Catalog writes wait meanwhile, so move large
+    districts at a quiet time.
+    """
+    if catalog.in_transaction:
+        catalog.commit()
+    catalog.execute('BEGIN IMMEDIATE')
+    try:
+        target = connect(target_path)
+        try:
+            _attach_readonly(target, catalog_path, 'source')
+            target.execute('BEGIN IMMEDIATE')
+            try:
+                _copy(target, user_ids)
+                target.commit()
+            except BaseException:
+                target.rollback()
+                raise
+        finally:
+            target.close()
+        switch()
+        _delete(catalog, user_ids)
+        catalog.commit()
+    except BaseException:
+        catalog.rollback()
+        raise
+
+def _stored_path(catalog_path, path):
+    return os.path.relpath(os.path.abspath(path), os.path.dirname(os.path.abspath(catalog_path)))
+
+def split(catalog, catalog_path, districts, path):
+    """Move the field data of everyone in `districts` from the catalog into the file at `path`.
+
+    Returns the number of users moved. Districts already in a partition are
+    refused with ValueError.
+    """
+    stored = _stored_path(catalog_path, path)
+    placeholders = ', '.join('?' * len(districts))
+    mapped = catalog.execute(
+        f'SELECT district, path FROM district_partitions WHERE district IN ({placeholders})', list(districts)
+    ).fetchall()
+    if mapped:
+        raise ValueError(', '.join(f'{district!r} is already in {where}' for district, where in mapped))
+    prepare_partition(catalog, catalog_path, path)
+    user_ids = [row[0] for row in catalog.execute(f'SELECT id FROM users WHERE district IN ({placeholders})', list(districts))]
+
+    def switch():
+        catalog.executemany('INSERT INTO district_partitions (district, path) VALUES (?, ?)',
+                            ((district, stored) for district in districts))
+    move_out(catalog, catalog_path, resolve(catalog_path, stored), user_ids, switch)
+    return len(user_ids)
+
+def _has_field_data(path, user_id):
+    conn = connect(path, readonly=True)
+    try:
+        return any(conn.execute(f'SELECT 1 FROM {table} WHERE asha_id = ? LIMIT 1', (user_id,)).fetchone()
+                   for table in TABLES)
+    finally:
+        conn.close()
+
+def assign(catalog, catalog_path, district, user_ids):
+    """Put the users in `district`, moving their field data out of the catalog if it is partitioned.
+
+    Field data already in a partition stays there: moving it on would carry
+    that file's ids into another file's range. Such users raise ValueError.
+    """
+    target = catalog.execute('SELECT path FROM district_partitions WHERE district = ?', (district,)).fetchone()
+    target_path = resolve(catalog_path, target[0]) if target else None
+    sources = {user_id: partition_path(catalog, catalog_path, user_id) for user_id in user_ids}
+    stuck = [user_id for user_id, path in sources.items()
+             if path is not None and path != target_path and _has_field_data(path, user_id)]
+    if stuck:
+        raise ValueError(f"users {', '.join(map(str, stuck))} have field data in another district's partition")
+    placeholders = ', '.join('?' * len(user_ids))
+
+    def switch():
+        catalog.execute(f'UPDATE users SET district = ? WHERE id IN ({placeholders})', (district, *user_ids))
+
+    from_catalog = [user_id for user_id, path in sources.items() if path is None]
+    if target_path is None or not from_catalog:
+        switch()
+        catalog.commit()
+    else:
+        move_out(catalog, catalog_path, target_path, from_catalog, switch)
+
+def _counts(db):
+    return [db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in ('households', 'mch_records', 'field_reports')]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Split ASHA field data into per-district database files.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='show districts, their files and row counts')
+    commands.add_parser('migrate', help='bring every partition file up to the latest schema')
+    split_parser = commands.add_parser('split', help="move districts' field data out of the catalog into one file")
+    split_parser.add_argument('districts', nargs='+')
+    split_parser.add_argument('--into', required=True, metavar='PATH', help='partition file, created if missing')
+    assign_parser = commands.add_parser('assign', help="set users' district, moving their field data with them")
+    assign_parser.add_argument('district')
+    assign_parser.add_argument('users', nargs='+', metavar='user', help='email or id')
+    parser.add_argument('--db', default=os.environ.get('DATABASE', 'swasthsathi.db'), help='the catalog database')
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    migrate(conn)
+    if args.command == 'migrate':
+        for path in migrate_partitions(conn, args.db):
+            print(f"- {path} is up to date.")
+    elif args.command == 'split':
+        try:
+            moved = split(conn, args.db, args.districts, args.into)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Moved the field data of {moved} users in {', '.join(args.districts)} to {args.into}.")
+    elif args.command == 'assign':
+        user_ids = []
+        for user in args.users:
+            row = conn.execute('SELECT id FROM users WHERE id = ? OR lower(email) = ?', (user, user.lower())).fetchone()
+            if row is None:
+                parser.error(f'no user with email or id {user!r}')
+            user_ids.append(row[0])
+        try:
+            assign(conn, args.db, args.district, user_ids)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Assigned {len(user_ids)} users to {args.district}.")
+    else:
+        mapping = dict(conn.execute('SELECT district, path FROM district_partitions').fetchall())
+        for district, users in conn.execute(
+            "SELECT COALESCE(district, '(none)'), COUNT(*) FROM users GROUP BY district ORDER BY district"
+        ):
+            print(f"- {district}: {users} users, {mapping.get(district, 'catalog')}")
+        households, mch, reports = _counts(conn)
+        print(f"catalog {args.db}: {households} households, {mch} MCH records, {reports} field reports")
+        for path in partition_paths(conn, args.db):
+            if not os.path.exists(path):
+                print(f"partition {path}: MISSING", file=sys.stderr)
+                continue
+            partition = connect(path, readonly=True)
+            households, mch, reports = _counts(partition)
+            partition.close()
+            print(f"partition {path}: {households} households, {mch} MCH records, {reports} field reports")
@@ -0,0 +1,160 @@
+import argparse
+import os
+import sys
+
+# --- Patient Timeline ---
+# patient_timeline is a per-patient projection of everything that happened to
+# them: one row per consultation, per MCH record and per chat thread (a thread
+# moves up whenever a message arrives and carries a message count and preview).
+# Triggers (migration 13) keep it in step on every write, so a page of the
+# timeline is one index range scan on (patient_id, occurred_at, id) however
+# many years of history the patient has. rebuild_timeline() recomputes it from
+# the source tables; check_timeline() lists rows that have drifted.
+#
+# MCH records split out into district partitions (partitions.py) keep their
+# timeline rows in their partition's file; get_timeline() merges a page from
+# each. A partition's entries are numbered from its id base, so ids and cursors
+# stay unique across files.
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+PREVIEW_CHARS = 200
+
+TIMELINE_SQL = '''
+    SELECT t.id + ? AS id, t.kind, t.source_id, t.occurred_at, t.status, t.title, t.summary, t.item_count,
+           t.actor_id, u.name AS actor_name
+    FROM patient_timeline t
+    LEFT JOIN users u ON u.id = t.actor_id
+    WHERE t.patient_id = ? {where}
+    ORDER BY t.occurred_at DESC, t.id DESC
+    LIMIT ?
+'''
+TIMELINE_BEFORE_CURSOR = 'AND (t.occurred_at, t.id) < (?, ?)'
+
+# Projected columns, in table order after (kind, source_id).
+COLUMNS = ('patient_id', 'occurred_at', 'status', 'title', 'summary', 'actor_id')
+
+# kind -> (source table, {column: expression over a `{row}` placeholder})
+SOURCES = {
+    'consultation': ('consultations', {
+        'patient_id': '{row}.patient_id',
+        'occurred_at': 'COALESCE({row}.created_at, CURRENT_TIMESTAMP)',
+        'status': '{row}.status',
+        'title': "COALESCE({row}.category, 'Consultation')",
+        'summary': f'substr({{row}}.symptoms, 1, {PREVIEW_CHARS})',
+        'actor_id': '{row}.doctor_id',
+    }),
+    'mch_record': ('mch_records', {
+        'patient_id': '{row}.patient_id',
+        'occurred_at': 'COALESCE({row}.record_date, CURRENT_TIMESTAMP)',
+        'status': 'NULL',
+        'title': "COALESCE({row}.record_type, 'MCH record')",
+        'summary': f'substr({{row}}.record_details, 1, {PREVIEW_CHARS})',
+        'actor_id': '{row}.asha_id',
+    }),
+    # Message count, preview and latest activity are filled in from chat_messages.
+    'chat': ('chat_threads', {
+        'patient_id': '{row}.patient_id',
+        'occurred_at': 'COALESCE({row}.created_at, CURRENT_TIMESTAMP)',
+        'status': 'NULL',
+        'title': "'Chat'",
+        'summary': 'NULL',
+        'actor_id': '{row}.doctor_id',
+    }),
+}
+
+# The preview a chat thread shows for one of its messages.
+MESSAGE_PREVIEW = (f"CASE WHEN COALESCE({{row}}.message_text, '') <> '' THEN substr({{row}}.message_text, 1, {PREVIEW_CHARS}) "
+                   "WHEN {row}.file_path IS NOT NULL THEN '[attachment]' END")
+
+def _project(db, target):
+    for kind, (table, columns) in SOURCES.items():
+        db.execute(
+            f'''
+            INSERT INTO {target} (kind, source_id, {", ".join(COLUMNS)}, item_count)
+            SELECT '{kind}', id, {", ".join(columns[c].format(row=table) for c in COLUMNS)}, 0
+            FROM {table} WHERE patient_id IS NOT NULL
+            '''
+        )
+    db.execute(
+        f'''
+        UPDATE {target} AS t
+        SET occurred_at = MAX(t.occurred_at, m.last_sent_at), item_count = m.messages, summary = m.preview
+        FROM (
+            SELECT thread_id, COUNT(*) AS messages, MAX(sent_at) AS last_sent_at,
+                   (SELECT {MESSAGE_PREVIEW.format(row='last')} FROM chat_messages last
+                    WHERE last.thread_id = chat_messages.thread_id ORDER BY last.id DESC LIMIT 1) AS preview
+            FROM chat_messages GROUP BY thread_id
+        ) AS m
+        WHERE t.kind = 'chat' AND t.source_id = m.thread_id
+        '''
+    )
+
+def rebuild_timeline(db):
+    """Recompute every patient's timeline from the source tables; returns the number of rows written."""
+    db.execute('DELETE FROM patient_timeline')
+    _project(db, 'patient_timeline')
+    return db.execute('SELECT COUNT(*) FROM patient_timeline').fetchone()[0]
+
+def check_timeline(db):
+    """Return (missing or wrong, unexpected) timeline rows as (kind, source_id) lists."""
+    db.execute('DROP TABLE IF EXISTS temp.timeline_check')
+    db.execute('CREATE TEMP TABLE timeline_check AS SELECT * FROM patient_timeline WHERE 0')
+    _project(db, 'temp.timeline_check')
+    compared = f'kind, source_id, {", ".join(COLUMNS)}, item_count'
+    wrong = db.execute(f'SELECT kind, source_id FROM (SELECT {compared} FROM temp.timeline_check EXCEPT SELECT {compared} FROM patient_timeline)').fetchall()
+    extra = db.execute(f'SELECT kind, source_id FROM (SELECT {compared} FROM patient_timeline EXCEPT SELECT {compared} FROM temp.timeline_check)').fetchall()
+    db.execute('DROP TABLE temp.timeline_check')
+    expected = {tuple(row) for row in wrong}
+    return sorted(expected), sorted(tuple(row) for row in extra if tuple(row) not in expected)
+
+def get_timeline(db, patient_id, before_ts=None, before_id=None, limit=PAGE_SIZE, partitions=()):
+    """One page of a patient's timeline, newest first.
+
+    Returns (items, next_cursor); pass next_cursor's before_ts/before_id back
+    for the following page. It is None on the last page. `partitions` are
+    further databases to merge entries from.
+    """
+    from partitions import id_base
+
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    paged = before_ts and before_id is not None
+    where = TIMELINE_BEFORE_CURSOR if paged else ''
+    rows = []
+    for source in (db, *partitions):
+        base = 0 if source is db else id_base(source)
+        params = [base, patient_id] + ([before_ts, int(before_id) - base] if paged else [])
+        rows += source.execute(TIMELINE_SQL.format(where=where), (*params, limit + 1)).fetchall()
+    if partitions:
+        rows.sort(key=lambda row: (row['occurred_at'], row['id']), reverse=True)
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = {'before_ts': items[-1]['occurred_at'], 'before_id': items[-1]['id']}
+    return items, next_cursor
+
+if __name__ == '__main__':
+    from database import connect
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Check or rebuild the patient timeline projection.')
+    parser.add_argument('command', choices=['check', 'rebuild'])
+    parser.add_argument('--db', default=os.environ.get('DATABASE', 'swasthsathi.db'))
+    args = parser.parse_args()
+    conn = connect(args.db)
+    migrate(conn)
+    if args.command == 'rebuild':
+        conn.execute('BEGIN IMMEDIATE')
+        count = rebuild_timeline(conn)
+        conn.commit()
+        print(f"Rebuilt {count} timeline entries.")
+    else:
+        wrong, extra = check_timeline(conn)
+        for kind, source_id in wrong:
+            print(f"- {kind} {source_id}: missing or out of date")
+        for kind, source_id in extra:
+            print(f"- {kind} {source_id}: no longer exists")
+        if wrong or extra:
+            print(f"{len(wrong) + len(extra)} timeline entries are wrong; run with 'rebuild'.")
+            sys.exit(1)
+        print("Patient timeline matches.")
@@ -0,0 +1,58 @@
+# --- Route Queries ---
+# The SQL behind the app's hot routes. app.py runs these and
+# migrations.HOT_QUERIES checks their plans, so both read the same text: edit
+# a query here and the plan check follows. Queries owned by another module
+# (the scheduler, the job queue, the timeline, ...) live next to their code.
+
+# Only what the queue page shows: the symptom text is cut to the 100-char preview (+1 to know it was cut).
+PENDING_CASES_SQL = """
+    SELECT id, patient_name, patient_age, patient_gender, substr(symptoms, 1, 101) AS symptoms, category, created_at
+    FROM consultations
+    WHERE status = 'Pending' {where}
+    ORDER BY created_at ASC, id ASC
+    LIMIT ?
+"""
+PENDING_AFTER_CURSOR = 'AND (created_at, id) > (?, ?)'
+
+ACCEPT_CASE_SQL = (
+    "UPDATE consultations SET doctor_id = ?, status = 'Under Review', accepted_at = CURRENT_TIMESTAMP, auto_assigned = 0 "
+    "WHERE id = ? AND status = 'Pending'"
+)
+DOCTOR_CASES_SQL = "SELECT * FROM consultations c WHERE c.doctor_id = ? AND c.status = 'Under Review' ORDER BY c.created_at ASC"
+REVIEWED_CASES_SQL = (
+    "SELECT c.*, p.name as patient_name FROM consultations c JOIN users p ON c.patient_id = p.id "
+    "WHERE c.status = 'Reviewed' AND c.doctor_id = ? ORDER BY c.created_at DESC"
+)
+PATIENT_CONSULTATIONS_SQL = (
+    'SELECT c.*, d.name as doctor_name FROM consultations c LEFT JOIN users d ON c.doctor_id = d.id '
+    'WHERE c.patient_id = ? ORDER BY c.created_at DESC LIMIT ?'
+)
+DOCTORS_SQL = 'SELECT id, name, specialty, hospital FROM users WHERE role_id = ?'
+
+CHAT_THREAD_SQL = 'SELECT * FROM chat_threads WHERE patient_id = ? AND doctor_id = ?'
+LATEST_MESSAGE_SQL = 'SELECT id, sent_at FROM chat_messages WHERE thread_id = ? ORDER BY id DESC LIMIT 1'
+MESSAGES_AFTER_SQL = 'SELECT * FROM chat_messages WHERE thread_id = ? AND id > ? ORDER BY id ASC LIMIT ?'
+# Newest first; the caller reverses the page.
+LATEST_MESSAGES_SQL = 'SELECT * FROM chat_messages WHERE thread_id = ? ORDER BY id DESC LIMIT ?'
+
+ASHA_HOUSEHOLDS_SQL = 'SELECT * FROM households WHERE asha_id = ?'
+PARTITION_PATH_SQL = 'SELECT p.path FROM users u JOIN district_partitions p ON p.district = u.district WHERE u.id = ?'
+
+# /media access: the name is an upload of a consultation or chat message the
+# user is part of. A derivative matches its original through the half-open
+# range [low, high) of names sharing its stem.
+MEDIA_CONSULTATION_SQL = (
+    'SELECT 1 FROM consultations WHERE (photo_filename = ? OR audio_note_filename = ?) '
+    'AND (patient_id = ? OR doctor_id = ?) LIMIT 1'
+)
+MEDIA_CONSULTATION_DERIVATIVE_SQL = (
+    'SELECT 1 FROM consultations WHERE photo_filename >= ? AND photo_filename < ? '
+    'AND (patient_id = ? OR doctor_id = ?) LIMIT 1'
+)
+MEDIA_CHAT_SQL = '''
+    SELECT 1 FROM chat_messages m JOIN chat_threads t ON t.id = m.thread_id
+    WHERE {match} AND (t.patient_id = ? OR t.doctor_id = ?)
+    LIMIT 1
+'''
+MEDIA_CHAT_NAME = 'm.file_path = ?'
+MEDIA_CHAT_RANGE = 'm.file_path >= ? AND m.file_path < ?'
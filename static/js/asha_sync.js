@@ -0,0 +1,78 @@
+// --- Offline Field Sync ---
+// Forms marked with data-sync-entity are queued in localStorage and sent to
+// /api/sync in one batch. Without a connection the queue simply waits; it is
+// flushed again when the browser comes back online and on every page load.
+// Each queued change keeps the client_id it was created with, so re-sending a
+// batch whose reply was lost never saves a report twice.
+(() => {
+    const QUEUE_KEY = 'swasthsathi-sync-queue';
+    const MAX_BATCH = 500;
+    let flushing = false;
+
+    const readQueue = () => JSON.parse(localStorage.getItem(QUEUE_KEY) || '[]');
+    const writeQueue = (queue) => localStorage.setItem(QUEUE_KEY, JSON.stringify(queue));
+
+    const newClientId = () => (window.crypto && crypto.randomUUID)
+        ? crypto.randomUUID()
+        : Date.now().toString(36) + Math.random().toString(36).slice(2);
+
+    const showStatus = (message, tone) => {
+        document.querySelectorAll('.sync-status').forEach(el => {
+            el.textContent = message;
+            el.className = `sync-status text-${tone}`;
+        });
+    };
+
+    const pendingMessage = () => {
+        const pending = readQueue().length;
+        return pending ? `${pending} report(s) saved on this device, waiting to be sent.` : '';
+    };
+
+    async function flush() {
+        if (flushing || !navigator.onLine) return;
+        const batch = readQueue().slice(0, MAX_BATCH);
+        if (!batch.length) return;
+        flushing = true;
+        try {
+            const response = await fetch('/api/sync', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                credentials: 'same-origin',
+                body: JSON.stringify({since: null, changes: batch}),
+            });
+            if (!response.ok) throw new Error(`sync failed with status ${response.status}`);
+            const {applied} = await response.json();
+            const done = new Set(applied.map(result => result.client_id));
+            const rejected = applied.filter(result => result.status === 'rejected');
+            writeQueue(readQueue().filter(change => !done.has(change.client_id)));
+            if (rejected.length) {
+                showStatus(`Not saved: ${rejected.map(result => result.error).join('; ')}`, 'danger');
+            } else {
+                showStatus(pendingMessage() || `${applied.length} report(s) sent.`, 'success');
+            }
+        } catch (err) {
+            showStatus(pendingMessage(), 'warning');
+        } finally {
+            flushing = false;
+        }
+        if (readQueue().length && navigator.onLine) flush();
+    }
+
+    document.querySelectorAll('form[data-sync-entity]').forEach(form => {
+        form.addEventListener('submit', (e) => {
+            e.preventDefault();
+            const data = Object.fromEntries(new FormData(form).entries());
+            const clientId = data.client_id;
+            delete data.client_id;
+            writeQueue([...readQueue(), {client_id: clientId, op: 'create', entity: form.dataset.syncEntity, data}]);
+            form.reset();
+            form.querySelector('[name="client_id"]').value = newClientId();
+            showStatus(pendingMessage(), 'warning');
+            flush();
+        });
+    });
+
+    window.addEventListener('online', flush);
+    showStatus(pendingMessage(), 'warning');
+    flush();
+})();
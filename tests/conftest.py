@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+# The scheduler thread would race the tests for pending cases.
+os.environ.setdefault('CASE_SCHEDULER', '0')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+
+
+@pytest.fixture
+def app(tmp_path):
+    """The Flask app on a fresh, migrated and seeded database."""
+    app_module.app.config.update(TESTING=True, DATABASE=str(tmp_path / 'test.db'))
+    with app_module.app.app_context():
+        app_module.init_db()
+        app_module.seed_db()
+    yield app_module.app
+
+
+@pytest.fixture
+def db(app):
+    with app.app_context():
+        yield app_module.get_db()
+
+
+@pytest.fixture
+def login(app):
+    """login(email) -> a test client with that demo user logged in (every demo password is "password")."""
+    def login(email):
+        client = app.test_client()
+        response = client.post('/login', data={'email': email, 'password': 'password'})
+        assert response.status_code == 302
+        return client
+    return login
+
+
+def user_id(db, email):
+    return db.execute('SELECT id FROM users WHERE email = ? OR username = ?', (email, email)).fetchone()[0]
@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+from ai_proxy import HTTPTransport, UpstreamError
+
+
+class FakeResponse:
+    ok = True
+    status_code = 200
+
+    def __init__(self, body):
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+class FakeSession:
+    def __init__(self, body):
+        self.body = body
+
+    def post(self, *args, **kwargs):
+        return FakeResponse(self.body)
+
+
+def transport(body):
+    t = HTTPTransport(gemini_key='g', openrouter_key='o')
+    t._session, t._pid = FakeSession(body), os.getpid()
+    return t
+
+
+@pytest.mark.parametrize('provider, body, reason', [
+    ('gemini', {'promptFeedback': {'blockReason': 'SAFETY'}}, 'SAFETY'),
+    ('gemini', {'candidates': [{'finishReason': 'RECITATION'}]}, 'RECITATION'),
+    ('openrouter', {'choices': []}, 'no choices'),
+    ('openrouter', {'choices': [{'message': {'content': None}, 'finish_reason': 'content_filter'}]}, 'content_filter'),
+])
+def test_empty_answers_are_upstream_errors(provider, body, reason):
+    with pytest.raises(UpstreamError, match=reason):
+        transport(body)(provider, 'model', 'system', [{'role': 'user', 'content': 'hi'}], {})
+
+
+def test_answers_are_returned():
+    body = {'candidates': [{'content': {'parts': [{'text': 'hello'}]}}]}
+    assert transport(body)('gemini', 'model', 'system', [{'role': 'user', 'content': 'hi'}], {}) == 'hello'
@@ -0,0 +1,69 @@
+import pytest
+
+import app as app_module
+from analytics import CONSULTATIONS_SQL, CONSULTATION_DTYPES, compute_metrics, load_frame
+from conftest import user_id
+from partitions import partition_dbs, split
+
+NOW = 1736467200  # 2025-01-10 00:00:00 UTC
+
+
+@pytest.fixture
+def consultations(db):
+    """Five cases with known timings; the seeded ones are dropped."""
+    db.execute('DELETE FROM consultations')
+    patient, doctor = user_id(db, 'patient@test.com'), user_id(db, 'sharma@doctor.com')
+    for status, doctor_id, created, reviewed in (
+        ('Pending', None, '2025-01-09 00:00:00', None),
+        ('Pending', None, '2025-01-09 18:00:00', None),
+        ('Under Review', doctor, '2025-01-08 00:00:00', None),
+        ('Reviewed', doctor, '2025-01-07 00:00:00', '2025-01-07 02:00:00'),
+        ('Reviewed', doctor, '2025-01-07 00:00:00', '2025-01-07 06:00:00'),
+    ):
+        db.execute('INSERT INTO consultations (patient_id, doctor_id, status, created_at, reviewed_at) VALUES (?, ?, ?, ?, ?)',
+                   (patient, doctor_id, status, created, reviewed))
+    db.commit()
+    return doctor
+
+
+def test_consultation_metrics(consultations, db):
+    metrics = compute_metrics(db, app_module.ROLES, now=NOW)['consultations']
+    assert metrics['total'] == 5
+    assert metrics['by_status'] == {'Pending': 2, 'Under Review': 1, 'Reviewed': 2}
+    assert metrics['backlog']['pending'] == 2
+    assert metrics['backlog']['age_hours']['p50'] == 15.0
+    assert metrics['time_to_review_hours'] == {'count': 2, 'p50': 4.0, 'p90': 5.6, 'p99': 5.96}
+    throughput = metrics['throughput']
+    assert throughput['days'][-1] == '2025-01-10'
+    assert throughput['submitted'][-4:] == [2, 1, 2, 0]
+    assert throughput['reviewed'][-4:] == [2, 0, 0, 0]
+    assert throughput['submitted_last_7_days'] == 5
+
+
+def test_doctor_load(consultations, db):
+    load = compute_metrics(db, app_module.ROLES, now=NOW)['doctor_load']
+    assert load['doctors'] == 1 and load['active_max'] == 1
+    assert load['top'] == [{'doctor_id': consultations, 'name': 'Dr. Sharma', 'active': 1, 'reviewed': 2}]
+
+
+def test_chunked_reads_match_one_read(consultations, db):
+    whole = load_frame(db, CONSULTATIONS_SQL, CONSULTATION_DTYPES)
+    chunked = load_frame(db, CONSULTATIONS_SQL, CONSULTATION_DTYPES, chunk_rows=2)
+    assert chunked.equals(whole)
+    assert dict(chunked.dtypes.astype(str)) == CONSULTATION_DTYPES
+
+
+def test_asha_coverage_adds_up_partitions(app, db, tmp_path):
+    before = compute_metrics(db, app_module.ROLES, now=NOW)['asha_coverage']
+    assert before['households'] > 0
+    db.execute("UPDATE users SET district = 'Jaipur' WHERE id = ?", (user_id(db, 'rekha_kumari'),))
+    db.commit()
+    split(db, app.config['DATABASE'], ['Jaipur'], str(tmp_path / 'jaipur.db'))
+    assert compute_metrics(db, app_module.ROLES, now=NOW)['asha_coverage']['households'] < before['households']
+    assert compute_metrics(db, app_module.ROLES, now=NOW, partitions=partition_dbs())['asha_coverage'] == before
+
+
+def test_the_analytics_endpoint(consultations, login):
+    metrics = login('admin@gov.com').get('/api/admin/analytics?refresh=1').get_json()
+    assert metrics['consultations']['total'] == 5
+    assert metrics['users']['doctor'] == 1
@@ -0,0 +1,61 @@
+from asha_summary import check_summaries, get_summary, rebuild_summaries
+from conftest import user_id
+
+
+def counts(db, asha_id, *columns):
+    summary = get_summary(db, asha_id)
+    return tuple(summary[column] for column in columns)
+
+
+def test_household_triggers_follow_insert_update_and_delete(db):
+    rekha, bhavya = user_id(db, 'rekha_kumari'), user_id(db, 'bhavya_devi')
+    before = counts(db, rekha, 'households', 'verified_households', 'household_members')
+    household = db.execute("INSERT INTO households (asha_id, household_name, members_count, is_verified) "
+                           "VALUES (?, 'Test Family', 4, 0)", (rekha,)).lastrowid
+    assert counts(db, rekha, 'households', 'verified_households', 'household_members') == (
+        before[0] + 1, before[1], before[2] + 4)
+
+    db.execute('UPDATE households SET is_verified = 1, members_count = 6 WHERE id = ?', (household,))
+    assert counts(db, rekha, 'households', 'verified_households', 'household_members') == (
+        before[0] + 1, before[1] + 1, before[2] + 6)
+
+    # Moving the household to another ASHA moves its counts with it.
+    bhavya_before = counts(db, bhavya, 'households', 'verified_households', 'household_members')
+    db.execute('UPDATE households SET asha_id = ? WHERE id = ?', (bhavya, household))
+    assert counts(db, rekha, 'households', 'verified_households', 'household_members') == before
+    assert counts(db, bhavya, 'households', 'verified_households', 'household_members') == (
+        bhavya_before[0] + 1, bhavya_before[1] + 1, bhavya_before[2] + 6)
+
+    db.execute('DELETE FROM households WHERE id = ?', (household,))
+    assert counts(db, bhavya, 'households', 'verified_households', 'household_members') == bhavya_before
+    assert check_summaries(db) == {}
+
+
+def test_mch_record_triggers_follow_insert_update_and_delete(db):
+    rekha = user_id(db, 'rekha_kumari')
+    columns = ('mch_records', 'pregnancies', 'immunizations', 'growth_records')
+    records, pregnancies, immunizations, growth = counts(db, rekha, *columns)
+    record = db.execute("INSERT INTO mch_records (asha_id, patient_id, record_type) VALUES (?, ?, 'pregnancy')",
+                        (rekha, user_id(db, 'rina.devi@test.com'))).lastrowid
+    assert counts(db, rekha, *columns) == (records + 1, pregnancies + 1, immunizations, growth)
+
+    db.execute("UPDATE mch_records SET record_type = 'growth' WHERE id = ?", (record,))
+    assert counts(db, rekha, *columns) == (records + 1, pregnancies, immunizations, growth + 1)
+
+    db.execute('DELETE FROM mch_records WHERE id = ?', (record,))
+    assert counts(db, rekha, *columns) == (records, pregnancies, immunizations, growth)
+    assert check_summaries(db) == {}
+
+
+def test_check_and_rebuild_repair_drift(db):
+    rekha = user_id(db, 'rekha_kumari')
+    expected = get_summary(db, rekha)
+    db.execute('UPDATE asha_summary SET households = households + 10 WHERE asha_id = ?', (rekha,))
+    assert check_summaries(db) == {rekha: {'households': (expected['households'] + 10, expected['households'])}}
+    rebuild_summaries(db)
+    assert check_summaries(db) == {}
+    assert get_summary(db, rekha) == expected
+
+
+def test_an_asha_without_records_reads_zeros(db):
+    assert set(get_summary(db, user_id(db, 'admin@gov.com')).values()) == {0}
@@ -0,0 +1,19 @@
+from audio_processing import process_pending
+from conftest import user_id
+
+
+def test_image_attachments_are_not_rescanned_as_voice_notes(db, tmp_path):
+    doctor = user_id(db, 'sharma@doctor.com')
+    thread_id = db.execute('INSERT INTO chat_threads (patient_id, doctor_id) VALUES (?, ?)',
+                           (user_id(db, 'patient@test.com'), doctor)).lastrowid
+    image, note = (db.execute('INSERT INTO chat_messages (thread_id, sender_id, file_path) VALUES (?, ?, ?)',
+                              (thread_id, doctor, path)).lastrowid for path in ('uploads/ab/photo.PNG', 'uploads/ab/note.wav'))
+    db.commit()
+
+    logged = []
+    assert process_pending(db, str(tmp_path), log=logged.append) == (0, 0)
+    # The voice note was looked for (and is missing); the image was only stamped.
+    assert logged == [f'- chat_messages #{note}: ab/note.wav is missing, skipped']
+    assert db.execute('SELECT COUNT(*) FROM chat_messages WHERE file_path IS NOT NULL AND audio_processed_at IS NULL'
+                      ).fetchone()[0] == 0
+    assert db.execute('SELECT audio_processed_at IS NOT NULL FROM chat_messages WHERE id = ?', (image,)).fetchone()[0]
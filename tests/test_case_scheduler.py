@@ -0,0 +1,24 @@
+import time
+
+from case_scheduler import CLAIM_TIMEOUT_SECONDS, release_stale_claims
+from conftest import user_id
+
+
+def test_only_scheduler_assigned_claims_are_released(db, login):
+    doctor_id = user_id(db, 'sharma@doctor.com')
+    patient_id = user_id(db, 'patient@test.com')
+    db.execute('DELETE FROM consultations')
+    ids = [db.execute(
+        "INSERT INTO consultations (patient_id, doctor_id, status, accepted_at, auto_assigned) "
+        "VALUES (?, ?, 'Under Review', '2000-01-01 00:00:00', ?)", (patient_id, doctor_id, auto)
+    ).lastrowid for auto in (1, 0)]
+    db.commit()
+
+    assert release_stale_claims(db, time.time()) == 1
+    rows = db.execute('SELECT id, status, doctor_id, auto_assigned FROM consultations ORDER BY id').fetchall()
+    assert [tuple(row) for row in rows] == [(ids[0], 'Pending', None, 0), (ids[1], 'Under Review', doctor_id, 0)]
+
+    # Accepting the released case by hand makes it the doctor's own claim.
+    assert login('sharma@doctor.com').post(f'/doctor/accept-case/{ids[0]}').status_code == 302
+    assert db.execute('SELECT status FROM consultations WHERE id = ?', (ids[0],)).fetchone()[0] == 'Under Review'
+    assert release_stale_claims(db, time.time() + 2 * CLAIM_TIMEOUT_SECONDS) == 0
@@ -0,0 +1,54 @@
+from conftest import user_id
+
+
+def start_thread(db, login):
+    patient = login('patient@test.com')
+    response = patient.get(f"/chat/start/{user_id(db, 'sharma@doctor.com')}")
+    return patient, int(response.location.rstrip('/').rsplit('/', 1)[1])
+
+
+def test_only_participants_read_and_post(db, login):
+    patient, thread_id = start_thread(db, login)
+    assert patient.post(f'/chat/{thread_id}/send', data={'message_text': 'Hello doctor'}).status_code == 200
+    assert [m['message_text'] for m in patient.get(f'/chat/{thread_id}/messages').get_json()] == ['Hello doctor']
+
+    for outsider in (login('rina.devi@test.com'), login('rekha_kumari')):
+        assert outsider.get(f'/chat/{thread_id}/messages').status_code == 403
+        assert outsider.post(f'/chat/{thread_id}/send', data={'message_text': 'Intruding'}).status_code == 403
+        assert outsider.get(f'/chat/{thread_id}/events').status_code == 403
+
+    assert db.execute('SELECT COUNT(*) FROM chat_messages WHERE thread_id = ?', (thread_id,)).fetchone()[0] == 1
+    assert db.execute('SELECT doctor_unread FROM chat_threads WHERE id = ?', (thread_id,)).fetchone()[0] == 1
+
+
+def test_messages_streamed_over_sse_are_marked_read(db, login):
+    patient, thread_id = start_thread(db, login)
+    doctor = login('sharma@doctor.com')
+    patient.post(f'/chat/{thread_id}/send', data={'message_text': 'Are you there?'})
+    assert db.execute('SELECT doctor_unread FROM chat_threads WHERE id = ?', (thread_id,)).fetchone()[0] == 1
+
+    response = doctor.get(f'/chat/{thread_id}/events')
+    events = iter(response.response)
+    assert next(events).startswith(b'retry:')
+    assert b'Are you there?' in next(events)
+    response.close()
+
+    row = db.execute('SELECT doctor_unread, doctor_last_read_id, last_message_id FROM chat_threads WHERE id = ?',
+                     (thread_id,)).fetchone()
+    assert row['doctor_unread'] == 0
+    assert row['doctor_last_read_id'] == row['last_message_id']
+
+
+def test_streams_above_the_limit_fall_back_to_polling(db, login, monkeypatch):
+    import threading
+    import app as app_module
+
+    monkeypatch.setattr(app_module, 'chat_stream_slots', threading.BoundedSemaphore(1))
+    patient, thread_id = start_thread(db, login)
+    first = patient.get(f'/chat/{thread_id}/events')
+    assert first.status_code == 200
+    assert patient.get(f'/chat/{thread_id}/events').status_code == 204
+    first.close()
+    second = patient.get(f'/chat/{thread_id}/events')
+    assert second.status_code == 200
+    second.close()
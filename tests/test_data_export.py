@@ -0,0 +1,18 @@
+import pytest
+
+from data_export import export_mode
+
+
+def test_incremental_exports_cannot_take_a_date_range(db, login):
+    with pytest.raises(ValueError):
+        export_mode(since='2025-01-01', incremental=True)
+
+    admin = login('admin@gov.com')
+    response = admin.get('/admin/export/consultations.parquet?incremental=1&since=2025-01-01')
+    assert response.status_code == 400
+    assert db.execute('SELECT COUNT(*) FROM export_runs').fetchone()[0] == 0
+
+    response = admin.get('/admin/export/consultations.parquet?incremental=1')
+    assert response.status_code == 200
+    response.get_data()
+    assert db.execute("SELECT mode FROM export_runs WHERE finished_at IS NOT NULL").fetchall()[0][0] == 'incremental'
@@ -0,0 +1,13 @@
+import database
+
+
+def test_statements_run_through_cursors_are_timed(tmp_path, monkeypatch):
+    timed = []
+    monkeypatch.setattr(database, '_statement_timer', lambda sql, seconds: timed.append(sql))
+    conn = database.connect(str(tmp_path / 'timed.db'))
+    conn.execute('CREATE TABLE t (n INTEGER)')
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.executemany('INSERT INTO t (n) VALUES (?)', [(1,), (2,)])
+    assert cursor.execute('SELECT SUM(n) FROM t').fetchone() == (3,)
+    assert timed[-3:] == ['CREATE TABLE t (n INTEGER)', 'INSERT INTO t (n) VALUES (?)', 'SELECT SUM(n) FROM t']
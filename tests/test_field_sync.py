@@ -0,0 +1,58 @@
+from conftest import user_id
+from field_sync import apply_changes
+
+
+def test_references_must_name_a_row_of_the_expected_entity(db):
+    asha_id = user_id(db, 'rekha_kumari')
+    report = {'client_id': 'report-1', 'op': 'create', 'entity': 'disease_report',
+              'data': {'disease': 'Dengue', 'cases_count': 2}}
+    [created] = apply_changes(db, asha_id, [report])
+    assert created['status'] == 'applied'
+
+    results = apply_changes(db, asha_id, [
+        # The report's id is not a household, whatever households.id it happens to match.
+        {'client_id': 'update-1', 'op': 'update', 'entity': 'household', 'ref': 'report-1',
+         'data': {'household_name': 'Renamed'}},
+        {'client_id': 'birth-1', 'op': 'create', 'entity': 'birth_report',
+         'data': {'household_ref': 'report-1', 'sex': 'F', 'birth_date': '2026-01-05', 'mother_name': 'Sita'}},
+    ])
+    assert [r['status'] for r in results] == ['rejected', 'rejected']
+    assert all('unknown household reference' in r['error'] for r in results)
+    assert db.execute("SELECT COUNT(*) FROM households WHERE household_name = 'Renamed'").fetchone()[0] == 0
+
+
+def test_a_constraint_failure_rejects_only_that_change(db):
+    asha_id = user_id(db, 'rekha_kumari')
+    db.execute('''CREATE TRIGGER reject_bad_households BEFORE INSERT ON households WHEN NEW.household_name = 'Bad'
+                  BEGIN SELECT RAISE(ABORT, 'bad household'); END''')
+    db.commit()
+
+    results = apply_changes(db, asha_id, [
+        {'client_id': 'bad', 'op': 'create', 'entity': 'household', 'data': {'household_name': 'Bad'}},
+        {'client_id': 'good', 'op': 'create', 'entity': 'household', 'data': {'household_name': 'Good'}},
+    ])
+    assert [r['status'] for r in results] == ['rejected', 'applied']
+    assert results[0]['error'] == 'bad household'
+    names = [row[0] for row in db.execute('SELECT household_name FROM households WHERE asha_id = ?', (asha_id,))]
+    assert 'Good' in names and 'Bad' not in names
+
+
+def test_mch_records_only_name_the_ashas_own_patients(db):
+    asha_id = user_id(db, 'rekha_kumari')
+    dose = {'record_type': 'immunization', 'vaccine': 'BCG', 'record_date': '2026-01-05'}
+    results = apply_changes(db, asha_id, [
+        # Rina already has records with this ASHA; Amit does not.
+        {'client_id': 'rina', 'op': 'create', 'entity': 'mch_record',
+         'data': {**dose, 'patient_id': user_id(db, 'rina.devi@test.com')}},
+        {'client_id': 'amit', 'op': 'create', 'entity': 'mch_record',
+         'data': {**dose, 'patient_id': user_id(db, 'amit.kumar@test.com')}},
+    ])
+    assert [r['status'] for r in results] == ['applied', 'rejected']
+    assert 'not in your area' in results[1]['error']
+
+    # A patient of the ASHA's district can be taken on.
+    db.execute("UPDATE users SET district = 'Ajmer' WHERE id IN (?, ?)", (asha_id, user_id(db, 'amit.kumar@test.com')))
+    db.commit()
+    [result] = apply_changes(db, asha_id, [{'client_id': 'amit-2', 'op': 'create', 'entity': 'mch_record',
+                                            'data': {**dose, 'patient_id': user_id(db, 'amit.kumar@test.com')}}])
+    assert result['status'] == 'applied'
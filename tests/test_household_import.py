@@ -0,0 +1,55 @@
+import io
+
+import app as app_module
+from asha_summary import check_summaries
+from conftest import user_id
+from household_import import asha_directory, import_csv
+from household_search import match_expression
+from partitions import router, split
+
+
+def test_imported_households_are_searchable(db):
+    asha_id = user_id(db, 'rekha_kumari')
+    result = import_csv(db, io.StringIO('household_name,address\nZenobia Family,Ward 9\n'), 'households', asha_id=asha_id)
+    assert result['imported'] == 1
+    found = db.execute('SELECT rowid FROM households_fts WHERE households_fts MATCH ?',
+                       (match_expression(asha_id, 'zeno war'),)).fetchall()
+    assert [row[0] for row in found] == [
+        db.execute("SELECT id FROM households WHERE household_name = 'Zenobia Family'").fetchone()[0]]
+    # Another ASHA's search does not see it.
+    assert not db.execute('SELECT 1 FROM households_fts WHERE households_fts MATCH ?',
+                          (match_expression(user_id(db, 'bhavya_devi'), 'zeno'),)).fetchall()
+
+
+def test_bad_rows_are_reported_and_skipped(db):
+    rekha = user_id(db, 'rekha_kumari')
+    before = db.execute('SELECT COUNT(*) FROM households WHERE asha_id = ?', (rekha,)).fetchone()[0]
+    result = import_csv(db, io.StringIO(
+        'Household Name,Members Count\nOne,3\n,2\nTwo,many\nThree,\n'), 'households', asha_id=rekha, chunk_rows=1)
+    assert (result['rows'], result['imported'], result['error_count']) == (4, 2, 2)
+    assert [line for line, _message in result['errors']] == [3, 4]
+    assert db.execute('SELECT COUNT(*) FROM households WHERE asha_id = ?', (rekha,)).fetchone()[0] == before + 2
+    assert check_summaries(db) == {}
+
+
+def test_admin_imports_give_each_row_to_its_asha(app, db, tmp_path):
+    rekha, bhavya = user_id(db, 'rekha_kumari'), user_id(db, 'bhavya_devi')
+    db.execute("UPDATE users SET district = 'Jaipur' WHERE id = ?", (rekha,))
+    db.commit()
+    split(db, app.config['DATABASE'], ['Jaipur'], str(tmp_path / 'jaipur.db'))
+    route = router(db, app.config['DATABASE'])
+    rekha_email = db.execute('SELECT email FROM users WHERE id = ?', (rekha,)).fetchone()[0]
+    result = import_csv(db, io.StringIO(
+        'asha_id,asha_email,record_type,patient_id\n'
+        f',{rekha_email.upper()},pregnancy,\n'
+        f'{bhavya},,growth,\n'
+        ',nobody@example.com,growth,\n'
+        f'{bhavya},,,\n'
+    ), 'beneficiaries', ashas=asha_directory(db, app_module.ROLES['asha']), route=route, chunk_rows=1)
+    assert (result['imported'], result['error_count']) == (2, 2)
+    assert [line for line, _message in result['errors']] == [4, 5]
+    # Rekha's row went to her district's partition, Bhavya's stayed in the catalog.
+    new = "SELECT record_type FROM mch_records WHERE asha_id = ? AND patient_id IS NULL AND record_type IN ('pregnancy', 'growth')"
+    assert [row[0] for row in route(rekha).execute(new, (rekha,))] == ['pregnancy']
+    assert db.execute(new, (rekha,)).fetchall() == []
+    assert [row[0] for row in db.execute(new, (bhavya,))] == ['growth']
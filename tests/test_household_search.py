@@ -0,0 +1,52 @@
+import pytest
+
+from conftest import user_id
+from household_search import index_household, search_households
+
+
+@pytest.fixture
+def households(db):
+    rekha, bhavya = user_id(db, 'rekha_kumari'), user_id(db, 'bhavya_devi')
+    ids = {}
+    for asha_id, name, address in ((rekha, 'Zaveri Family', 'Ward 3, Shastri Nagar'),
+                                   (rekha, 'Zaverilal Family', 'Ward 12'),
+                                   (rekha, 'Khan Family', 'Near Zaveri Chowk'),
+                                   (bhavya, 'Zaveri Family', 'Ward 3')):
+        ids[asha_id, name] = db.execute('INSERT INTO households (asha_id, household_name, address) VALUES (?, ?, ?)',
+                                        (asha_id, name, address)).lastrowid
+        index_household(db, ids[asha_id, name])
+    db.commit()
+    return ids
+
+
+def found(db, asha_id, query):
+    return sorted(row['household_name'] for row in search_households(db, asha_id, query))
+
+
+def test_words_prefix_match_within_one_ashas_households(households, db):
+    rekha = user_id(db, 'rekha_kumari')
+    assert found(db, rekha, 'zave') == ['Khan Family', 'Zaveri Family', 'Zaverilal Family']
+    assert found(db, rekha, 'zave ward 3') == ['Zaveri Family']
+    assert found(db, rekha, 'SHASTRI') == ['Zaveri Family']
+    assert found(db, user_id(db, 'bhavya_devi'), 'zaverilal') == []
+
+
+def test_a_household_is_found_by_its_id(households, db):
+    rekha = user_id(db, 'rekha_kumari')
+    household = households[rekha, 'Khan Family']
+    assert [row['id'] for row in search_households(db, rekha, str(household))] == [household]
+
+
+def test_reindexing_follows_renames(households, db):
+    rekha = user_id(db, 'rekha_kumari')
+    household = households[rekha, 'Zaverilal Family']
+    db.execute("UPDATE households SET household_name = 'Gupta Family' WHERE id = ?", (household,))
+    index_household(db, household)
+    assert found(db, rekha, 'zaverilal') == []
+    assert found(db, rekha, 'gupta') == ['Gupta Family']
+
+
+def test_autocomplete_is_scoped_to_the_logged_in_asha(households, login):
+    matches = login('bhavya_devi').get('/search/autocomplete?q=zaveri').get_json()
+    assert [row['household_name'] for row in matches] == ['Zaveri Family']
+    assert set(matches[0]) == {'id', 'household_name', 'address'}
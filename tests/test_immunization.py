@@ -0,0 +1,68 @@
+import uuid
+from datetime import timedelta
+
+from conftest import user_id
+from field_sync import apply_changes
+from immunization import due_lists, local_today
+
+
+def change(entity, data):
+    return {'client_id': str(uuid.uuid4()), 'op': 'create', 'entity': entity, 'data': data}
+
+
+def due(db, asha_id, child_id):
+    lists = due_lists(db, asha_id, local_today())
+    return {item['vaccine'] for item in lists['overdue'] + lists['due_soon'] if item['child_id'] == child_id}
+
+
+def test_a_child_registered_by_birth_report_gets_a_schedule(db, login):
+    asha_id = user_id(db, 'rekha_kumari')
+    birth_date = local_today() - timedelta(days=10)
+    [result] = apply_changes(db, asha_id, [change('birth_report', {
+        'child_name': 'Baby Asha', 'sex': 'F', 'birth_date': birth_date.isoformat(), 'mother_name': 'Sita'})])
+    assert result['status'] == 'applied'
+    child_id = db.execute("SELECT child_id FROM mch_records WHERE record_type = 'birth' AND record_details = 'Baby Asha'").fetchone()[0]
+    assert 'BCG' in due(db, asha_id, child_id)
+
+    asha = login('rekha_kumari')
+    page = asha.get('/asha/mch/immunization').get_data(as_text=True)
+    assert 'Baby Asha' in page and '10 day(s) overdue' in page
+
+    asha.post('/asha/mch/immunization', data={'client_id': str(uuid.uuid4()), 'child_id': child_id,
+                                              'vaccine': 'BCG', 'record_date': local_today().isoformat()})
+    assert 'BCG' not in due(db, asha_id, child_id)
+    # Another ASHA cannot record doses for this child.
+    [result] = apply_changes(db, user_id(db, 'bhavya_devi'), [change('mch_record', {
+        'child_id': child_id, 'record_type': 'immunization', 'vaccine': 'OPV-0'})])
+    assert result['status'] == 'rejected'
+
+
+def test_doses_recorded_before_the_birth_record_count(db):
+    asha_id = user_id(db, 'rekha_kumari')
+    patient_id = user_id(db, 'rina.devi@test.com')
+    birth_date = local_today() - timedelta(days=3)
+    results = apply_changes(db, asha_id, [
+        change('mch_record', {'patient_id': patient_id, 'record_type': 'immunization', 'vaccine': 'BCG',
+                              'record_date': birth_date.isoformat()}),
+        change('mch_record', {'patient_id': patient_id, 'record_type': 'birth', 'record_date': birth_date.isoformat()}),
+    ])
+    assert [r['status'] for r in results] == ['applied', 'applied']
+    child_id = results[1]['id']
+    assert db.execute('SELECT child_id FROM mch_records WHERE id = ?', (results[0]['id'],)).fetchone()[0] == child_id
+    doses = due(db, asha_id, child_id)
+    assert 'OPV-0' in doses and 'BCG' not in doses
+
+
+def test_another_ashas_records_do_not_attach_to_a_child(db):
+    rekha, bhavya = user_id(db, 'rekha_kumari'), user_id(db, 'bhavya_devi')
+    patient_id = user_id(db, 'rina.devi@test.com')
+    birth_date = (local_today() - timedelta(days=3)).isoformat()
+    [birth] = apply_changes(db, rekha, [change('mch_record', {
+        'patient_id': patient_id, 'record_type': 'birth', 'record_date': birth_date})])
+    db.execute("UPDATE users SET district = 'Ajmer' WHERE id IN (?, ?)", (bhavya, patient_id))
+    db.commit()
+    [dose] = apply_changes(db, bhavya, [change('mch_record', {
+        'patient_id': patient_id, 'record_type': 'immunization', 'vaccine': 'BCG', 'record_date': birth_date})])
+    assert dose['status'] == 'applied'
+    assert db.execute('SELECT child_id FROM mch_records WHERE id = ?', (dose['id'],)).fetchone()[0] is None
+    assert 'BCG' in due(db, rekha, birth['id'])
@@ -0,0 +1,53 @@
+import time
+
+import job_queue
+from database import connect
+from job_queue import LEASE_SECONDS, claim, enqueue, finish, renew
+from migrations import migrate
+
+
+def queue_db(tmp_path):
+    db = connect(str(tmp_path / 'jobs.db'))
+    migrate(db)
+    return db
+
+
+def test_a_job_reclaimed_after_its_lease_is_left_to_the_new_holder(tmp_path):
+    db = queue_db(tmp_path)
+    job_id = enqueue(db, 'noop')
+    db.commit()
+    now = time.time()
+    assert [job[0] for job in claim(db, 'first', now=now)] == [job_id]
+    # The first worker is still busy when the lease runs out, and a second one claims the job.
+    assert [job[0] for job in claim(db, 'second', now=now + LEASE_SECONDS + 1)] == [job_id]
+
+    assert not renew(db, 'first', job_id)
+    finish(db, 'first', [job_id], [])
+    assert db.execute('SELECT locked_by FROM jobs WHERE id = ?', (job_id,)).fetchone()[0] == 'second'
+    assert renew(db, 'second', job_id)
+    finish(db, 'second', [job_id], [])
+    assert db.execute('SELECT COUNT(*) FROM jobs').fetchone()[0] == 0
+
+
+def test_worker_renews_each_lease_and_skips_jobs_it_lost(tmp_path, monkeypatch):
+    db = queue_db(tmp_path)
+    ran = []
+    monkeypatch.setitem(job_queue.HANDLERS, 'record', lambda worker, n: ran.append(n))
+    slow, lost = enqueue(db, 'record', {'n': 1}), enqueue(db, 'record', {'n': 2})
+    db.commit()
+
+    worker = job_queue.Worker(str(tmp_path / 'jobs.db'), log=lambda message: None)
+    worker.db = db
+    real_renew = job_queue.renew
+
+    def renew_after_a_slow_first_job(db, holder, job_id, **kwargs):
+        if job_id == lost:
+            # Another worker took this one over while the first job ran.
+            db.execute("UPDATE jobs SET locked_by = 'other' WHERE id = ?", (lost,))
+            db.commit()
+        return real_renew(db, holder, job_id, **kwargs)
+    monkeypatch.setattr(job_queue, 'renew', renew_after_a_slow_first_job)
+
+    assert worker.step() == 2
+    assert ran == [1]
+    assert [tuple(row) for row in db.execute('SELECT id, locked_by FROM jobs')] == [(lost, 'other')]
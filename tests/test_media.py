@@ -0,0 +1,125 @@
+import io
+import os
+
+import pytest
+
+from werkzeug.datastructures import FileStorage
+
+from conftest import user_id
+from media_store import (
+    IMAGE_VARIANTS, VARIANT_EXT, UploadTooLarge, is_content_addressed, make_derivatives, save_upload, variant_name,
+    variant_or_original,
+)
+
+PHOTO = 'ab/' + 'ab' * 32 + '.jpg'
+CHAT_IMAGE = 'cd/' + 'cd' * 32 + '.png'
+LEGACY = 'old_photo.jpg'
+
+
+@pytest.fixture
+def uploads(app, db, tmp_path, monkeypatch):
+    folder = tmp_path / 'uploads'
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(folder))
+    names = [PHOTO, CHAT_IMAGE, LEGACY]
+    if VARIANT_EXT:
+        names += [variant_name(PHOTO, 'thumb'), variant_name(CHAT_IMAGE, 'thumb')]
+    for name in names:
+        os.makedirs(folder / os.path.dirname(name), exist_ok=True)
+        (folder / name).write_bytes(b'image bytes')
+
+    patient, doctor = user_id(db, 'patient@test.com'), user_id(db, 'sharma@doctor.com')
+    for photo in (PHOTO, LEGACY):
+        db.execute("INSERT INTO consultations (patient_id, doctor_id, photo_filename, status) VALUES (?, ?, ?, 'Under Review')",
+                   (patient, doctor, photo))
+    thread_id = db.execute('INSERT INTO chat_threads (patient_id, doctor_id) VALUES (?, ?)',
+                           (user_id(db, 'rina.devi@test.com'), doctor)).lastrowid
+    db.execute('INSERT INTO chat_messages (thread_id, sender_id, file_path) VALUES (?, ?, ?)',
+               (thread_id, doctor, 'uploads/' + CHAT_IMAGE))
+    db.commit()
+    return thread_id
+
+
+def status(client, name):
+    return client.get(f'/media/{name}').status_code
+
+
+def test_consultation_uploads_reach_its_patient_and_doctor_only(uploads, login):
+    for email in ('patient@test.com', 'sharma@doctor.com'):
+        assert status(login(email), PHOTO) == 200
+        assert status(login(email), LEGACY) == 200
+    for email in ('rina.devi@test.com', 'rekha_kumari'):
+        assert status(login(email), PHOTO) == 404
+        assert status(login(email), LEGACY) == 404
+
+
+def test_chat_uploads_reach_the_threads_participants_only(uploads, login):
+    assert status(login('rina.devi@test.com'), CHAT_IMAGE) == 200
+    assert status(login('sharma@doctor.com'), CHAT_IMAGE) == 200
+    assert status(login('patient@test.com'), CHAT_IMAGE) == 404
+
+
+@pytest.mark.skipif(not VARIANT_EXT, reason='image derivatives need Pillow')
+def test_derivatives_follow_their_original(uploads, db, login):
+    assert status(login('patient@test.com'), variant_name(PHOTO, 'thumb')) == 200
+    assert status(login('rina.devi@test.com'), variant_name(PHOTO, 'thumb')) == 404
+    assert status(login('rina.devi@test.com'), variant_name(CHAT_IMAGE, 'thumb')) == 200
+    assert status(login('patient@test.com'), variant_name(CHAT_IMAGE, 'thumb')) == 404
+
+    # The range is half-open: a name at its upper bound is not the derivative's original.
+    stem = os.path.splitext(PHOTO)[0]
+    db.execute('INSERT INTO chat_messages (thread_id, sender_id, file_path) VALUES (?, ?, ?)',
+               (uploads, user_id(db, 'sharma@doctor.com'), f'uploads/{stem}/'))
+    db.commit()
+    assert status(login('rina.devi@test.com'), variant_name(PHOTO, 'thumb')) == 404
+
+
+def test_legacy_static_upload_urls_redirect_to_media(uploads, login):
+    response = login('patient@test.com').get(f'/static/uploads/{PHOTO}')
+    assert response.status_code == 301
+    assert response.location.endswith(f'/media/{PHOTO}')
+
+
+def test_uploaded_photos_queue_their_derivatives(uploads, db, login):
+    response = login('patient@test.com').post('/submit-symptoms', data={
+        'name': 'Test Patient', 'age': '30', 'gender': 'F', 'symptoms': 'rash',
+        'photo': (io.BytesIO(b'not really a png'), 'rash.png')})
+    assert response.status_code == 302
+    name = db.execute('SELECT photo_filename FROM consultations ORDER BY id DESC LIMIT 1').fetchone()[0]
+    assert name.endswith('.png')
+    assert db.execute("SELECT COUNT(*) FROM jobs WHERE kind = 'image_derivatives' AND payload LIKE ?",
+                      (f'%{name}%',)).fetchone()[0] == 1
+
+
+def upload(data, filename):
+    return FileStorage(stream=io.BytesIO(data), filename=filename)
+
+
+def test_identical_uploads_are_stored_once(tmp_path):
+    first = save_upload(upload(b'same bytes', 'a.JPG'), str(tmp_path))
+    second = save_upload(upload(b'same bytes', 'b.jpg'), str(tmp_path))
+    assert first == second
+    assert first.endswith('.jpg') and is_content_addressed(first)
+    assert sorted(os.listdir(tmp_path)) == [first[:2]]
+    assert os.listdir(tmp_path / first[:2]) == [first.split('/')[1]]
+
+
+def test_oversized_uploads_leave_nothing_behind(tmp_path):
+    with pytest.raises(UploadTooLarge):
+        save_upload(upload(b'x' * 100, 'big.png'), str(tmp_path), max_bytes=10)
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.skipif(not VARIANT_EXT, reason='image derivatives need Pillow')
+def test_derivatives_are_bounded_and_served_once_built(tmp_path):
+    from PIL import Image
+
+    image = io.BytesIO()
+    Image.new('RGB', (2000, 1000), 'red').save(image, 'PNG')
+    name = save_upload(upload(image.getvalue(), 'scan.png'), str(tmp_path))
+    assert variant_or_original(str(tmp_path), name, 'thumb') == name
+
+    make_derivatives(str(tmp_path), name)
+    for variant, edge in IMAGE_VARIANTS.items():
+        assert variant_or_original(str(tmp_path), name, variant) == variant_name(name, variant)
+        with Image.open(tmp_path / variant_name(name, variant)) as built:
+            assert max(built.size) == edge
@@ -0,0 +1,53 @@
+import pytest
+
+from medicine_catalogue import load_catalogue, search_medicines
+
+CATALOGUE = '''generic_name,brand_name,strength,dosage_form,manufacturer
+Paracetamol,Crocin,500 mg,Tablet,GSK
+Paracetamol,Dolo 650,650 mg,Tablet,Micro Labs
+Amoxicillin,Mox,250 mg,Capsule,Ranbaxy
+Cloxacillin,Klox,500 mg,Capsule,Cipla
+Pantoprazole,Pan 40,40 mg,Tablet,Alkem
+'''
+
+
+@pytest.fixture
+def catalogue(db, tmp_path):
+    path = tmp_path / 'medicines.csv'
+    path.write_text(CATALOGUE)
+    assert load_catalogue(db, str(path), replace=True) == 5
+    return db
+
+
+def names(rows):
+    return [(row['generic_name'], row['brand_name']) for row in rows]
+
+
+def test_words_match_as_prefixes(catalogue):
+    assert names(search_medicines(catalogue, 'para 500')) == [('Paracetamol', 'Crocin')]
+    assert names(search_medicines(catalogue, 'DOLO')) == [('Paracetamol', 'Dolo 650')]
+    assert sorted(names(search_medicines(catalogue, 'pa'))) == [
+        ('Pantoprazole', 'Pan 40'), ('Paracetamol', 'Crocin'), ('Paracetamol', 'Dolo 650')]
+
+
+def test_the_middle_of_a_word_falls_back_to_trigrams(catalogue):
+    assert sorted(names(search_medicines(catalogue, 'cillin'))) == [('Amoxicillin', 'Mox'), ('Cloxacillin', 'Klox')]
+    # Fewer than three characters is too short for a trigram.
+    assert search_medicines(catalogue, 'ci') == []
+
+
+def test_trigram_results_come_after_prefix_matches_without_repeats(catalogue):
+    rows = search_medicines(catalogue, 'mox')
+    assert names(rows) == [('Amoxicillin', 'Mox')]
+    assert search_medicines(catalogue, 'mox', limit=1) == rows
+
+
+def test_queries_without_words_return_nothing(catalogue):
+    assert search_medicines(catalogue, '') == []
+    assert search_medicines(catalogue, '"* -') == []
+
+
+def test_the_search_endpoint(catalogue, login):
+    response = login('rekha_kumari').get('/api/medicines/search?q=crocin')
+    assert response.status_code == 200
+    assert [row['brand_name'] for row in response.get_json()['results']] == ['Crocin']
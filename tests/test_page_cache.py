@@ -0,0 +1,61 @@
+import pytest
+
+import app as app_module
+
+
+@pytest.fixture
+def page_cache(app):
+    cache = app_module.page_cache
+    cache.invalidate()
+    yield cache
+    cache.invalidate()
+
+
+@pytest.fixture
+def visit(login):
+    """visit(email) -> a logged-in client whose login flash message has already been shown."""
+    def visit(email):
+        client = login(email)
+        client.get('/')
+        return client
+    return visit
+
+
+def test_pages_are_cached_per_role(page_cache, app, visit):
+    patient = visit('patient@test.com').get('/')
+    doctor = visit('sharma@doctor.com').get('/')
+    anonymous = app.test_client().get('/')
+    assert b'My History' in patient.data and b'My Chats' not in patient.data
+    assert b'My Chats' in doctor.data and b'My History' not in doctor.data
+    assert b'Login / Sign Up' in anonymous.data and b'Logout' not in anonymous.data
+    assert len({patient.get_etag()[0], doctor.get_etag()[0], anonymous.get_etag()[0]}) == 3
+    assert len(page_cache) == 3
+
+    # Another patient is served the first patient's entry.
+    again = visit('rina.devi@test.com').get('/')
+    assert again.data == patient.data and len(page_cache) == 3
+
+
+def test_pending_flash_messages_bypass_the_cache(page_cache, login):
+    response = login('patient@test.com').get('/contact')
+    assert response.status_code == 200 and 'ETag' not in response.headers
+    assert len(page_cache) == 0
+
+
+def test_a_matching_etag_gets_a_bodiless_304(page_cache, visit):
+    client = visit('patient@test.com')
+    first = client.get('/contact')
+    assert first.status_code == 200
+    assert 'Cookie' in first.vary and first.cache_control.private
+    second = client.get('/contact', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 304 and second.data == b''
+
+
+def test_invalidate_drops_one_template_or_all(page_cache, app):
+    client = app.test_client()
+    client.get('/')
+    client.get('/contact')
+    page_cache.invalidate('index.html')
+    assert len(page_cache) == 1
+    page_cache.invalidate()
+    assert len(page_cache) == 0
@@ -0,0 +1,58 @@
+import sqlite3
+
+import pytest
+
+from conftest import user_id
+from partitions import RANGE_BITS, asha_db, partition_dbs, split
+
+
+@pytest.fixture
+def jaipur(app, db, tmp_path):
+    """Rekha in district Jaipur, whose field data lives in its own partition file."""
+    rekha = user_id(db, 'rekha_kumari')
+    db.execute("UPDATE users SET district = 'Jaipur' WHERE id = ?", (rekha,))
+    db.commit()
+    households = db.execute('SELECT household_name FROM households WHERE asha_id = ? ORDER BY id', (rekha,)).fetchall()
+    assert households
+    assert split(db, app.config['DATABASE'], ['Jaipur'], str(tmp_path / 'partitions' / 'jaipur.db')) == 1
+    return [row[0] for row in households]
+
+
+def test_field_data_is_routed_to_the_owners_partition(jaipur, db):
+    rekha, bhavya = user_id(db, 'rekha_kumari'), user_id(db, 'bhavya_devi')
+    partition = asha_db(rekha)
+    assert partition is not db
+    assert partition_dbs() == [partition]
+    assert asha_db(bhavya) is db
+
+    assert [row[0] for row in partition.execute(
+        'SELECT household_name FROM households WHERE asha_id = ? ORDER BY id', (rekha,))] == jaipur
+    assert db.execute('SELECT COUNT(*) FROM households WHERE asha_id = ?', (rekha,)).fetchone()[0] == 0
+    assert db.execute('SELECT COUNT(*) FROM households WHERE asha_id = ?', (bhavya,)).fetchone()[0] > 0
+
+
+def test_partition_ids_start_at_its_range(jaipur, db):
+    partition = asha_db(user_id(db, 'rekha_kumari'))
+    household = partition.execute("INSERT INTO households (asha_id, household_name) VALUES (?, 'New Family')",
+                                  (user_id(db, 'rekha_kumari'),)).lastrowid
+    partition.commit()
+    assert household >> RANGE_BITS == 1
+
+
+def test_the_catalog_is_attached_read_only(jaipur, db):
+    partition = asha_db(user_id(db, 'rekha_kumari'))
+    # users is a view of the catalog's table, so joins need no changes.
+    assert partition.execute('SELECT name FROM users WHERE id = ?', (user_id(db, 'rekha_kumari'),)).fetchone()[0] == 'Rekha Kumari'
+    with pytest.raises(sqlite3.OperationalError, match='readonly'):
+        partition.execute("UPDATE catalog.users SET name = 'x'")
+    partition.rollback()
+
+
+def test_routes_read_the_partition(jaipur, login):
+    page = login('rekha_kumari').get('/asha/households').get_data(as_text=True)
+    assert all(name in page for name in jaipur)
+
+
+def test_a_district_is_split_only_once(jaipur, app, db, tmp_path):
+    with pytest.raises(ValueError, match='already in'):
+        split(db, app.config['DATABASE'], ['Jaipur'], str(tmp_path / 'partitions' / 'other.db'))
@@ -0,0 +1,63 @@
+import pytest
+
+from conftest import user_id
+from partitions import asha_db, id_base, split
+
+
+def page_through(client, limit):
+    items, params = [], {'limit': limit}
+    while True:
+        page = client.get('/api/patient/timeline', query_string=params).get_json()
+        assert len(page['items']) <= limit
+        items += page['items']
+        if page['next_cursor'] is None:
+            return items
+        params = {'limit': limit, **page['next_cursor']}
+
+
+def expected(db, sources, patient_id):
+    rows = []
+    for source in sources:
+        base = id_base(source)
+        rows += [(row[0], row[1] + base) for row in source.execute(
+            'SELECT occurred_at, id FROM patient_timeline WHERE patient_id = ?', (patient_id,))]
+    return sorted(rows, reverse=True)
+
+
+@pytest.fixture
+def history(app, db):
+    """Rina's consultations and Rekha's MCH records for her, dated so that pages interleave."""
+    rina, rekha = user_id(db, 'rina.devi@test.com'), user_id(db, 'rekha_kumari')
+    for day in ('01', '03', '05', '07'):
+        db.execute("INSERT INTO consultations (patient_id, symptoms, status, created_at) VALUES (?, 'cough', 'Pending', ?)",
+                   (rina, f'2025-01-{day} 09:00:00'))
+    for day in ('02', '04', '06', '07'):
+        db.execute("INSERT INTO mch_records (asha_id, patient_id, record_type, record_date) VALUES (?, ?, 'growth', ?)",
+                   (rekha, rina, f'2025-01-{day} 09:00:00'))
+    db.commit()
+    return rina
+
+
+def test_cursor_pages_cover_the_timeline_once_in_order(history, db, login):
+    want = expected(db, [db], history)
+    for limit in (1, 3, 50):
+        items = page_through(login('rina.devi@test.com'), limit)
+        assert [(item['occurred_at'], item['id']) for item in items] == want
+
+
+def test_cursor_pages_merge_partitions(history, app, db, tmp_path, login):
+    rekha = user_id(db, 'rekha_kumari')
+    db.execute("UPDATE users SET district = 'Jaipur' WHERE id = ?", (rekha,))
+    db.commit()
+    split(db, app.config['DATABASE'], ['Jaipur'], str(tmp_path / 'jaipur.db'))
+    partition = asha_db(rekha)
+    assert partition.execute('SELECT COUNT(*) FROM patient_timeline WHERE patient_id = ?', (history,)).fetchone()[0] >= 4
+
+    want = expected(db, [db, partition], history)
+    kinds = set()
+    for limit in (1, 2, 3, 50):
+        items = page_through(login('rina.devi@test.com'), limit)
+        # Both files hold an entry for 2025-01-07 09:00:00; the id settles their order across pages.
+        assert [(item['occurred_at'], item['id']) for item in items] == want
+        kinds |= {item['kind'] for item in items}
+    assert {'consultation', 'mch_record'} <= kinds
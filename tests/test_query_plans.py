@@ -0,0 +1,9 @@
+from database import connect
+from migrations import HOT_QUERIES, check_query_plans, migrate
+
+
+def test_hot_queries_use_indexes():
+    db = connect(':memory:')
+    migrate(db)
+    assert check_query_plans(db) == {}
+    assert HOT_QUERIES